@@ -0,0 +1,505 @@
+"""
+Acceso a la base de datos de Aurelion compartido por el dashboard, el ETL y los notebooks.
+
+Todas las entradas piden las conexiones a un pool acotado por proceso en lugar
+de abrir una por consulta:
+
+    with obtener_conexion() as conn:    # prestada; al salir vuelve al pool
+        df = leer("SELECT ... WHERE fecha >= %s", (desde,), conn)
+
+    for columnas, filas in lotes("SELECT * FROM Detalles_Ventas"):
+        ...                               # cursor sin buffer: el resultado llega por partes
+
+    en_paralelo(funcion, tareas)        # cada tarea en su hilo con su propia conexión
+
+`conn.close()` en una conexión prestada la devuelve al pool, así que el código
+con `conn = conectar_bd(); try: ... finally: conn.close()` no cambia. Al
+prestarla se comprueba que siga viva si llevaba tiempo sin usarse, y al
+devolverla se deshace la transacción abierta (la siguiente lectura ve los datos
+nuevos). Las consultas siempre llevan los valores como parámetros `%s`; en
+MySQL se ejecutan como sentencias preparadas que cada conexión conserva para
+reutilizarlas. El motor lo elige AURELION_MOTOR_BD, como en motor_embebido.py.
+"""
+import functools
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from metricas_dashboard import registrar_recolector
+from motor_embebido import conectar_embebida, fuente_bd, motor_bd
+
+CONFIG_MYSQL = {
+    'host': 'localhost',
+    'user': 'root',  # Usuario por defecto de XAMPP
+    'password': '',  # Password por defecto (vacío en XAMPP)
+    'database': 'AurelionDB',
+    'port': 3306,  # Puerto por defecto de MySQL en XAMPP
+}
+VARIABLE_TAMANO_POOL = 'AURELION_TAMANO_POOL'
+TAMANO_POOL = 5
+# Lo que espera una petición a que quede una conexión libre antes de fallar
+SEGUNDOS_ESPERA = 30
+# Sin usar más de esto, se comprueba la conexión antes de prestarla
+SEGUNDOS_SIN_COMPROBAR = 30
+# Las conexiones se renuevan pasado este tiempo (por debajo del wait_timeout de MySQL)
+SEGUNDOS_VIDA_MAXIMA = 30 * 60
+# Sentencias preparadas que conserva cada conexión MySQL
+MAX_SENTENCIAS_PREPARADAS = 64
+FILAS_POR_LOTE = 50_000
+
+
+def tamano_pool():
+    return int(os.environ.get(VARIABLE_TAMANO_POOL, TAMANO_POOL))
+
+
+def nueva_conexion():
+    """Conexión sin pool al motor configurado (MySQL o el embebido)"""
+    if motor_bd() != 'mysql':
+        return conectar_embebida()
+
+    import mysql.connector
+    return mysql.connector.connect(**CONFIG_MYSQL)
+
+
+def _es_mysql(conexion):
+    return not hasattr(conexion, 'motor')
+
+
+class _Entrada:
+    """Conexión real del pool y lo que se guarda con ella entre préstamos"""
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.creada = time.monotonic()
+        self.ultimo_uso = self.creada
+        self.preparadas = OrderedDict()
+
+    def sana(self):
+        """Ping barato: `is_connected` hace un ping en MySQL; en el embebido, SELECT 1"""
+        try:
+            if _es_mysql(self.conexion):
+                return self.conexion.is_connected()
+            self.conexion.cursor().execute('SELECT 1').fetchall()
+            return True
+        except Exception:
+            return False
+
+    def cerrar(self):
+        for cursor in self.preparadas.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        self.preparadas.clear()
+        try:
+            self.conexion.close()
+        except Exception:
+            pass
+
+
+class ConexionPool:
+    """Conexión prestada por el pool: misma interfaz que la real, pero `close()` la devuelve"""
+
+    def __init__(self, pool, entrada):
+        self._pool = pool
+        self._entrada = entrada
+
+    @property
+    def conexion(self):
+        if self._entrada is None:
+            raise RuntimeError('La conexión ya se devolvió al pool')
+        return self._entrada.conexion
+
+    def __getattr__(self, nombre):
+        return getattr(self.conexion, nombre)
+
+    def cursor(self, *args, **kwargs):
+        return self.conexion.cursor(*args, **kwargs)
+
+    def _preparada(self, consulta):
+        """Cursor preparado de la conexión para `consulta` (MySQL la prepara una sola vez)"""
+        preparadas = self._entrada.preparadas
+        cursor = preparadas.get(consulta)
+        if cursor is not None:
+            preparadas.move_to_end(consulta)
+            return cursor
+        cursor = self.conexion.cursor(prepared=True)
+        preparadas[consulta] = cursor
+        while len(preparadas) > MAX_SENTENCIAS_PREPARADAS:
+            _, antiguo = preparadas.popitem(last=False)
+            antiguo.close()
+        return cursor
+
+    def leer(self, consulta, params=None):
+        """Resultado de la consulta como DataFrame de pandas"""
+        conexion = self.conexion
+        if not _es_mysql(conexion):
+            return conexion.leer(consulta, params)
+        cursor = self._preparada(consulta)
+        cursor.execute(consulta, tuple(params or ()))
+        # coerce_float: los DECIMAL llegan como float, igual que con `pd.read_sql`
+        return pd.DataFrame.from_records(cursor.fetchall(), columns=list(cursor.column_names),
+                                         coerce_float=True)
+
+    def leer_polars(self, consulta, params=None):
+        """Resultado de la consulta como DataFrame de Polars"""
+        if not _es_mysql(self.conexion):
+            return self.conexion.leer_polars(consulta, params)
+        import polars as pl
+        return pl.concat(list(lotes_polars(consulta, params, conn=self)), how='vertical_relaxed')
+
+    def ejecutar(self, consulta, params=None):
+        """Sentencia de escritura parametrizada; devuelve las filas afectadas"""
+        if _es_mysql(self.conexion):
+            cursor = self._preparada(consulta)
+        else:
+            cursor = self.conexion.cursor()
+        cursor.execute(consulta, None if params is None else tuple(params))
+        return cursor.rowcount
+
+    def is_connected(self):
+        return self._entrada is not None and self._entrada.conexion.is_connected()
+
+    def descartar(self):
+        """Cierra la conexión en lugar de devolverla (p. ej. tras un error a medio leer)"""
+        entrada, self._entrada = self._entrada, None
+        if entrada is not None:
+            self._pool.liberar(entrada, reutilizable=False)
+
+    def close(self):
+        entrada, self._entrada = self._entrada, None
+        if entrada is not None:
+            self._pool.liberar(entrada)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, valor, traza):
+        self.close()
+
+
+class PoolConexiones:
+    """Pool acotado: como mucho `tamano` conexiones prestadas a la vez; el resto espera"""
+
+    def __init__(self, crear, tamano=TAMANO_POOL, espera=SEGUNDOS_ESPERA):
+        self._crear = crear
+        self.tamano = tamano
+        self.espera = espera
+        self._libres = []
+        self._lock = threading.Lock()
+        self._huecos = threading.BoundedSemaphore(tamano)
+        self._pid = os.getpid()
+        self.estadisticas = {'creadas': 0, 'reutilizadas': 0, 'descartadas': 0, 'prestadas': 0}
+
+    def _comprobar_proceso(self):
+        # Tras un fork (workers de gunicorn) las conexiones heredadas no son de este proceso
+        if os.getpid() != self._pid:
+            self._libres = []
+            self._huecos = threading.BoundedSemaphore(self.tamano)
+            self._pid = os.getpid()
+            self.estadisticas['prestadas'] = 0
+
+    def obtener(self):
+        """Conexión prestada; falla con RuntimeError si no queda ninguna libre en `espera` segundos"""
+        with self._lock:
+            self._comprobar_proceso()
+        if not self._huecos.acquire(timeout=self.espera):
+            raise RuntimeError(f"No hay conexiones libres en el pool ({self.tamano} en uso "
+                               f"durante {self.espera} s); sube {VARIABLE_TAMANO_POOL}")
+        try:
+            entrada = self._reutilizable()
+            if entrada is None:
+                entrada = _Entrada(self._crear())
+                self._contar('creadas')
+            else:
+                self._contar('reutilizadas')
+        except BaseException:
+            self._huecos.release()
+            raise
+        self._contar('prestadas')
+        return ConexionPool(self, entrada)
+
+    def _reutilizable(self):
+        ahora = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._libres:
+                    return None
+                entrada = self._libres.pop()
+            caducada = ahora - entrada.creada > SEGUNDOS_VIDA_MAXIMA
+            if not caducada and (ahora - entrada.ultimo_uso < SEGUNDOS_SIN_COMPROBAR or entrada.sana()):
+                return entrada
+            entrada.cerrar()
+            self._contar('descartadas')
+
+    def liberar(self, entrada, reutilizable=True):
+        if reutilizable:
+            try:
+                # Cierra la transacción de lectura: la próxima consulta ve los datos nuevos
+                entrada.conexion.rollback()
+            except Exception:
+                reutilizable = False
+        if reutilizable:
+            entrada.ultimo_uso = time.monotonic()
+            with self._lock:
+                self._libres.append(entrada)
+        else:
+            entrada.cerrar()
+            self._contar('descartadas')
+        self._contar('prestadas', -1)
+        self._huecos.release()
+
+    def _contar(self, clave, n=1):
+        with self._lock:
+            self.estadisticas[clave] += n
+
+    def libres(self):
+        return len(self._libres)
+
+    def cerrar(self):
+        """Cierra las conexiones libres (las prestadas se cierran al devolverlas)"""
+        with self._lock:
+            libres, self._libres = self._libres, []
+        for entrada in libres:
+            entrada.cerrar()
+
+
+# Un pool por motor y fuente, creado en el primer uso de cada proceso
+_pools = {}
+_lock_pools = threading.Lock()
+
+
+def pool():
+    clave = (motor_bd(), fuente_bd())
+    with _lock_pools:
+        if clave not in _pools:
+            _pools[clave] = PoolConexiones(nueva_conexion, tamano=tamano_pool())
+        return _pools[clave]
+
+
+def obtener_conexion():
+    """Conexión prestada por el pool del motor actual; `close()` la devuelve"""
+    return pool().obtener()
+
+
+def _con_conexion(funcion, conn, *args):
+    if conn is not None:
+        return funcion(conn, *args)
+    with obtener_conexion() as prestada:
+        return funcion(prestada, *args)
+
+
+def leer(consulta, params=None, conn=None):
+    """Consulta parametrizada (`%s`) como DataFrame de pandas"""
+    return _con_conexion(lambda c: c.leer(consulta, params), conn)
+
+
+def leer_polars(consulta, params=None, conn=None):
+    """Consulta parametrizada (`%s`) como DataFrame de Polars"""
+    return _con_conexion(lambda c: c.leer_polars(consulta, params), conn)
+
+
+def ejecutar(consulta, params=None, conn=None):
+    """Sentencia parametrizada confirmada al terminar; devuelve las filas afectadas"""
+    def ejecutar_y_confirmar(c):
+        filas = c.ejecutar(consulta, params)
+        c.commit()
+        return filas
+    return _con_conexion(ejecutar_y_confirmar, conn)
+
+
+def en_paralelo(funcion, tareas, hilos=None, conn=None, capturar=False):
+    """Lista con `funcion(conexion, tarea)` de cada tarea, en hilos que piden cada uno su conexión
+
+    Las conexiones salen del pool de la conexión prestada `conn` (o del del motor actual), así
+    que nunca hay más consultas a la vez que conexiones en el pool. Con `capturar`, el error de
+    una tarea (también el de pedir su conexión) es su resultado en lugar de cortar las demás.
+    """
+    tareas = list(tareas)
+    origen = conn._pool if conn is not None else pool()
+    # La conexión de quien llama sigue prestada mientras tanto
+    hilos = hilos or max(1, origen.tamano - (conn is not None))
+
+    def ejecutar_tarea(tarea):
+        try:
+            prestada = origen.obtener()
+        except Exception as e:
+            if capturar:
+                return e
+            raise
+        try:
+            resultado = funcion(prestada, tarea)
+        except BaseException as e:
+            prestada.descartar()
+            if capturar and isinstance(e, Exception):
+                return e
+            raise
+        prestada.close()
+        return resultado
+
+    with ThreadPoolExecutor(max_workers=min(hilos, len(tareas) or 1), thread_name_prefix='aurelion-bd') as ejecutor:
+        return list(ejecutor.map(ejecutar_tarea, tareas))
+
+
+def rangos_clave(claves, trozos, conn=None):
+    """Parte [MIN(clave), MAX(clave)] de cada tabla de `claves` ({tabla: clave}) en hasta `trozos`
+    rangos [desde, hasta) de enteros; devuelve {tabla: rangos} ([] si la tabla no tiene filas)
+
+    Los extremos de todas las tablas salen de una sola consulta, es decir, del mismo estado de la base.
+    """
+    columnas = ', '.join(f"(SELECT MIN({clave}) FROM {tabla}) AS minimo_{i}, "
+                         f"(SELECT MAX({clave}) FROM {tabla}) AS maximo_{i}"
+                         for i, (tabla, clave) in enumerate(claves.items()))
+    extremos = leer(f"SELECT {columnas}", conn=conn).iloc[0]
+    rangos = {}
+    for i, tabla in enumerate(claves):
+        if pd.isna(extremos[f'minimo_{i}']):
+            rangos[tabla] = []
+            continue
+        minimo, maximo = int(extremos[f'minimo_{i}']), int(extremos[f'maximo_{i}'])
+        paso = -(-(maximo - minimo + 1) // max(1, trozos))
+        rangos[tabla] = [(desde, min(desde + paso, maximo + 1)) for desde in range(minimo, maximo + 1, paso)]
+    return rangos
+
+
+def _real(conn):
+    return conn.conexion if isinstance(conn, ConexionPool) else conn
+
+
+def _cursor_streaming(conn):
+    real = _real(conn)
+    if hasattr(real, 'motor') or isinstance(real, sqlite3.Connection):
+        return conn.cursor()
+    # En MySQL, un cursor sin buffer va leyendo del servidor a medida que se piden filas
+    return conn.cursor(buffered=False)
+
+
+def _prestar(funcion):
+    """Generador que recibe `conn=None`: presta una del pool y la devuelve (o descarta) al terminar"""
+    @functools.wraps(funcion)
+    def envoltura(*args, conn=None, **kwargs):
+        prestada = conn if conn is not None else obtener_conexion()
+        completo = False
+        try:
+            yield from funcion(*args, conn=prestada, **kwargs)
+            completo = True
+        finally:
+            if conn is None:
+                # Si se dejó de leer a medias, quedan filas pendientes en la conexión: no se reutiliza
+                prestada.close() if completo else prestada.descartar()
+    return envoltura
+
+
+def _filas(conn, consulta, params, filas_por_lote):
+    """(descripción del cursor, filas) de `filas_por_lote` en `filas_por_lote`; un lote vacío si no hay filas"""
+    cursor = _cursor_streaming(conn)
+    try:
+        if params is None:
+            cursor.execute(consulta)
+        else:
+            cursor.execute(consulta, tuple(params))
+        vacio = True
+        while True:
+            filas = cursor.fetchmany(filas_por_lote)
+            if not filas:
+                break
+            vacio = False
+            yield cursor.description, filas
+        if vacio:
+            yield cursor.description, []
+    finally:
+        cursor.close()
+
+
+@_prestar
+def lotes(consulta, params=None, filas_por_lote=FILAS_POR_LOTE, conn=None):
+    """Genera (columnas, filas) de `filas_por_lote` en `filas_por_lote` sin cargar el resultado entero
+
+    Acepta también conexiones DB-API sin pool (MySQL o sqlite3). Si no hay filas, da un
+    único lote vacío para que se conozcan las columnas.
+    """
+    for descripcion, filas in _filas(conn, consulta, params, filas_por_lote):
+        yield [d[0] for d in descripcion], filas
+
+
+@functools.lru_cache(maxsize=1)
+def _tipos_mysql():
+    """Tipo de Polars de cada código de tipo de MySQL: el que tendría la columna si trajera filas"""
+    import polars as pl
+    from mysql.connector import FieldType
+    grupos = {
+        pl.Int64: ('TINY', 'SHORT', 'LONG', 'LONGLONG', 'INT24', 'YEAR', 'BIT'),
+        # Los DECIMAL acaban como Float64 (ver `lotes_polars`)
+        pl.Float64: ('DECIMAL', 'NEWDECIMAL', 'FLOAT', 'DOUBLE'),
+        pl.Date: ('DATE', 'NEWDATE'),
+        pl.Datetime('us'): ('DATETIME', 'TIMESTAMP'),
+        pl.Duration('us'): ('TIME',),
+        pl.String: ('VARCHAR', 'VAR_STRING', 'STRING', 'ENUM', 'SET', 'JSON',
+                    'TINY_BLOB', 'MEDIUM_BLOB', 'LONG_BLOB', 'BLOB'),
+    }
+    return {getattr(FieldType, nombre): tipo for tipo, nombres in grupos.items() for nombre in nombres
+            if hasattr(FieldType, nombre)}
+
+
+def _tipo_columna(codigo):
+    """Tipo de Polars de una columna vacía según el cursor; Null si el motor no lo informa (SQLite)"""
+    import polars as pl
+    if isinstance(codigo, int):
+        try:
+            return _tipos_mysql().get(codigo, pl.Null)
+        except ImportError:
+            pass
+    return pl.Null
+
+
+def _a_polars(descripcion, filas):
+    import polars as pl
+    columnas = [d[0] for d in descripcion]
+    if not filas:
+        # Sin filas no hay nada que inferir: los tipos salen de la descripción del cursor
+        return pl.DataFrame(schema={d[0]: _tipo_columna(d[1]) for d in descripcion})
+    # Directo de las tuplas del cursor a columnas de Polars, sin pasar por pandas
+    return pl.DataFrame(filas, schema=columnas, orient='row', infer_schema_length=None)
+
+
+@_prestar
+def lotes_polars(consulta, params=None, filas_por_lote=FILAS_POR_LOTE, conn=None):
+    """Genera DataFrames de Polars de hasta `filas_por_lote` filas (DECIMAL como Float64, como `pd.read_sql`)
+
+    DuckDB entrega record batches de Arrow; el resto de motores, filas de un cursor sin buffer.
+    Un resultado vacío llega con los tipos de sus columnas si el motor los informa (DuckDB y MySQL).
+    """
+    import polars as pl
+    real = _real(conn)
+    if getattr(real, 'motor', None) == 'duckdb':
+        partes = (pl.from_arrow(lote) for lote in real.lotes_arrow(consulta, params, filas_por_lote))
+    else:
+        partes = (_a_polars(descripcion, filas) for descripcion, filas in _filas(conn, consulta, params,
+                                                                                 filas_por_lote))
+    for parte in partes:
+        yield parte.with_columns(pl.col(pl.Decimal).cast(pl.Float64))
+
+
+@registrar_recolector
+def _metricas_pool():
+    total = {'creadas': 0, 'reutilizadas': 0, 'descartadas': 0, 'prestadas': 0}
+    libres = 0
+    for p in list(_pools.values()):
+        for clave in total:
+            total[clave] += p.estadisticas[clave]
+        libres += p.libres()
+    return [
+        ('aurelion_pool_conexiones_prestadas', 'gauge', 'Conexiones del pool en uso', total['prestadas']),
+        ('aurelion_pool_conexiones_libres', 'gauge', 'Conexiones del pool abiertas y sin usar', libres),
+        ('aurelion_pool_conexiones_creadas_total', 'counter', 'Conexiones abiertas por el pool',
+         total['creadas']),
+        ('aurelion_pool_conexiones_reutilizadas_total', 'counter', 'Préstamos servidos con una conexión ya abierta',
+         total['reutilizadas']),
+        ('aurelion_pool_conexiones_descartadas_total', 'counter', 'Conexiones cerradas por caducar o fallar',
+         total['descartadas']),
+    ]
@@ -0,0 +1,105 @@
+import json
+import os
+
+import pyarrow as pa
+
+# Fichero puntero que indica qué versión del snapshot compartido está vigente
+PUNTERO_SNAPSHOT = 'actual.json'
+# Versiones anteriores que se conservan para los workers que aún no han cambiado
+VERSIONES_CONSERVADAS = 3
+# Clave de los metadatos propios dentro del esquema Arrow
+CLAVE_METADATOS = b'aurelion'
+
+
+def escribir_json_atomico(ruta, contenido):
+    """Escribe un JSON de forma atómica (fichero temporal + rename)"""
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(contenido, f, ensure_ascii=False, default=str)
+    os.replace(temporal, ruta)
+
+
+def escribir_arrow(df, ruta, metadatos=None):
+    """Guarda el frame en formato Arrow IPC (Feather v2) sin compresión, apto para memory-map.
+
+    `metadatos` se guarda dentro del propio esquema, así datos y metadatos se
+    reemplazan juntos en un único rename.
+    """
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    if metadatos is not None:
+        tabla = tabla.replace_schema_metadata({
+            **(tabla.schema.metadata or {}),
+            CLAVE_METADATOS: json.dumps(metadatos, ensure_ascii=False, default=str).encode('utf-8'),
+        })
+    temporal = f'{ruta}.tmp'
+    with pa.OSFile(temporal, 'wb') as destino:
+        with pa.ipc.new_file(destino, tabla.schema) as escritor:
+            escritor.write_table(tabla)
+    os.replace(temporal, ruta)
+
+
+def leer_arrow(ruta, mapear=True):
+    """Abre un fichero Arrow IPC con memory-map.
+
+    Las columnas numéricas sin nulos quedan respaldadas por las páginas del fichero,
+    que el sistema operativo comparte entre todos los procesos que lo mapean.
+    Con `mapear=False` se lee a memoria y el fichero queda libre para reemplazarlo
+    (en Windows no se puede sustituir un fichero mapeado).
+    """
+    if not mapear:
+        with pa.OSFile(ruta, 'rb') as fuente:
+            return pa.ipc.open_file(fuente).read_all().to_pandas()
+
+    fuente = pa.memory_map(ruta, 'r')
+    tabla = pa.ipc.open_file(fuente).read_all()
+    return tabla.to_pandas(split_blocks=True)
+
+
+def leer_metadatos_arrow(ruta):
+    """Metadatos guardados con `escribir_arrow` (solo lee el esquema), o None si no hay fichero"""
+    if not os.path.exists(ruta):
+        return None
+    with pa.OSFile(ruta, 'rb') as fuente:
+        esquema = pa.ipc.open_file(fuente).schema
+    contenido = (esquema.metadata or {}).get(CLAVE_METADATOS)
+    return json.loads(contenido) if contenido else {}
+
+
+def publicar_snapshot(directorio, version, df, metadatos):
+    """Escribe la versión `version` del snapshot y la marca como vigente"""
+    os.makedirs(directorio, exist_ok=True)
+    archivo = f'ventas_v{version:06d}.arrow'
+    escribir_arrow(df, os.path.join(directorio, archivo))
+    escribir_json_atomico(os.path.join(directorio, PUNTERO_SNAPSHOT), {
+        'version': version,
+        'archivo': archivo,
+        **metadatos,
+    })
+
+    # En POSIX borrar un fichero mapeado es seguro: las páginas siguen vivas hasta el munmap
+    antiguos = sorted(
+        nombre for nombre in os.listdir(directorio)
+        if nombre.startswith('ventas_v') and nombre.endswith('.arrow')
+    )[:-VERSIONES_CONSERVADAS]
+    for nombre in antiguos:
+        try:
+            os.remove(os.path.join(directorio, nombre))
+        except OSError:
+            pass
+
+
+def leer_puntero(directorio):
+    """Metadatos de la versión vigente, o None si todavía no se ha publicado ninguna"""
+    try:
+        with open(os.path.join(directorio, PUNTERO_SNAPSHOT), encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def leer_snapshot_publicado(directorio):
+    """Puntero vigente y su frame mapeado en memoria"""
+    puntero = leer_puntero(directorio)
+    if puntero is None:
+        raise FileNotFoundError(f"No hay ningún snapshot publicado en '{directorio}'")
+    return puntero, leer_arrow(os.path.join(directorio, puntero['archivo']))
@@ -0,0 +1,94 @@
+import importlib
+import threading
+import time
+
+# Cuánto espera un callback a que termine la precarga antes de fallar
+TIEMPO_ESPERA_DATOS_SEGUNDOS = 120
+# Pausa antes de reintentar un paso de la precarga que falló (p. ej. MySQL caído)
+REINTENTO_PRECARGA_SEGUNDOS = 10
+
+_inicio = time.perf_counter()
+_ultima_marca = _inicio
+# Etapas del hilo principal (importar dashboard.py) y del hilo de precarga: (nombre, segundos)
+_etapas_importacion = []
+_etapas_precarga = []
+_datos_listos = threading.Event()
+_segundos_hasta_listo = None
+_ultimo_error = None
+
+
+def marcar_etapa(nombre):
+    """Registra el tiempo transcurrido desde la marca anterior del hilo principal"""
+    global _ultima_marca
+    ahora = time.perf_counter()
+    _etapas_importacion.append((nombre, ahora - _ultima_marca))
+    _ultima_marca = ahora
+
+
+def importar(modulo):
+    """Paso de precarga que importa `modulo` (queda en sys.modules para los callbacks)"""
+    return (f'importar {modulo}', lambda: importlib.import_module(modulo))
+
+
+def _ejecutar_precarga(pasos):
+    global _segundos_hasta_listo, _ultimo_error
+    for nombre, funcion in pasos:
+        while True:
+            inicio = time.perf_counter()
+            try:
+                funcion()
+                break
+            except Exception as e:
+                _ultimo_error = f'{nombre}: {e}'
+                print(f"⚠️  Precarga del dashboard ({nombre}): {e}. "
+                      f"Reintento en {REINTENTO_PRECARGA_SEGUNDOS} s")
+                time.sleep(REINTENTO_PRECARGA_SEGUNDOS)
+            finally:
+                _etapas_precarga.append((nombre, time.perf_counter() - inicio))
+
+    _ultimo_error = None
+    _segundos_hasta_listo = time.perf_counter() - _inicio
+    _datos_listos.set()
+    imprimir_informe()
+
+
+def iniciar_precarga(pasos):
+    """Ejecuta los pasos (nombre, función) en un hilo, reintentando el que falle, y marca los datos como listos"""
+    hilo = threading.Thread(
+        target=_ejecutar_precarga,
+        args=(list(pasos),),
+        name='precarga-dashboard',
+        daemon=True,
+    )
+    hilo.start()
+    return hilo
+
+
+def datos_listos():
+    return _datos_listos.is_set()
+
+
+def esperar_datos(timeout=TIEMPO_ESPERA_DATOS_SEGUNDOS):
+    """Bloquea hasta que la precarga termina; falla si tarda más de `timeout` segundos"""
+    if not _datos_listos.wait(timeout):
+        raise RuntimeError(f"Los datos del dashboard todavía no están disponibles ({_ultimo_error or 'cargando'})")
+
+
+def informe_arranque():
+    """Tiempos de importación y de precarga, en segundos"""
+    return {
+        'listo': datos_listos(),
+        'segundos_desde_inicio': round(time.perf_counter() - _inicio, 3),
+        'segundos_hasta_listo': None if _segundos_hasta_listo is None else round(_segundos_hasta_listo, 3),
+        'importacion': [{'etapa': n, 'segundos': round(s, 3)} for n, s in _etapas_importacion],
+        'precarga': [{'etapa': n, 'segundos': round(s, 3)} for n, s in _etapas_precarga],
+        'ultimo_error': _ultimo_error,
+    }
+
+
+def imprimir_informe():
+    informe = informe_arranque()
+    print(f"⏱️  Arranque del dashboard: datos listos en {informe['segundos_hasta_listo']:.2f} s")
+    for grupo in ('importacion', 'precarga'):
+        for etapa in informe[grupo]:
+            print(f"   {grupo:<11} {etapa['etapa']:<40} {etapa['segundos']:>8.3f} s")
@@ -0,0 +1,245 @@
+"""
+Benchmark del dashboard y del ETL de Aurelion sobre datos sintéticos.
+
+Genera (si no existe) un dataset con generador_datos.py para cada escala y
+mide, sin MySQL: la extracción y transformación del notebook (etl_aurelion.py),
+la carga y compactación del detalle del dashboard, la construcción del cubo con
+cada backend y cada callback del dashboard en una miss de cache (agregación +
+figura + serialización). Cada ejecución se añade a benchmarks/resultados.jsonl
+y se compara con la anterior de la misma escala.
+
+Uso:
+    python benchmark_aurelion.py --lineas 10000 100000 1000000
+    python benchmark_aurelion.py --lineas 1000000 --sqlite   # mide también la extracción SQL
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from generador_datos import dataset_existe, generar_dataset, leer_detalle_dashboard, leer_tablas_polars
+
+ESCALAS_POR_DEFECTO = [10_000, 100_000, 1_000_000]
+DIRECTORIO_DATOS = 'datos_sinteticos'
+RUTA_RESULTADOS = os.path.join('benchmarks', 'resultados.jsonl')
+REPETICIONES = 3
+# Ventana del filtro de fechas que se mide (las vistas habituales de los analistas)
+DIAS_VENTANA = 30
+
+
+def medir(funcion, repeticiones=REPETICIONES, preparar=None):
+    """Mejor tiempo de `repeticiones` ejecuciones y el último resultado"""
+    mejor = float('inf')
+    resultado = None
+    for _ in range(repeticiones):
+        if preparar is not None:
+            preparar()
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+
+def _silencioso(funcion):
+    """Ejecuta `funcion` sin los prints de progreso del notebook"""
+    def envoltura():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return funcion()
+    return envoltura
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def preparar_dataset(lineas, directorio_base, sqlite):
+    directorio = os.path.join(directorio_base, str(lineas))
+    ruta_sqlite = os.path.join(directorio, 'aurelion.db')
+    if not dataset_existe(directorio) or (sqlite and not os.path.exists(ruta_sqlite)):
+        print(f"🧪 Generando {lineas:,} líneas en '{directorio}'...")
+        generar_dataset(directorio, lineas, sqlite=sqlite)
+    return directorio
+
+
+def medir_etl(directorio, repeticiones):
+    """Pasos del notebook Aurelion.ipynb: extracción (SQLite o Parquet) y transformación"""
+    from etl_aurelion import extraer_datos_polars, transformar_datos_robusta
+
+    tiempos = {}
+    ruta_sqlite = os.path.join(directorio, 'aurelion.db')
+    if os.path.exists(ruta_sqlite):
+        conexion = sqlite3.connect(ruta_sqlite)
+        tiempos['etl.extraer_datos_polars[sqlite]'], datos = medir(
+            _silencioso(lambda: extraer_datos_polars(conexion)), repeticiones)
+        conexion.close()
+    else:
+        tiempos['etl.leer_tablas[parquet]'], datos = medir(
+            lambda: leer_tablas_polars(directorio), repeticiones)
+
+    tiempos['etl.transformar_datos_robusta'], _ = medir(
+        _silencioso(lambda: transformar_datos_robusta(datos)), repeticiones)
+    return tiempos
+
+
+def medir_cubo(df, repeticiones):
+    from cubo_polars import construir_cubo_polars, metricas_por_ciudad_polars
+    from cubo_ventas import construir_cubo, metricas_por_ciudad
+
+    tiempos = {}
+    tiempos['cubo.pandas'], _ = medir(lambda: (construir_cubo(df), metricas_por_ciudad(df)), repeticiones)
+    tiempos['cubo.polars'], _ = medir(
+        lambda: (construir_cubo_polars(df), metricas_por_ciudad_polars(df)), repeticiones)
+    return tiempos
+
+
+def _cargar_en_dashboard(df, directorio_snapshot, version):
+    """Publica `df` como snapshot compartido y hace que el dashboard lo use (sin MySQL)"""
+    from almacen_columnar import publicar_snapshot
+    from datos_dashboard import VARIABLE_SNAPSHOT_COMPARTIDO, calcular_marca_agua
+
+    publicar_snapshot(directorio_snapshot, version, df, {
+        'dimensiones': {'total_catalogo': int(df['id_producto'].nunique())},
+        'marca_agua': calcular_marca_agua(df),
+    })
+    if 'dashboard' not in sys.modules:
+        os.environ[VARIABLE_SNAPSHOT_COMPARTIDO] = directorio_snapshot
+        with contextlib.redirect_stdout(io.StringIO()):
+            import dashboard
+            from arranque_dashboard import esperar_datos
+            esperar_datos()
+    else:
+        from datos_dashboard import actualizar_snapshot
+        actualizar_snapshot()
+
+    import dashboard
+    return dashboard
+
+
+def medir_callbacks(df, directorio_snapshot, version, repeticiones):
+    """Cada callback en una miss de cache: agregación + figura + serialización"""
+    import pandas as pd
+
+    import datos_dashboard
+    from cache_figuras import _serializar
+
+    dashboard = _cargar_en_dashboard(df, directorio_snapshot, version)
+    ciudad = str(df['ciudad'].value_counts().index[0])
+    categoria = str(df['categoria'].value_counts().index[0])
+    fin = df['fecha'].max()
+    desde = fin - pd.Timedelta(days=DIAS_VENTANA - 1)
+    ventana = (desde.strftime('%Y-%m-%d'), fin.strftime('%Y-%m-%d'))
+
+    casos = [
+        ('update_kpis', 'todo', ('all', 'all')),
+        ('update_kpis', 'ciudad', (ciudad, 'all')),
+        ('update_dashboard', 'todo', ('all', 'all')),
+        ('update_dashboard', 'ciudad+categoria', (ciudad, categoria)),
+        ('update_pareto', 'top', ('all', 'all', 'top', 20)),
+        ('update_pareto', 'completo', ('all', 'all', 'completo', 20)),
+        ('update_geoanalytics', 'todo', ('ingresos', 25)),
+        ('update_kpis', f'{DIAS_VENTANA}d', ('all', 'all') + ventana),
+        ('update_dashboard', f'{DIAS_VENTANA}d', ('all', 'all') + ventana),
+        ('update_geoanalytics', f'{DIAS_VENTANA}d', ('ingresos', 25) + ventana),
+    ]
+
+    tiempos = {}
+    for nombre, etiqueta, args in casos:
+        # Sin memoización: se mide lo que cuesta una entrada nueva de la cache
+        callback = getattr(dashboard, nombre).__wrapped__
+        tiempos[f'callback.{nombre}[{etiqueta}]'], _ = medir(
+            lambda: _serializar(callback(*args)), repeticiones,
+            # Los agregados de cada periodo también se cachean: se vacían para medir el cálculo
+            preparar=datos_dashboard._periodos.clear)
+    return tiempos
+
+
+def guardar_resultado(ruta, resultado):
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    with open(ruta, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + '\n')
+
+
+def resultado_anterior(ruta, lineas):
+    """Última ejecución guardada de la misma escala, o None"""
+    if not os.path.exists(ruta):
+        return None
+    anterior = None
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            registro = json.loads(linea)
+            if registro['lineas'] == lineas:
+                anterior = registro
+    return anterior
+
+
+def imprimir_resultado(resultado, anterior):
+    cabecera = f"📊 {resultado['lineas']:,} líneas (commit {resultado['commit'] or '?'}"
+    if anterior:
+        cabecera += f", comparado con {anterior['commit'] or '?'} del {anterior['fecha']}"
+    print(cabecera + ')')
+    for paso, segundos in resultado['tiempos'].items():
+        linea = f"   {paso:<45} {segundos * 1000:>10.2f} ms"
+        previo = (anterior or {}).get('tiempos', {}).get(paso)
+        if previo:
+            linea += f"   ({(segundos - previo) / previo:+.0%})"
+        print(linea)
+
+
+def ejecutar_benchmark(escalas, directorio_base=DIRECTORIO_DATOS, repeticiones=REPETICIONES,
+                       sqlite=False, ruta_resultados=RUTA_RESULTADOS, guardar=True):
+    from datos_dashboard import backend_agregacion
+
+    resultados = []
+    with tempfile.TemporaryDirectory(prefix='aurelion_benchmark_') as directorio_snapshot:
+        for version, lineas in enumerate(escalas, start=1):
+            directorio = preparar_dataset(lineas, directorio_base, sqlite)
+
+            tiempos = medir_etl(directorio, repeticiones)
+            tiempos['dashboard.cargar_detalle'], df = medir(
+                lambda: leer_detalle_dashboard(directorio), repeticiones)
+            tiempos.update(medir_cubo(df, repeticiones))
+            tiempos.update(medir_callbacks(df, directorio_snapshot, version, repeticiones))
+
+            resultado = {
+                'fecha': datetime.now().isoformat(timespec='seconds'),
+                'commit': _commit_actual(),
+                'lineas': lineas,
+                'repeticiones': repeticiones,
+                'backend_agregacion': backend_agregacion(),
+                'tiempos': tiempos,
+            }
+            imprimir_resultado(resultado, resultado_anterior(ruta_resultados, lineas))
+            if guardar:
+                guardar_resultado(ruta_resultados, resultado)
+            resultados.append(resultado)
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del dashboard y del ETL de Aurelion')
+    parser.add_argument('--lineas', type=int, nargs='+', default=ESCALAS_POR_DEFECTO)
+    parser.add_argument('--directorio', default=DIRECTORIO_DATOS, help='Directorio de los datasets sintéticos')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--sqlite', action='store_true',
+                        help='Genera también una base SQLite y mide la extracción SQL del notebook')
+    parser.add_argument('--resultados', default=RUTA_RESULTADOS)
+    parser.add_argument('--no-guardar', action='store_true', help='No añade la ejecución a los resultados')
+    args = parser.parse_args()
+
+    ejecutar_benchmark(args.lineas, args.directorio, args.repeticiones, args.sqlite,
+                       args.resultados, guardar=not args.no_guardar)
+
+
+if __name__ == '__main__':
+    main()
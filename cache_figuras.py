@@ -0,0 +1,94 @@
+import functools
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from plotly.basedatatypes import BaseFigure
+
+from metricas_dashboard import fase
+
+# Límites por defecto: la vista "all/all" y las combinaciones habituales caben de sobra
+MAX_ENTRADAS_CACHE = 256
+TTL_CACHE_SEGUNDOS = 15 * 60
+
+
+def _serializar(valor):
+    """Figuras de Plotly → dict listo para enviar; el resto de salidas se guarda tal cual"""
+    if isinstance(valor, BaseFigure):
+        return valor.to_dict()
+    if isinstance(valor, (tuple, list)):
+        return type(valor)(_serializar(v) for v in valor)
+    return valor
+
+
+class CacheFiguras:
+    """Cache LRU con caducidad de las salidas de los callbacks, por (callback, entradas, versión de datos)"""
+
+    def __init__(self, obtener_version, max_entradas=MAX_ENTRADAS_CACHE, ttl_segundos=TTL_CACHE_SEGUNDOS):
+        self._obtener_version = obtener_version
+        self._max_entradas = max_entradas
+        self._ttl = ttl_segundos
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+
+    def _clave(self, nombre, args, kwargs):
+        entradas = json.dumps([args, kwargs], sort_keys=True, default=str)
+        return (nombre, entradas, self._obtener_version())
+
+    def obtener(self, clave):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and time.monotonic() - entrada[0] <= self._ttl:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[1]
+            if entrada is not None:
+                del self._entradas[clave]
+            self.fallos += 1
+            return None
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = (time.monotonic(), valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self._max_entradas:
+                self._entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def invalidar(self, *_):
+        """Vacía la cache; se llama cada vez que se publica una versión nueva de los datos"""
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'max_entradas': self._max_entradas,
+                'ttl_segundos': self._ttl,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'expulsiones': self.expulsiones,
+                'tasa_aciertos': self.aciertos / consultas if consultas else 0.0,
+            }
+
+    def memoizar(self, nombre):
+        """Decorador para callbacks de Dash: en un acierto se evita la agregación y la construcción de figuras"""
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(*args, **kwargs):
+                clave = self._clave(nombre, args, kwargs)
+                resultado = self.obtener(clave)
+                if resultado is None:
+                    resultado = funcion(*args, **kwargs)
+                    with fase('serializacion'):
+                        resultado = _serializar(resultado)
+                    self.guardar(clave, resultado)
+                return resultado
+            return envoltura
+        return decorador
@@ -0,0 +1,329 @@
+"""
+Modo pushdown del dashboard (AURELION_MODO_DATOS=sql): los agregados se calculan en la base de datos.
+
+El dashboard no carga el detalle de ventas. Cada callback pide solo los
+gráficos que pinta; los que no están en la cache de resultados se resuelven con
+una única consulta (UNION ALL de un GROUP BY parametrizado por gráfico), así
+que lo que viaja desde la base de datos depende del tamaño del resultado y no
+del de las tablas. Las celdas tienen la misma estructura que las de
+`cubo_ventas.consultar_cubo` y las métricas por ciudad el mismo frame que
+`metricas_por_ciudad`, de modo que las figuras no cambian.
+
+Funciona con MySQL y con el motor embebido (motor_embebido.py). Con
+AURELION_RESUMENES=1 los repartos que lo admiten se leen de las tablas resumen
+(resumenes_aurelion.py), que se ponen al día al crear cada snapshot.
+"""
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cubo_ventas import DIAS_ORDEN, TODOS, _celda_vacia
+from datos_dashboard import JOIN_VENTAS, conectar_bd, obtener_dimensiones
+from metricas_dashboard import fase, registrar_filas
+from motor_embebido import leer_sql, motor_bd
+from resumenes_aurelion import SIN_VALOR, actualizar_resumenes, usar_resumenes
+
+# Resultados por (versión, consulta, filtros); caducan igual que la cache de figuras
+MAX_RESULTADOS_CACHE = 512
+TTL_RESULTADOS_SEGUNDOS = 15 * 60
+
+# Día de la semana en inglés, como `dt.day_name()` en el modo memoria
+DIA_SEMANA_SQL = {
+    'mysql': 'DAYNAME(v.fecha)',
+    'duckdb': 'dayname(v.fecha)',
+    'sqlite': "CASE CAST(strftime('%w', v.fecha) AS INTEGER) "
+              + ' '.join(f"WHEN {i} THEN '{dia}'" for i, dia in enumerate(DIAS_ORDEN[-1:] + DIAS_ORDEN[:-1]))
+              + ' END',
+}
+
+# Expresión agrupada de cada consulta de reparto (None = día de la semana, depende del motor)
+DIMENSIONES_SQL = {
+    'productos': 'dv.nombre_producto',
+    'ciudades': 'c.ciudad',
+    'medios_pago': 'v.medio_pago',
+    'dias_semana': None,
+    'clientes_top': 'c.nombre_cliente',
+}
+# Consulta que alimenta cada clave de la celda
+CONSULTA_GRAFICO = {
+    'kpis': 'kpis',
+    'productos': 'productos',
+    'ciudades': 'ciudades',
+    'ticket_ciudad': 'ciudades',
+    'medios_pago': 'medios_pago',
+    'dias_semana': 'dias_semana',
+    'clientes_top': 'clientes_top',
+}
+# Reparto que se puede leer de cada tabla resumen y filtros que esa tabla no conserva
+CONSULTAS_RESUMEN = {
+    'ciudades': ('Resumen_Ventas_Diarias', 'ciudad', ()),
+    'medios_pago': ('Resumen_Ventas_Diarias', 'medio_pago', ()),
+    'dias_semana': ('Resumen_Ventas_Diarias', None, ()),
+    'productos': ('Resumen_Productos', 'nombre_producto', ('ciudad', 'fechas')),
+    'clientes_top': ('Resumen_Clientes', 'nombre_cliente', ('categoria', 'fechas')),
+}
+COLUMNAS_RESULTADO = ['grafico', 'valor', 'importe', 'lineas', 'ventas', 'clientes', 'productos', 'primera_fecha']
+
+
+@dataclass(frozen=True)
+class SnapshotSQL:
+    """Versión de los datos en modo sql: solo lo que necesita el layout, sin detalle"""
+    version: int
+    fechas: np.ndarray  # primera y última fecha de venta (límites del selector de periodo)
+    valores_filtros: dict
+    dimensiones: dict
+    marca_agua: dict
+
+    def valores(self, columna):
+        return self.valores_filtros[columna]
+
+    def mismos_datos(self, otro):
+        return (self.marca_agua, self.dimensiones, self.valores_filtros) == \
+               (otro.marca_agua, otro.dimensiones, otro.valores_filtros)
+
+
+_resultados = OrderedDict()
+_lock_resultados = threading.Lock()
+
+
+def descartar_resultados_anteriores(version):
+    """Quita de la cache los resultados de snapshots anteriores a `version`, que ya no se piden"""
+    with _lock_resultados:
+        for clave in [c for c in _resultados if c[0] < version]:
+            del _resultados[clave]
+
+
+def crear_snapshot_sql(version):
+    """Estado del modo sql: marca de agua, rango de fechas y opciones de los filtros (consultas sobre índices)"""
+    with fase('sql'):
+        conn = conectar_bd()
+        try:
+            if usar_resumenes():
+                actualizar_resumenes(conn)
+            resumen = leer_sql(
+                "SELECT MAX(id_venta) AS id_venta, COUNT(*) AS ventas, MIN(fecha) AS primera, MAX(fecha) AS ultima, "
+                "(SELECT MAX(id_detalle) FROM Detalles_Ventas) AS id_detalle, "
+                "(SELECT COUNT(*) FROM Detalles_Ventas) AS lineas FROM Ventas", conn)
+            ciudades = leer_sql(
+                "SELECT DISTINCT ciudad FROM Clientes WHERE ciudad IS NOT NULL ORDER BY ciudad", conn)
+            categorias = leer_sql(
+                "SELECT DISTINCT categoria FROM Productos WHERE categoria IS NOT NULL ORDER BY categoria", conn)
+        finally:
+            conn.close()
+        dimensiones = obtener_dimensiones()
+
+    fila = resumen.iloc[0]
+    vacio = pd.isna(fila['ultima'])
+    fechas = pd.to_datetime(pd.Series([] if vacio else [fila['primera'], fila['ultima']]))
+    return SnapshotSQL(
+        version=version,
+        fechas=fechas.to_numpy(dtype='datetime64[ns]'),
+        valores_filtros={
+            'ciudad': ciudades['ciudad'].astype(str).tolist(),
+            'categoria': categorias['categoria'].astype(str).tolist(),
+        },
+        dimensiones=dimensiones,
+        # Con las líneas y sus recuentos, también cambia al añadir o borrar líneas de ventas ya existentes
+        marca_agua=None if vacio else {'id_venta': fila['id_venta'], 'fecha': fechas.iloc[-1],
+                                       'id_detalle': fila['id_detalle'], 'ventas': int(fila['ventas']),
+                                       'lineas': int(fila['lineas'])},
+    )
+
+
+def _filtros(ciudad, categoria, fecha_inicio, fecha_fin):
+    """Condición WHERE y parámetros de los filtros (ambos días del periodo incluidos)"""
+    condiciones, params = [], []
+    if ciudad and ciudad != TODOS:
+        condiciones.append('c.ciudad = %s')
+        params.append(ciudad)
+    if categoria and categoria != TODOS:
+        condiciones.append('p.categoria = %s')
+        params.append(categoria)
+    if fecha_inicio:
+        condiciones.append('v.fecha >= %s')
+        params.append(pd.Timestamp(fecha_inicio).normalize().to_pydatetime())
+    if fecha_fin:
+        condiciones.append('v.fecha < %s')
+        params.append((pd.Timestamp(fecha_fin).normalize() + pd.Timedelta(days=1)).to_pydatetime())
+    return ' AND '.join(condiciones) or '1 = 1', params
+
+
+def _subconsulta_detalle(consulta, donde):
+    if consulta == 'kpis':
+        return (f"SELECT 'kpis' AS grafico, NULL AS valor, SUM(dv.importe) AS importe, COUNT(*) AS lineas, "
+                f"COUNT(DISTINCT v.id_venta) AS ventas, COUNT(DISTINCT v.id_cliente) AS clientes, "
+                f"COUNT(DISTINCT dv.id_producto) AS productos, NULL AS primera_fecha {JOIN_VENTAS} WHERE {donde}")
+    if consulta == 'metricas':
+        return (f"SELECT 'metricas' AS grafico, c.ciudad AS valor, SUM(dv.importe) AS importe, COUNT(*) AS lineas, "
+                f"COUNT(DISTINCT v.id_venta) AS ventas, COUNT(DISTINCT v.id_cliente) AS clientes, "
+                f"NULL AS productos, MIN(v.fecha) AS primera_fecha {JOIN_VENTAS} "
+                f"WHERE {donde} AND c.ciudad IS NOT NULL GROUP BY c.ciudad")
+
+    dimension = DIMENSIONES_SQL[consulta] or DIA_SEMANA_SQL[motor_bd()]
+    sql = (f"SELECT '{consulta}' AS grafico, {dimension} AS valor, SUM(dv.importe) AS importe, "
+           f"COUNT(*) AS lineas, NULL AS ventas, NULL AS clientes, NULL AS productos, "
+           f"NULL AS primera_fecha "
+           f"{JOIN_VENTAS} WHERE {donde} AND {dimension} IS NOT NULL GROUP BY {dimension}")
+    if consulta == 'clientes_top':
+        # Solo los 10 mejores clientes salen de la base de datos
+        sql += ' ORDER BY importe DESC LIMIT 10'
+    return sql
+
+
+def _subconsulta_resumen(consulta, ciudad, categoria, fecha_inicio, fecha_fin):
+    """Reparto leído de una tabla resumen, o None si la tabla no conserva alguno de los filtros"""
+    tabla, columna, no_filtrables = CONSULTAS_RESUMEN[consulta]
+    activos = {
+        'ciudad': bool(ciudad and ciudad != TODOS),
+        'categoria': bool(categoria and categoria != TODOS),
+        'fechas': bool(fecha_inicio or fecha_fin),
+    }
+    if any(activos[filtro] for filtro in no_filtrables):
+        return None
+
+    condiciones, params = [], []
+    if activos['ciudad']:
+        condiciones.append('r.ciudad = %s')
+        params.append(ciudad)
+    if activos['categoria']:
+        condiciones.append('r.categoria = %s')
+        params.append(categoria)
+    # Las tablas guardan el día: el periodo se compara por fecha, con ambos días incluidos
+    if fecha_inicio:
+        condiciones.append('r.fecha >= %s')
+        params.append(pd.Timestamp(fecha_inicio).date())
+    if fecha_fin:
+        condiciones.append('r.fecha <= %s')
+        params.append(pd.Timestamp(fecha_fin).date())
+    if columna is None:
+        dimension = DIA_SEMANA_SQL[motor_bd()].replace('v.fecha', 'r.fecha')
+    else:
+        dimension = f'r.{columna}'
+        # Las dimensiones nulas se guardan como SIN_VALOR; el detalle las descarta
+        condiciones.append(f"{dimension} <> '{SIN_VALOR}'" if tabla == 'Resumen_Ventas_Diarias'
+                           else f'{dimension} IS NOT NULL')
+    if tabla == 'Resumen_Clientes':
+        # Clientes con ventas pero sin líneas de detalle no aparecen en el detalle
+        condiciones.append('r.lineas > 0')
+
+    sql = (f"SELECT '{consulta}' AS grafico, {dimension} AS valor, SUM(r.importe) AS importe, "
+           f"SUM(r.lineas) AS lineas, NULL AS ventas, NULL AS clientes, NULL AS productos, "
+           f"NULL AS primera_fecha FROM {tabla} r "
+           f"WHERE {' AND '.join(condiciones) or '1 = 1'} GROUP BY {dimension}")
+    if consulta == 'clientes_top':
+        sql += ' ORDER BY importe DESC LIMIT 10'
+    return sql, params
+
+
+def _subconsulta(consulta, filtros):
+    """SQL y parámetros de una consulta: de las tablas resumen si están activas y sirven, si no del detalle"""
+    if usar_resumenes() and consulta in CONSULTAS_RESUMEN:
+        resumen = _subconsulta_resumen(consulta, *filtros)
+        if resumen is not None:
+            return resumen
+    donde, params = _filtros(*filtros)
+    return _subconsulta_detalle(consulta, donde), params
+
+
+def _ejecutar_lote(consultas, filtros):
+    """Todas las consultas pendientes de un callback en una sola ida y vuelta"""
+    partes, params = [], []
+    for consulta in consultas:
+        sql, params_consulta = _subconsulta(consulta, filtros)
+        partes.append(f'SELECT * FROM ({sql}) t_{consulta}')
+        params += params_consulta
+    with fase('sql'):
+        conn = conectar_bd()
+        try:
+            resultado = leer_sql('\nUNION ALL\n'.join(partes), conn, params=params)
+        finally:
+            conn.close()
+    registrar_filas(len(resultado))
+    resultado.columns = COLUMNAS_RESULTADO
+    return {c: resultado[resultado['grafico'] == c] for c in consultas}
+
+
+def _consultar(snapshot, consultas, filtros):
+    """Resultado de cada consulta: de la cache si está, y las que faltan en un único lote"""
+    ahora = time.monotonic()
+    encontrados, pendientes = {}, []
+    with _lock_resultados:
+        for consulta in consultas:
+            clave = (snapshot.version, consulta, filtros)
+            entrada = _resultados.get(clave)
+            if entrada is not None and ahora - entrada[0] <= TTL_RESULTADOS_SEGUNDOS:
+                _resultados.move_to_end(clave)
+                encontrados[consulta] = entrada[1]
+            else:
+                pendientes.append(consulta)
+
+    if pendientes:
+        nuevos = _ejecutar_lote(pendientes, filtros)
+        with _lock_resultados:
+            for consulta, parte in nuevos.items():
+                _resultados[(snapshot.version, consulta, filtros)] = (ahora, parte)
+            while len(_resultados) > MAX_RESULTADOS_CACHE:
+                _resultados.popitem(last=False)
+        encontrados.update(nuevos)
+    return encontrados
+
+
+def _serie(parte, columna):
+    return pd.Series(
+        pd.to_numeric(parte[columna]).to_numpy(dtype='float64'),
+        index=pd.Index(parte['valor'].astype(str).tolist(), name='valor'),
+        name=columna,
+    )
+
+
+def celda_sql(snapshot, ciudad, categoria, fecha_inicio=None, fecha_fin=None, graficos=None):
+    """Celda con los `graficos` pedidos (todas las claves si es None) calculada en la base de datos"""
+    claves = list(CONSULTA_GRAFICO) if graficos is None else list(graficos)
+    consultas = list(dict.fromkeys(CONSULTA_GRAFICO[g] for g in claves))
+    filtros = (ciudad, categoria, fecha_inicio, fecha_fin)
+    resultados = _consultar(snapshot, consultas, filtros)
+
+    celda = _celda_vacia()
+    for consulta, parte in resultados.items():
+        if consulta == 'kpis':
+            fila = parte.iloc[0]
+            celda['kpis'] = {
+                'ingresos': 0 if pd.isna(fila['importe']) else float(fila['importe']),
+                **{kpi: int(fila[kpi]) for kpi in ('ventas', 'clientes', 'productos')},
+            }
+            continue
+
+        # Mismo orden que el cubo: ordenado por valor antes de ordenar por importe
+        parte = parte.sort_values('valor', kind='stable')
+        importe = _serie(parte, 'importe')
+        if consulta == 'ciudades':
+            celda['ciudades'] = importe.sort_values(ascending=False)
+            celda['ticket_ciudad'] = (importe / _serie(parte, 'lineas')).sort_values(ascending=False)
+        elif consulta == 'dias_semana':
+            celda['dias_semana'] = importe.reindex(DIAS_ORDEN)
+        elif consulta == 'clientes_top':
+            celda['clientes_top'] = importe.nlargest(10).sort_values(ascending=True)
+        else:
+            celda[consulta] = importe.sort_values(ascending=False)
+    return celda
+
+
+def metricas_ciudades_sql(snapshot, fecha_inicio=None, fecha_fin=None):
+    """Ingresos, ventas, clientes y ticket por ciudad del periodo, calculados en la base de datos"""
+    parte = _consultar(snapshot, ['metricas'], (TODOS, TODOS, fecha_inicio, fecha_fin))['metricas']
+    # Ciudades en orden de su primera venta, como el groupby(sort=False) sobre el detalle
+    # ordenado por fecha (con la misma primera fecha, por nombre)
+    parte = parte.assign(primera_fecha=pd.to_datetime(parte['primera_fecha'])) \
+        .sort_values(['primera_fecha', 'valor'], kind='stable')
+    metricas = pd.DataFrame({
+        'ciudad': parte['valor'].astype(str).to_numpy(dtype=object),
+        'ingresos': pd.to_numeric(parte['importe']).to_numpy(dtype='float64'),
+        'ventas': pd.to_numeric(parte['ventas']).to_numpy(dtype='int64'),
+        'clientes': pd.to_numeric(parte['clientes']).to_numpy(dtype='int64'),
+    })
+    metricas['ticket'] = metricas['ingresos'] / metricas['ventas']
+    return metricas
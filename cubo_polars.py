@@ -0,0 +1,198 @@
+"""
+Backend Polars del cubo del dashboard.
+
+Calcula los mismos agregados que `cubo_ventas.construir_cubo` y
+`cubo_ventas.metricas_por_ciudad`, pero como consultas lazy de Polars que se
+ejecutan juntas (`collect_all`) y en paralelo en todos los núcleos. El
+resultado tiene la misma estructura (series de pandas por celda), así que los
+callbacks no cambian.
+
+Comparación con pandas sobre el snapshot local:
+    python cubo_polars.py
+"""
+import time
+
+import numpy as np
+import pandas as pd
+import polars as pl
+
+from cubo_ventas import (
+    COLUMNAS_DISTINTAS_KPI, DIAS_ORDEN, DIMENSIONES_GRAFICOS, NIVELES_CUBO, TODOS,
+    _celda_vacia, _clave_celda, construir_cubo, metricas_por_ciudad
+)
+
+
+def a_polars(df):
+    """Frame lazy de Polars con las columnas que usan las agregaciones (categóricas incluidas)"""
+    columnas = sorted({'ciudad', 'categoria', 'importe',
+                       *DIMENSIONES_GRAFICOS.values(), *COLUMNAS_DISTINTAS_KPI.values()})
+    return pl.from_pandas(df[columnas]).lazy()
+
+
+def _consultas_reparto(lf):
+    """Una consulta por (gráfico, nivel del cubo): importe y líneas por nivel × valor de la dimensión"""
+    consultas = []
+    for grafico, dimension in DIMENSIONES_GRAFICOS.items():
+        base = (
+            lf.group_by(['ciudad', 'categoria', pl.col(dimension).alias('valor')])
+            .agg(pl.col('importe').sum(), pl.len().alias('lineas'))
+        )
+        for nivel in NIVELES_CUBO:
+            claves = list(nivel) + ['valor']
+            consulta = (
+                base.group_by(claves)
+                .agg(pl.col('importe').sum(), pl.col('lineas').sum())
+                # Igual que un groupby directo sobre la dimensión: sin valores nulos
+                .filter(pl.col('valor').is_not_null())
+                # Mismo orden de partida que pandas (categorías ordenadas) antes de ordenar por importe
+                .sort([pl.col(c).cast(pl.String) for c in claves])
+            )
+            consultas.append((grafico, nivel, consulta))
+    return consultas
+
+
+def _consultas_kpis(lf):
+    columnas = list(COLUMNAS_DISTINTAS_KPI.values())
+    agregados = [pl.col(c).n_unique() for c in columnas] + [pl.col('importe').sum()]
+    consultas = []
+    for nivel in NIVELES_CUBO:
+        if nivel:
+            consultas.append((nivel, lf.group_by(list(nivel)).agg(agregados)))
+        else:
+            consultas.append((nivel, lf.select(agregados)))
+    return consultas
+
+
+def _celdas(nivel, resultado):
+    """Parte el resultado de un nivel en (clave de celda, frame de la celda)"""
+    if not nivel:
+        yield (TODOS, TODOS), resultado
+        return
+    for valores, parte in resultado.partition_by(list(nivel), as_dict=True, maintain_order=True).items():
+        yield _clave_celda(nivel, valores), parte
+
+
+def _serie(parte, columna):
+    return pd.Series(
+        parte[columna].to_numpy(),
+        index=pd.Index(parte['valor'].cast(pl.String).to_list(), name='valor'),
+        name=columna,
+    )
+
+
+def construir_cubo_polars(df):
+    """Mismo cubo que `construir_cubo`, con las agrupaciones ejecutadas por Polars"""
+    lf = a_polars(df)
+    reparto = _consultas_reparto(lf)
+    kpis = _consultas_kpis(lf)
+    resultados = pl.collect_all([c for _, _, c in reparto] + [c for _, c in kpis])
+
+    cubo = {}
+    for (grafico, nivel, _), resultado in zip(reparto, resultados):
+        for clave, parte in _celdas(nivel, resultado):
+            celda = cubo.setdefault(clave, _celda_vacia())
+            importe = _serie(parte, 'importe')
+
+            if grafico == 'productos':
+                celda['productos'] = importe.sort_values(ascending=False)
+            elif grafico == 'ciudades':
+                celda['ciudades'] = importe.sort_values(ascending=False)
+                # Ticket promedio por ciudad = media del importe por línea
+                celda['ticket_ciudad'] = (importe / _serie(parte, 'lineas')).sort_values(ascending=False)
+            elif grafico == 'medios_pago':
+                celda['medios_pago'] = importe.sort_values(ascending=False)
+            elif grafico == 'dias_semana':
+                celda['dias_semana'] = importe.reindex(DIAS_ORDEN)
+            else:
+                celda['clientes_top'] = importe.nlargest(10).sort_values(ascending=True)
+
+    for (nivel, _), resultado in zip(kpis, resultados[len(reparto):]):
+        for clave, parte in _celdas(nivel, resultado):
+            fila = parte.row(0, named=True)
+            celda = cubo.setdefault(clave, _celda_vacia())
+            celda['kpis'] = {
+                'ingresos': fila['importe'],
+                **{kpi: int(fila[columna]) for kpi, columna in COLUMNAS_DISTINTAS_KPI.items()},
+            }
+
+    return cubo
+
+
+def metricas_por_ciudad_polars(df):
+    """Mismas métricas que `metricas_por_ciudad`, calculadas con una consulta lazy de Polars"""
+    return (
+        a_polars(df)
+        .group_by('ciudad', maintain_order=True)
+        .agg(
+            pl.col('importe').sum().alias('ingresos'),
+            # Conteos como Int64 (n_unique devuelve UInt32, que plotly no trata como continuo)
+            pl.col('id_venta').n_unique().cast(pl.Int64).alias('ventas'),
+            pl.col('id_cliente').n_unique().cast(pl.Int64).alias('clientes'),
+        )
+        # Ticket promedio = media de los totales por venta = ingresos / ventas distintas
+        .with_columns((pl.col('ingresos') / pl.col('ventas')).alias('ticket'))
+        .with_columns(pl.col('ciudad').cast(pl.String))
+        .collect()
+        .to_pandas()
+    )
+
+
+def _diferencia_maxima(cubo_a, cubo_b):
+    """Mayor diferencia relativa entre dos cubos (inf si no tienen las mismas celdas o índices)"""
+    if cubo_a.keys() != cubo_b.keys():
+        return float('inf')
+    maxima = 0.0
+    for clave, celda in cubo_a.items():
+        otra = cubo_b[clave]
+        for nombre, valor in celda.items():
+            if nombre == 'kpis':
+                a = np.array(list(valor.values()), dtype='float64')
+                b = np.array(list(otra[nombre].values()), dtype='float64')
+            else:
+                if set(valor.index) != set(otra[nombre].index):
+                    return float('inf')
+                a = valor.to_numpy(dtype='float64')
+                b = otra[nombre].reindex(valor.index).to_numpy(dtype='float64')
+            escala = np.maximum(np.abs(a), 1.0)
+            diferencia = np.nan_to_num(np.abs(a - b) / escala, nan=0.0)
+            maxima = max(maxima, float(diferencia.max(initial=0.0)))
+    return maxima
+
+
+def comparar_backends(df, repeticiones=3):
+    """Mejor tiempo de cubo + métricas por ciudad con cada backend y diferencia entre resultados"""
+    def medir(funcion):
+        tiempos = []
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = funcion(df)
+            tiempos.append(time.perf_counter() - inicio)
+        return min(tiempos), resultado
+
+    t_pandas, (cubo_pandas, metricas_pandas) = medir(lambda d: (construir_cubo(d), metricas_por_ciudad(d)))
+    t_polars, (cubo_pl, metricas_pl) = medir(lambda d: (construir_cubo_polars(d), metricas_por_ciudad_polars(d)))
+
+    return {
+        'lineas': len(df),
+        'segundos_pandas': t_pandas,
+        'segundos_polars': t_polars,
+        'aceleracion': t_pandas / t_polars if t_polars else float('inf'),
+        'diferencia_cubo': _diferencia_maxima(cubo_pandas, cubo_pl),
+        'metricas_iguales': bool(np.allclose(
+            metricas_pandas[['ingresos', 'ventas', 'clientes', 'ticket']].to_numpy(dtype='float64'),
+            metricas_pl[['ingresos', 'ventas', 'clientes', 'ticket']].to_numpy(dtype='float64'),
+            rtol=1e-5,
+        )) and metricas_pandas['ciudad'].tolist() == metricas_pl['ciudad'].tolist(),
+    }
+
+
+if __name__ == '__main__':
+    from datos_dashboard import cargar_datos_arranque
+
+    df, _, _, _ = cargar_datos_arranque(delta=False)
+    resultado = comparar_backends(df)
+    print(f"📊 {resultado['lineas']:,} líneas")
+    print(f"   pandas: {resultado['segundos_pandas']:.3f} s")
+    print(f"   polars: {resultado['segundos_polars']:.3f} s (x{resultado['aceleracion']:.1f})")
+    print(f"   diferencia relativa máxima del cubo: {resultado['diferencia_cubo']:.2e}")
+    print(f"   métricas por ciudad iguales: {'sí' if resultado['metricas_iguales'] else 'no'}")
@@ -0,0 +1,197 @@
+import numpy as np
+import pandas as pd
+
+# Valor que usan los filtros del dashboard para "sin filtrar"
+TODOS = 'all'
+
+# Niveles del cubo: (ciudad, categoría) y sus totales parciales y general
+NIVELES_CUBO = [('ciudad', 'categoria'), ('ciudad',), ('categoria',), ()]
+
+DIAS_ORDEN = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Dimensión del detalle que alimenta cada gráfico del análisis comercial
+DIMENSIONES_GRAFICOS = {
+    'productos': 'nombre_producto',
+    'ciudades': 'ciudad',
+    'medios_pago': 'medio_pago',
+    'dias_semana': 'dia_semana',
+    'clientes': 'nombre_cliente',
+}
+
+# Conteos distintos de los KPIs (no se pueden sumar entre celdas)
+COLUMNAS_DISTINTAS_KPI = {
+    'ventas': 'id_venta',
+    'clientes': 'id_cliente',
+    'productos': 'id_producto',
+}
+
+
+def _clave_celda(nivel, valores):
+    """Traduce los valores de un nivel del cubo a la clave (ciudad, categoria)"""
+    if not isinstance(valores, tuple):
+        valores = (valores,)
+    asignacion = dict(zip(nivel, valores))
+    return (asignacion.get('ciudad', TODOS), asignacion.get('categoria', TODOS))
+
+
+def _agregado_base(df, dimension):
+    """Suma de importe y número de líneas por ciudad × categoría × dimensión"""
+    return (
+        df.groupby(['ciudad', 'categoria', df[dimension].rename('valor')],
+                   observed=True, dropna=False)['importe']
+        .agg(importe='sum', lineas='count')
+        .reset_index()
+    )
+
+
+def _reparto_por_celda(base):
+    """Acumula el agregado base en cada nivel y lo reparte por celda del cubo"""
+    for nivel in NIVELES_CUBO:
+        claves = list(nivel) + ['valor']
+        agregado = base.groupby(claves, observed=True, dropna=False)[['importe', 'lineas']].sum()
+        # Igual que un groupby directo sobre la dimensión: sin valores nulos
+        agregado = agregado[agregado.index.get_level_values('valor').notna()]
+
+        if not nivel:
+            yield (TODOS, TODOS), agregado
+            continue
+
+        for valores, grupo in agregado.groupby(level=list(nivel), observed=True, dropna=False):
+            yield _clave_celda(nivel, valores), grupo.droplevel(list(nivel))
+
+
+def _kpis_por_celda(df):
+    """Ingresos y conteos distintos de los KPIs para cada nivel del cubo"""
+    columnas = list(COLUMNAS_DISTINTAS_KPI.values())
+
+    for nivel in NIVELES_CUBO:
+        if not nivel:
+            agregado = df[columnas].nunique().to_frame().T
+            agregado['importe'] = df['importe'].sum()
+            yield (TODOS, TODOS), agregado.iloc[0]
+            continue
+
+        agrupado = df.groupby(list(nivel), observed=True, dropna=False)
+        agregado = agrupado[columnas].nunique()
+        agregado['importe'] = agrupado['importe'].sum()
+        for valores, fila in agregado.iterrows():
+            yield _clave_celda(nivel, valores), fila
+
+
+def _celda_vacia():
+    vacia = pd.Series(dtype='float64')
+    return {
+        'kpis': {'ingresos': 0, 'ventas': 0, 'clientes': 0, 'productos': 0},
+        'productos': vacia,
+        'ciudades': vacia,
+        'medios_pago': vacia,
+        'dias_semana': vacia.reindex(DIAS_ORDEN),
+        'ticket_ciudad': vacia,
+        'clientes_top': vacia,
+    }
+
+
+def construir_cubo(df):
+    """Precalcula los agregados del análisis comercial para cada par (ciudad, categoría)"""
+    cubo = {}
+
+    for grafico, dimension in DIMENSIONES_GRAFICOS.items():
+        base = _agregado_base(df, dimension)
+
+        for clave, grupo in _reparto_por_celda(base):
+            celda = cubo.setdefault(clave, _celda_vacia())
+            importe = grupo['importe']
+
+            if grafico == 'productos':
+                celda['productos'] = importe.sort_values(ascending=False)
+            elif grafico == 'ciudades':
+                celda['ciudades'] = importe.sort_values(ascending=False)
+                # Ticket promedio por ciudad = media del importe por línea
+                celda['ticket_ciudad'] = (importe / grupo['lineas']).sort_values(ascending=False)
+            elif grafico == 'medios_pago':
+                celda['medios_pago'] = importe.sort_values(ascending=False)
+            elif grafico == 'dias_semana':
+                celda['dias_semana'] = importe.reindex(DIAS_ORDEN)
+            else:
+                celda['clientes_top'] = importe.nlargest(10).sort_values(ascending=True)
+
+    for clave, fila in _kpis_por_celda(df):
+        celda = cubo.setdefault(clave, _celda_vacia())
+        celda['kpis'] = {
+            'ingresos': fila['importe'],
+            **{kpi: int(fila[columna]) for kpi, columna in COLUMNAS_DISTINTAS_KPI.items()},
+        }
+
+    return cubo
+
+
+def _submuestrear_acumulado(acumulado, tolerancia_abs):
+    """Índices de una curva acumulada no decreciente tales que interpolar entre ellos
+    no se aleja más de `tolerancia_abs` de ningún punto omitido"""
+    n = len(acumulado)
+    indices = [0]
+    i = 0
+    while i < n - 1:
+        # Último punto que sigue dentro de la tolerancia respecto de i
+        j = int(np.searchsorted(acumulado, acumulado[i] + tolerancia_abs, side='right')) - 1
+        i = max(j, i + 1) if j < n - 1 else n - 1
+        indices.append(i)
+    return np.asarray(indices)
+
+
+def resumir_pareto(ingresos_productos, top_n, tolerancia=0.005):
+    """Pareto acotado: top-N productos, un agregado "otros" y la curva acumulada submuestreada.
+
+    El corte del 80% se calcula sobre todos los productos. La curva acumulada se
+    devuelve por posición en el ranking y, entre dos puntos enviados, ningún producto
+    omitido difiere de la interpolación lineal en más de `tolerancia` × ingresos totales.
+    """
+    valores = ingresos_productos.to_numpy(dtype='float64')
+    acumulado = np.cumsum(valores)
+    total = acumulado[-1] if len(acumulado) else 0.0
+
+    # Número exacto de productos necesarios para llegar al 80% de los ingresos
+    productos_80 = int(np.searchsorted(acumulado, total * 0.8, side='left')) + 1 if total > 0 else 0
+
+    if len(valores) and (valores >= 0).all():
+        indices = _submuestrear_acumulado(acumulado, tolerancia * total)
+        # Los puntos del top-N se envían siempre: coinciden con las barras
+        indices = np.union1d(np.arange(min(top_n, len(valores))), indices)
+    else:
+        # Con importes negativos la curva no es monótona y no hay cota garantizada
+        indices = np.arange(len(valores))
+
+    top = ingresos_productos.iloc[:top_n]
+    return {
+        'top': top,
+        'otros': float(total - top.sum()),
+        'num_otros': max(len(valores) - top_n, 0),
+        'num_productos': len(valores),
+        'total': float(total),
+        'productos_80': productos_80,
+        'curva_rango': indices + 1,
+        'curva_acumulado': acumulado[indices],
+        'error_maximo': tolerancia * total,
+    }
+
+
+def metricas_por_ciudad(df):
+    """Ingresos, ventas, ticket y clientes de todas las ciudades en una sola agrupación"""
+    metricas = df.groupby('ciudad', observed=True, sort=False).agg(
+        ingresos=('importe', 'sum'),
+        ventas=('id_venta', 'nunique'),
+        clientes=('id_cliente', 'nunique'),
+    )
+    # Ticket promedio = media de los totales por venta = ingresos / ventas distintas
+    metricas['ticket'] = metricas['ingresos'] / metricas['ventas']
+    metricas.index = metricas.index.astype('object')
+    return metricas.reset_index()
+
+
+def consultar_cubo(cubo, ciudad, categoria):
+    """Devuelve los agregados ya calculados para los filtros seleccionados"""
+    celda = cubo.get((ciudad, categoria))
+    if celda is None:
+        # Combinación sin ventas (o filtro vacío): gráficos vacíos
+        return _celda_vacia()
+    return celda
@@ -1,11 +1,18 @@
+from arranque_dashboard import (
+    datos_listos, esperar_datos, importar, informe_arranque, iniciar_precarga, marcar_etapa
+)
 import dash
 from dash import dcc, html, Input, Output
-import plotly.express as px
+from flask import jsonify
 import plotly.graph_objects as go
-import pandas as pd
-import mysql.connector
 import warnings
+from cache_figuras import CacheFiguras
+from metricas_dashboard import iniciar_fase, instrumentar, registrar_en_servidor, registrar_recolector
 warnings.filterwarnings('ignore')
+marcar_etapa('importar dash, flask y plotly')
+
+# pandas, plotly.express, mysql.connector y los módulos de datos no se importan aquí:
+# los importa el hilo de precarga y los callbacks los toman ya cargados de sys.modules
 
 # Paleta de colores profesional moderna
 COLOR_PALETTE = ['#2E86AB', '#A23B72', '#F18F01', '#C73E1D', '#3B1F2B', '#6B8E23']
@@ -14,6 +21,10 @@ CARD_BACKGROUND = '#ffffff'
 TEXT_COLOR = '#2c3e50'
 ACCENT_COLOR = '#3498db'
 
+# Pareto: productos con barra propia en el modo Top-N y error máximo de la curva acumulada
+PARETO_TOP_N = 20
+PARETO_TOLERANCIA_CURVA = 0.005  # fracción de los ingresos totales
+
 # Coordenadas de las ciudades de Córdoba (aproximadas)
 COORDENADAS_CIUDADES = {
     'Cordoba': {'lat': -31.4201, 'lon': -64.1888},
@@ -24,57 +35,74 @@ COORDENADAS_CIUDADES = {
     'Mendiolaza': {'lat': -31.2675, 'lon': -64.3000}
 }
 
-# Conexión a la base de datos
-def conectar_bd():
-    config = {
-        'host': 'localhost',
-        'user': 'root',
-        'password': '',
-        'database': 'AurelionDB',
-        'port': 3306
-    }
-    return mysql.connector.connect(**config)
+# Snapshot vigente de los datos; si la precarga no ha terminado, espera a que termine
+def obtener_snapshot():
+    esperar_datos()
+    from datos_dashboard import obtener_snapshot as snapshot_vigente
+    return snapshot_vigente()
 
-# Obtener datos para el dashboard
-def obtener_datos_dashboard():
-    conn = conectar_bd()
-    
-    query = """
-    SELECT 
-        v.id_venta,
-        v.fecha,
-        v.id_cliente,
-        v.medio_pago,
-        c.ciudad,
-        c.nombre_cliente,
-        dv.id_producto,
-        dv.nombre_producto,
-        dv.cantidad,
-        dv.precio_unitario,
-        dv.importe,
-        p.categoria
-    FROM Ventas v
-    JOIN Clientes c ON v.id_cliente = c.id_cliente
-    JOIN Detalles_Ventas dv ON v.id_venta = dv.id_venta
-    JOIN Productos p ON dv.id_producto = p.id_producto
-    """
-    
-    df = pd.read_sql(query, conn)
-    conn.close()
-    
-    # Procesamiento de datos
-    df['fecha'] = pd.to_datetime(df['fecha'])
-    df['mes'] = df['fecha'].dt.month_name()
-    df['dia_semana'] = df['fecha'].dt.day_name()
-    df['trimestre'] = df['fecha'].dt.quarter
-    
-    return df
 
-# Cargar datos
-df = obtener_datos_dashboard()
+# Agregados de los filtros y del periodo elegidos (todo el histórico si no hay rango):
+# del cubo en memoria o, en modo sql, consultando solo los `graficos` que pinta el callback.
+# Quien lea más datos del snapshot pasa el suyo, para que todo salga de la misma versión
+def obtener_celda(ciudad, categoria, fecha_inicio=None, fecha_fin=None, graficos=None, snapshot=None):
+    from datos_dashboard import celda_periodo
+    return celda_periodo(snapshot or obtener_snapshot(), ciudad, categoria, fecha_inicio, fecha_fin, graficos)
+
+
+# Métricas de todas las ciudades del periodo elegido
+def obtener_metricas_ciudades(fecha_inicio=None, fecha_fin=None):
+    from datos_dashboard import metricas_periodo
+    return metricas_periodo(obtener_snapshot(), fecha_inicio, fecha_fin)
+
+
+# Cache de las salidas de los callbacks; se vacía con cada versión nueva de los datos
+cache_figuras = CacheFiguras(obtener_version=lambda: obtener_snapshot().version)
+
+
+def _suscribir_cache():
+    from datos_dashboard import suscribir_actualizacion
+    suscribir_actualizacion(cache_figuras.invalidar)
+
+
+def _cargar_datos():
+    from datos_dashboard import cargar_snapshot_inicial
+    cargar_snapshot_inicial()
+
+
+def _iniciar_actualizacion():
+    from datos_dashboard import iniciar_actualizacion_incremental
+    iniciar_actualizacion_incremental()
+
+
+# El layout se sirve de inmediato; los datos se cargan en segundo plano y después
+# solo se incorporan las ventas nuevas
+iniciar_precarga([
+    importar('pandas'),
+    importar('plotly.express'),
+    importar('datos_dashboard'),
+    ('suscribir cache de figuras', _suscribir_cache),
+    ('cargar datos', _cargar_datos),
+    ('iniciar actualización incremental', _iniciar_actualizacion),
+])
 
 # Inicializar la app Dash CON LA SOLUCIÓN DEL ERROR
 app = dash.Dash(__name__, suppress_callback_exceptions=True)
+# Aplicación WSGI para servidores de producción (ver servidor_produccion.py)
+server = app.server
+# Métricas de los callbacks en formato Prometheus en /metrics
+registrar_en_servidor(server)
+
+
+@registrar_recolector
+def metricas_cache_y_datos():
+    estadisticas = cache_figuras.estadisticas()
+    return [
+        ('aurelion_cache_figuras_aciertos_total', 'counter', 'Aciertos de la cache de figuras', estadisticas['aciertos']),
+        ('aurelion_cache_figuras_fallos_total', 'counter', 'Fallos de la cache de figuras', estadisticas['fallos']),
+        ('aurelion_cache_figuras_entradas', 'gauge', 'Entradas en la cache de figuras', estadisticas['entradas']),
+        ('aurelion_datos_listos', 'gauge', '1 si los datos del dashboard están cargados', int(datos_listos())),
+    ]
 
 # Titulo de la pestaña
 app.title = "Aurelion Analytics - Business Intelligence"
@@ -84,6 +112,28 @@ html.Link(
     href='https://cdn-icons-png.flaticon.com/256/1828/1828533.png'
 )
 
+# Contadores de aciertos/fallos de la cache de figuras
+@app.server.route('/estadisticas/cache')
+def estadisticas_cache():
+    return jsonify(cache_figuras.estadisticas())
+
+# Tiempos de importación y de precarga de datos
+@app.server.route('/estadisticas/arranque')
+def estadisticas_arranque():
+    return jsonify(informe_arranque())
+
+# Health check de vida: responde en cuanto el servidor acepta peticiones
+@app.server.route('/salud')
+def salud():
+    return jsonify({'estado': 'ok'})
+
+# Health check de disponibilidad: 503 hasta que los datos están cargados
+@app.server.route('/listo')
+def listo():
+    if datos_listos():
+        return jsonify({'estado': 'listo'})
+    return jsonify({'estado': 'cargando', 'error': informe_arranque()['ultimo_error']}), 503
+
 # Layout del dashboard profesional con pestañas
 app.layout = html.Div([
     # Header con logo y título
@@ -149,12 +199,43 @@ app.layout = html.Div([
     
 })
 
+# Selector de rango de fechas (vacío = todo el histórico)
+def filtro_periodo(id_filtro, fechas):
+    return html.Div([
+        html.Label("PERIODO", 
+                  style={
+                      'fontWeight': '500',
+                      'color': TEXT_COLOR,
+                      'marginBottom': '8px',
+                      'fontSize': '12px',
+                      'textTransform': 'uppercase',
+                      'letterSpacing': '0.5px',
+                      'display': 'block'
+                  }),
+        dcc.DatePickerRange(
+            id=id_filtro,
+            min_date_allowed=str(fechas[0])[:10] if len(fechas) else None,
+            max_date_allowed=str(fechas[-1])[:10] if len(fechas) else None,
+            display_format='DD/MM/YYYY',
+            start_date_placeholder_text='Desde',
+            end_date_placeholder_text='Hasta',
+            clearable=True
+        )
+    ], style={'width': '100%', 'marginTop': '20px'})
+
+
 # Callback para cambiar entre pestañas
 @app.callback(
     Output('tabs-content', 'children'),
     [Input('tabs-analytics', 'value')]
 )
+@instrumentar('render_content')
+@cache_figuras.memoizar('render_content')
 def render_content(tab):
+    iniciar_fase('filtro')
+    snapshot = obtener_snapshot()
+    iniciar_fase('figura')
+    
     if tab == 'tab-analytics':
         return html.Div([
             # Filtros en tarjeta elegante
@@ -186,7 +267,7 @@ def render_content(tab):
                             dcc.Dropdown(
                                 id='ciudad-filter',
                                 options=[{'label': 'Todas las Ciudades', 'value': 'all'}] + 
-                                        [{'label': ciudad, 'value': ciudad} for ciudad in sorted(df['ciudad'].unique())],
+                                        [{'label': ciudad, 'value': ciudad} for ciudad in snapshot.valores('ciudad')],
                                 value='all',
                                 style={'width': '100%'}
                             )
@@ -206,12 +287,14 @@ def render_content(tab):
                             dcc.Dropdown(
                                 id='categoria-filter',
                                 options=[{'label': 'Todas las Categorías', 'value': 'all'}] + 
-                                        [{'label': cat, 'value': cat} for cat in sorted(df['categoria'].unique())],
+                                        [{'label': cat, 'value': cat} for cat in snapshot.valores('categoria')],
                                 value='all',
                                 style={'width': '100%'}
                             )
                         ], style={'width': '48%', 'display': 'inline-block', 'verticalAlign': 'top', 'paddingLeft': '2%'}),
-                    ], style={'width': '100%', 'display': 'flex', 'justifyContent': 'space-between'})
+                    ], style={'width': '100%', 'display': 'flex', 'justifyContent': 'space-between'}),
+                    
+                    filtro_periodo('periodo-filter', snapshot.fechas)
                 ], style={
                     'backgroundColor': CARD_BACKGROUND,
                     'padding': '25px',
@@ -353,6 +436,28 @@ def render_content(tab):
                                 'borderBottom': f'2px solid {COLOR_PALETTE[0]}',
                                 'paddingBottom': '10px'
                             }),
+                            html.Div([
+                                dcc.RadioItems(
+                                    id='pareto-modo',
+                                    options=[
+                                        {'label': ' Top productos + Otros', 'value': 'top'},
+                                        {'label': ' Todos los productos', 'value': 'completo'}
+                                    ],
+                                    value='top',
+                                    inline=True,
+                                    labelStyle={'marginRight': '20px', 'fontSize': '13px', 'color': TEXT_COLOR}
+                                ),
+                                html.Div([
+                                    dcc.Slider(
+                                        id='pareto-top-n',
+                                        min=10,
+                                        max=50,
+                                        step=5,
+                                        value=PARETO_TOP_N,
+                                        marks={i: str(i) for i in range(10, 51, 10)}
+                                    )
+                                ], style={'width': '300px'})
+                            ], style={'display': 'flex', 'alignItems': 'center', 'justifyContent': 'space-between'}),
                             dcc.Graph(id='grafico-pareto')
                         ], style={
                             'backgroundColor': CARD_BACKGROUND,
@@ -541,7 +646,9 @@ def render_content(tab):
                                 marks={i: str(i) for i in range(10, 51, 10)}
                             )
                         ], style={'width': '48%', 'display': 'inline-block', 'verticalAlign': 'top', 'paddingLeft': '2%'}),
-                    ], style={'width': '100%', 'display': 'flex', 'justifyContent': 'space-between'})
+                    ], style={'width': '100%', 'display': 'flex', 'justifyContent': 'space-between'}),
+                    
+                    filtro_periodo('periodo-geo', snapshot.fechas)
                 ], style={
                     'backgroundColor': CARD_BACKGROUND,
                     'padding': '25px',
@@ -647,29 +754,30 @@ def render_content(tab):
             
         ])
 
-# Callbacks para los filtros del análisis comercial
+# Callback del análisis Pareto
 @app.callback(
-    [Output('grafico-pareto', 'figure'),
-     Output('grafico-ciudades', 'figure'),
-     Output('grafico-medios-pago', 'figure'),
-     Output('grafico-dias-semana', 'figure'),
-     Output('grafico-ticket-promedio', 'figure'),
-     Output('grafico-clientes-top', 'figure')],
+    Output('grafico-pareto', 'figure'),
     [Input('ciudad-filter', 'value'),
-     Input('categoria-filter', 'value')]
+     Input('categoria-filter', 'value'),
+     Input('pareto-modo', 'value'),
+     Input('pareto-top-n', 'value'),
+     Input('periodo-filter', 'start_date'),
+     Input('periodo-filter', 'end_date')]
 )
-def update_dashboard(ciudad_seleccionada, categoria_seleccionada):
-    # Aplicar filtros
-    df_filtrado = df.copy()
+@instrumentar('update_pareto')
+@cache_figuras.memoizar('update_pareto')
+def update_pareto(ciudad_seleccionada, categoria_seleccionada, modo, top_n, fecha_inicio=None, fecha_fin=None):
+    iniciar_fase('filtro')
+    celda = obtener_celda(ciudad_seleccionada, categoria_seleccionada, fecha_inicio, fecha_fin,
+                          graficos=['productos'])
+    iniciar_fase('figura')
     
-    if ciudad_seleccionada != 'all':
-        df_filtrado = df_filtrado[df_filtrado['ciudad'] == ciudad_seleccionada]
+    # Gráfico Pareto - Productos que generan el 80% de ingresos
+    ingresos_productos = celda['productos']
     
-    if categoria_seleccionada != 'all':
-        df_filtrado = df_filtrado[df_filtrado['categoria'] == categoria_seleccionada]
+    if modo == 'top':
+        return figura_pareto_resumida(ingresos_productos, top_n or PARETO_TOP_N)
     
-    # 1. Gráfico Pareto - Productos que generan el 80% de ingresos
-    ingresos_productos = df_filtrado.groupby('nombre_producto')['importe'].sum().sort_values(ascending=False)
     ingresos_productos_cumsum = ingresos_productos.cumsum()
     total_ingresos = ingresos_productos.sum()
     limite_80 = total_ingresos * 0.8
@@ -731,8 +839,121 @@ def update_dashboard(ciudad_seleccionada, categoria_seleccionada):
         )
     )
     
-    # 2. Gráfico Ciudades Más Rentables
-    ingresos_ciudad = df_filtrado.groupby('ciudad')['importe'].sum().sort_values(ascending=False)
+    return fig_pareto
+
+
+def figura_pareto_resumida(ingresos_productos, top_n):
+    # Solo se envían las barras del top-N, un agregado "Otros" y la curva acumulada
+    # submuestreada: el tamaño de la figura no depende del tamaño del catálogo
+    from cubo_ventas import resumir_pareto
+    pareto = resumir_pareto(ingresos_productos, top_n, PARETO_TOLERANCIA_CURVA)
+    
+    nombres = [str(nombre) for nombre in pareto['top'].index]
+    valores = list(pareto['top'].values)
+    if pareto['num_otros'] > 0:
+        nombres.append(f"Otros ({pareto['num_otros']:,} productos)")
+        valores.append(pareto['otros'])
+    
+    fig_pareto = go.Figure()
+    
+    fig_pareto.add_trace(go.Bar(
+        x=nombres,
+        y=valores,
+        name='Ingresos por Producto',
+        marker_color=COLOR_PALETTE[0],
+        marker_line_width=0
+    ))
+    
+    fig_pareto.add_trace(go.Scatter(
+        x=pareto['curva_rango'],
+        y=pareto['curva_acumulado'],
+        name='Acumulado (por ranking)',
+        xaxis='x2',
+        yaxis='y2',
+        mode='lines',
+        line=dict(color=COLOR_PALETTE[1], width=3)
+    ))
+    
+    limite_80 = pareto['total'] * 0.8
+    fig_pareto.add_shape(
+        type='line', xref='paper', x0=0, x1=1, yref='y2', y0=limite_80, y1=limite_80,
+        line=dict(color='red', dash='dash')
+    )
+    fig_pareto.add_annotation(
+        xref='paper', x=1, yref='y2', y=limite_80, xanchor='right', yanchor='bottom', showarrow=False,
+        text=f"80% del Total: {pareto['productos_80']:,} de {pareto['num_productos']:,} productos",
+        font=dict(size=12, color='red')
+    )
+    
+    fig_pareto.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font=dict(family='Inter', color=TEXT_COLOR),
+        title=dict(
+            text=f'Distribución de Ingresos por Producto (Top {top_n} + Otros)',
+            x=0.5,
+            font=dict(size=16, color=TEXT_COLOR)
+        ),
+        xaxis=dict(
+            showgrid=False,
+            tickangle=45
+        ),
+        xaxis2=dict(
+            title='Ranking de Productos',
+            overlaying='x',
+            side='top',
+            range=[1, max(pareto['num_productos'], 1)],
+            showgrid=False
+        ),
+        yaxis=dict(
+            showgrid=True,
+            gridcolor='#ecf0f1',
+            title='Ingresos ($)'
+        ),
+        yaxis2=dict(
+            title='Ingresos Acumulados ($)', 
+            overlaying='y', 
+            side='right',
+            showgrid=False
+        ),
+        showlegend=True,
+        height=500,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.1,
+            xanchor="right",
+            x=1
+        )
+    )
+    
+    return fig_pareto
+
+
+# Callbacks para los filtros del análisis comercial
+@app.callback(
+    [Output('grafico-ciudades', 'figure'),
+     Output('grafico-medios-pago', 'figure'),
+     Output('grafico-dias-semana', 'figure'),
+     Output('grafico-ticket-promedio', 'figure'),
+     Output('grafico-clientes-top', 'figure')],
+    [Input('ciudad-filter', 'value'),
+     Input('categoria-filter', 'value'),
+     Input('periodo-filter', 'start_date'),
+     Input('periodo-filter', 'end_date')]
+)
+@instrumentar('update_dashboard')
+@cache_figuras.memoizar('update_dashboard')
+def update_dashboard(ciudad_seleccionada, categoria_seleccionada, fecha_inicio=None, fecha_fin=None):
+    import plotly.express as px
+    # Agregados precalculados para los filtros seleccionados
+    iniciar_fase('filtro')
+    celda = obtener_celda(ciudad_seleccionada, categoria_seleccionada, fecha_inicio, fecha_fin,
+                          graficos=['ciudades', 'medios_pago', 'dias_semana', 'ticket_ciudad', 'clientes_top'])
+    iniciar_fase('figura')
+    
+    # 1. Gráfico Ciudades Más Rentables
+    ingresos_ciudad = celda['ciudades']
     
     fig_ciudades = px.bar(
         x=ingresos_ciudad.index,
@@ -752,8 +973,8 @@ def update_dashboard(ciudad_seleccionada, categoria_seleccionada):
         yaxis=dict(showgrid=True, gridcolor='#ecf0f1')
     )
     
-    # 3. Gráfico Medios de Pago
-    medios_pago = df_filtrado.groupby('medio_pago')['importe'].sum().sort_values(ascending=False)
+    # 2. Gráfico Medios de Pago
+    medios_pago = celda['medios_pago']
     
     fig_medios_pago = px.pie(
         values=medios_pago.values,
@@ -775,10 +996,9 @@ def update_dashboard(ciudad_seleccionada, categoria_seleccionada):
         )
     )
     
-    # 4. Gráfico Días de la Semana
-    dias_orden = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    # 3. Gráfico Días de la Semana
     nombres_espanol = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo']
-    ventas_dias = df_filtrado.groupby('dia_semana')['importe'].sum().reindex(dias_orden)
+    ventas_dias = celda['dias_semana']
     
     fig_dias_semana = px.bar(
         x=nombres_espanol,
@@ -798,8 +1018,8 @@ def update_dashboard(ciudad_seleccionada, categoria_seleccionada):
         yaxis=dict(showgrid=True, gridcolor='#ecf0f1')
     )
     
-    # 5. Gráfico Ticket Promedio por Ciudad
-    ticket_promedio = df_filtrado.groupby('ciudad')['importe'].mean().sort_values(ascending=False)
+    # 4. Gráfico Ticket Promedio por Ciudad
+    ticket_promedio = celda['ticket_ciudad']
     
     fig_ticket_promedio = px.bar(
         x=ticket_promedio.index,
@@ -819,8 +1039,8 @@ def update_dashboard(ciudad_seleccionada, categoria_seleccionada):
         yaxis=dict(showgrid=True, gridcolor='#ecf0f1')
     )
     
-    # 6. Gráfico Clientes Más Valiosos (Top 10)
-    clientes_top = df_filtrado.groupby('nombre_cliente')['importe'].sum().nlargest(10).sort_values(ascending=True)
+    # 5. Gráfico Clientes Más Valiosos (Top 10)
+    clientes_top = celda['clientes_top']
     
     fig_clientes_top = px.bar(
         y=clientes_top.index,
@@ -841,7 +1061,7 @@ def update_dashboard(ciudad_seleccionada, categoria_seleccionada):
         xaxis=dict(showgrid=True, gridcolor='#ecf0f1')
     )
     
-    return fig_pareto, fig_ciudades, fig_medios_pago, fig_dias_semana, fig_ticket_promedio, fig_clientes_top
+    return fig_ciudades, fig_medios_pago, fig_dias_semana, fig_ticket_promedio, fig_clientes_top
 
 
 # Callback para los KPIs dinámicos
@@ -852,67 +1072,29 @@ def update_dashboard(ciudad_seleccionada, categoria_seleccionada):
      Output('kpi-productos', 'children'),
      Output('kpi-ticket', 'children')],
     [Input('ciudad-filter', 'value'),
-     Input('categoria-filter', 'value')]
+     Input('categoria-filter', 'value'),
+     Input('periodo-filter', 'start_date'),
+     Input('periodo-filter', 'end_date')]
 )
-def update_kpis(ciudad_seleccionada, categoria_seleccionada):
-    # Aplicar filtros al DataFrame
-    df_filtrado = df.copy()
-    
-    if ciudad_seleccionada != 'all':
-        df_filtrado = df_filtrado[df_filtrado['ciudad'] == ciudad_seleccionada]
-    
-    if categoria_seleccionada != 'all':
-        df_filtrado = df_filtrado[df_filtrado['categoria'] == categoria_seleccionada]
-    
-    # Calcular métricas filtradas
-    ingresos_totales = df_filtrado['importe'].sum()
-    total_ventas = df_filtrado['id_venta'].nunique()
+@instrumentar('update_kpis')
+@cache_figuras.memoizar('update_kpis')
+def update_kpis(ciudad_seleccionada, categoria_seleccionada, fecha_inicio=None, fecha_fin=None):
+    import pandas as pd
+    # KPIs precalculados en el cubo (en modo sql, una consulta agregada por combinación de filtros)
+    iniciar_fase('filtro')
+    snapshot = obtener_snapshot()
+    kpis = obtener_celda(ciudad_seleccionada, categoria_seleccionada, fecha_inicio, fecha_fin,
+                         graficos=['kpis'], snapshot=snapshot)['kpis']
+    iniciar_fase('figura')
     
-    # Clientes únicos - CONSULTA FILTRADA A TABLAS ORIGINALES
-    conn = conectar_bd()
+    ingresos_totales = kpis['ingresos']
+    total_ventas = kpis['ventas']
+    total_clientes = kpis['clientes']
+    total_productos = kpis['productos']
+    total_catalogo = snapshot.dimensiones['total_catalogo']
     
-    # Construir consulta de clientes con filtros
-    query_clientes = """
-    SELECT COUNT(DISTINCT c.nombre_cliente) as total_clientes 
-    FROM Clientes c
-    WHERE 1=1
-    """
-    
-    # Solo aplicar filtro de ciudad si no es "all"
-    if ciudad_seleccionada != 'all':
-        query_clientes += f" AND c.ciudad = '{ciudad_seleccionada}'"
-    
-    df_clientes = pd.read_sql(query_clientes, conn)
-    total_clientes = df_clientes['total_clientes'].iloc[0]
-    
-    # Construir consulta de productos con filtros
-    query_productos = """
-    SELECT COUNT(DISTINCT p.id_producto) as total_productos 
-    FROM Productos p
-    JOIN Detalles_Ventas dv ON p.id_producto = dv.id_producto
-    JOIN Ventas v ON dv.id_venta = v.id_venta
-    JOIN Clientes c ON v.id_cliente = c.id_cliente
-    WHERE 1=1
-    """
-    
-    # Aplicar filtros si no son "all"
-    if ciudad_seleccionada != 'all':
-        query_productos += f" AND c.ciudad = '{ciudad_seleccionada}'"
-    
-    if categoria_seleccionada != 'all':
-        query_productos += f" AND p.categoria = '{categoria_seleccionada}'"
-    
-    df_productos = pd.read_sql(query_productos, conn)
-    total_productos = df_productos['total_productos'].iloc[0]
-    
-    # Obtener el total del catálogo (100) - ANTES de cerrar la conexión
-    query_catalogo = "SELECT COUNT(*) as total_catalogo FROM Productos"
-    df_catalogo = pd.read_sql(query_catalogo, conn)
-    total_catalogo = df_catalogo['total_catalogo'].iloc[0]
-    
-    conn.close()  # Cerrar conexión DESPUÉS de todas las consultas
-    
-    ticket_promedio = df_filtrado.groupby('id_venta')['importe'].sum().mean()
+    # Ticket promedio = ingresos / ventas distintas
+    ticket_promedio = ingresos_totales / total_ventas if total_ventas else 0
     
     # Formatear los valores
     ingresos_formateado = "${:,.0f}".format(ingresos_totales) if ingresos_totales > 0 else "$0"
@@ -934,35 +1116,30 @@ def update_kpis(ciudad_seleccionada, categoria_seleccionada):
      Output('distribucion-regional', 'figure'),
      Output('crecimiento-ciudades', 'figure')],
     [Input('metrica-geo', 'value'),
-     Input('size-slider', 'value')]
+     Input('size-slider', 'value'),
+     Input('periodo-geo', 'start_date'),
+     Input('periodo-geo', 'end_date')]
 )
-def update_geoanalytics(metrica_seleccionada, tamaño_burbuja):
-    # Preparar datos para el mapa
-    datos_ciudades = []
+@instrumentar('update_geoanalytics')
+@cache_figuras.memoizar('update_geoanalytics')
+def update_geoanalytics(metrica_seleccionada, tamaño_burbuja, fecha_inicio=None, fecha_fin=None):
+    import pandas as pd
+    import plotly.express as px
+    # Métricas de todas las ciudades, calculadas una vez por versión de los datos y periodo
+    iniciar_fase('filtro')
+    metricas = obtener_metricas_ciudades(fecha_inicio, fecha_fin)
+    iniciar_fase('figura')
     
-    for ciudad in df['ciudad'].unique():
-        df_ciudad = df[df['ciudad'] == ciudad]
-        
-        if metrica_seleccionada == 'ingresos':
-            valor = df_ciudad['importe'].sum()
-        elif metrica_seleccionada == 'ventas':
-            valor = df_ciudad['id_venta'].nunique()
-        elif metrica_seleccionada == 'ticket':
-            valor = df_ciudad.groupby('id_venta')['importe'].sum().mean()
-        else:  # clientes
-            valor = df_ciudad['id_cliente'].nunique()
-        
-        datos_ciudades.append({
-            'ciudad': ciudad,
-            'valor': valor,
-            'lat': COORDENADAS_CIUDADES[ciudad]['lat'],
-            'lon': COORDENADAS_CIUDADES[ciudad]['lon'],
-            'ventas': df_ciudad['id_venta'].nunique(),
-            'clientes': df_ciudad['id_cliente'].nunique(),
-            'ingresos': df_ciudad['importe'].sum()
-        })
-    
-    df_mapa = pd.DataFrame(datos_ciudades)
+    # Preparar datos para el mapa
+    df_mapa = pd.DataFrame({
+        'ciudad': metricas['ciudad'],
+        'valor': metricas[metrica_seleccionada],
+        'lat': metricas['ciudad'].map(lambda ciudad: COORDENADAS_CIUDADES.get(ciudad, {}).get('lat')),
+        'lon': metricas['ciudad'].map(lambda ciudad: COORDENADAS_CIUDADES.get(ciudad, {}).get('lon')),
+        'ventas': metricas['ventas'],
+        'clientes': metricas['clientes'],
+        'ingresos': metricas['ingresos']
+    })
     
     # 1. Mapa Geográfico
     fig_mapa = px.scatter_mapbox(
@@ -1050,6 +1227,9 @@ def update_geoanalytics(metrica_seleccionada, tamaño_burbuja):
     return fig_mapa, fig_metricas, fig_distribucion, fig_crecimiento
 
 
+marcar_etapa('definir layout y callbacks')
+
+
 # Ejecutar la aplicación
 if __name__ == '__main__':
 
@@ -0,0 +1,520 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from cubo_ventas import construir_cubo, consultar_cubo, metricas_por_ciudad
+from metricas_dashboard import fase, medir_operacion, registrar_filas
+from acceso_datos import obtener_conexion
+from motor_embebido import leer_sql
+from almacen_columnar import (
+    escribir_arrow, leer_arrow, leer_metadatos_arrow, leer_puntero, leer_snapshot_publicado
+)
+
+# Cada cuántos segundos se buscan ventas nuevas en la base de datos
+INTERVALO_REFRESCO_SEGUNDOS = 60
+
+# En producción (servidor_produccion.py) los workers no consultan la base de datos:
+# leen el snapshot Arrow que publica el coordinador en el directorio de esta variable
+VARIABLE_SNAPSHOT_COMPARTIDO = 'AURELION_SNAPSHOT_COMPARTIDO'
+INTERVALO_SONDEO_COMPARTIDO_SEGUNDOS = 5
+
+# Motor de las agregaciones del cubo: 'pandas' o 'polars' (consultas lazy multihilo, cubo_polars.py)
+VARIABLE_BACKEND_AGREGACION = 'AURELION_BACKEND_AGREGACION'
+BACKENDS_AGREGACION = ('pandas', 'polars')
+
+# 'memoria': detalle en memoria + cubo; 'sql': cada gráfico se agrega en la base de datos (consultas_agregadas.py)
+VARIABLE_MODO_DATOS = 'AURELION_MODO_DATOS'
+MODOS_DATOS = ('memoria', 'sql')
+
+# Agregados de periodos concretos (rango de fechas) que se conservan por versión de los datos
+MAX_PERIODOS_CACHE = 16
+
+# Snapshot columnar local: el siguiente arranque parte de él y solo pide el delta a MySQL
+RUTA_SNAPSHOT_LOCAL = os.path.join('snapshots', 'dashboard.arrow')
+# Pasado este tiempo se recarga todo (el delta por marca de agua no ve modificaciones ni borrados)
+ANTIGUEDAD_MAXIMA_SNAPSHOT_SEGUNDOS = 24 * 60 * 60
+# Se incrementa si cambian las columnas o sus tipos: invalida los snapshots anteriores
+FORMATO_SNAPSHOT_LOCAL = 1
+
+# Columnas de texto con pocos valores distintos: se codifican como diccionario (categorical)
+COLUMNAS_CATEGORICAS = [
+    'ciudad', 'categoria', 'medio_pago', 'nombre_producto', 'nombre_cliente', 'mes', 'dia_semana'
+]
+# Ids DECIMAL(10,1) que en la práctica son enteros
+COLUMNAS_ID = ['id_venta', 'id_cliente', 'id_producto']
+
+# Una fila por línea de detalle de venta (también la usan las consultas agregadas del modo sql)
+JOIN_VENTAS = """
+    FROM Ventas v
+    JOIN Clientes c ON v.id_cliente = c.id_cliente
+    JOIN Detalles_Ventas dv ON v.id_venta = dv.id_venta
+    JOIN Productos p ON dv.id_producto = p.id_producto
+    """
+
+# Consulta base del dashboard
+CONSULTA_VENTAS = """
+    SELECT
+        v.id_venta,
+        v.fecha,
+        v.id_cliente,
+        v.medio_pago,
+        c.ciudad,
+        c.nombre_cliente,
+        dv.id_producto,
+        dv.nombre_producto,
+        dv.cantidad,
+        dv.precio_unitario,
+        dv.importe,
+        p.categoria""" + JOIN_VENTAS
+
+
+def directorio_snapshot_compartido():
+    """Directorio del snapshot compartido, o None si este proceso lee de la base de datos"""
+    return os.environ.get(VARIABLE_SNAPSHOT_COMPARTIDO)
+
+
+def backend_agregacion():
+    """Backend elegido con la variable de entorno; pandas por defecto"""
+    backend = os.environ.get(VARIABLE_BACKEND_AGREGACION, 'pandas').lower()
+    if backend not in BACKENDS_AGREGACION:
+        raise ValueError(f"Backend de agregación desconocido: '{backend}' (opciones: {BACKENDS_AGREGACION})")
+    return backend
+
+
+def modo_datos():
+    """Modo elegido con la variable de entorno; 'memoria' por defecto"""
+    modo = os.environ.get(VARIABLE_MODO_DATOS, 'memoria').lower()
+    if modo not in MODOS_DATOS:
+        raise ValueError(f"Modo de datos desconocido: '{modo}' (opciones: {MODOS_DATOS})")
+    return modo
+
+
+# Conexión a la base de datos prestada por el pool compartido (acceso_datos.py); close() la devuelve
+def conectar_bd():
+    return obtener_conexion()
+
+
+def derivar_columnas_fecha(df):
+    """Columnas de calendario derivadas de `fecha` (mes, día de la semana, trimestre)"""
+    df['fecha'] = pd.to_datetime(df['fecha'])
+    df['mes'] = df['fecha'].dt.month_name()
+    df['dia_semana'] = df['fecha'].dt.day_name()
+    df['trimestre'] = df['fecha'].dt.quarter
+    return df
+
+
+def _entero_compacto(serie):
+    """Entero más estrecho que admite la columna si todos sus valores son enteros"""
+    numerica = pd.to_numeric(serie).astype('float64')
+    if numerica.isna().any() or not (numerica % 1 == 0).all():
+        return numerica.astype('float32')
+    return pd.to_numeric(numerica.astype('int64'), downcast='integer')
+
+
+def compactar_datos(df):
+    """Representación columnar compacta: categóricas, ids enteros estrechos y medidas de 32 bits"""
+    for columna in COLUMNAS_CATEGORICAS:
+        df[columna] = df[columna].astype('category')
+
+    for columna in COLUMNAS_ID:
+        df[columna] = _entero_compacto(df[columna])
+
+    cantidad = _entero_compacto(df['cantidad'])
+    df['cantidad'] = cantidad.astype('int32') if cantidad.dtype.kind == 'i' else cantidad
+    df['precio_unitario'] = pd.to_numeric(df['precio_unitario']).astype('float32')
+    df['importe'] = pd.to_numeric(df['importe']).astype('float32')
+    df['trimestre'] = df['trimestre'].astype('int8')
+
+    return df
+
+
+def ordenar_por_fecha(df):
+    """Ordena por `fecha` (estable) si no lo está ya: los rangos de fechas pasan a ser cortes contiguos"""
+    if df['fecha'].is_monotonic_increasing:
+        return df
+    return df.sort_values('fecha', kind='stable', ignore_index=True)
+
+
+def anexar_compacto(df, nuevas):
+    """Concatena dos frames compactos conservando las columnas categóricas y el orden por fecha"""
+    df = df.copy(deep=False)
+    for columna in COLUMNAS_CATEGORICAS:
+        categorias = df[columna].cat.categories
+        extra = pd.Index(nuevas[columna].cat.categories).difference(categorias)
+        if len(extra):
+            df[columna] = df[columna].cat.add_categories(extra)
+        nuevas[columna] = nuevas[columna].astype(df[columna].dtype)
+
+    # Lo normal es que las ventas nuevas sean posteriores y no haya que reordenar
+    return ordenar_por_fecha(pd.concat([df, nuevas], ignore_index=True))
+
+
+def _memoria_mb(df):
+    return df.memory_usage(deep=True).sum() / 1024 ** 2
+
+
+# Obtener datos para el dashboard
+def obtener_datos_dashboard():
+    with fase('sql'):
+        conn = conectar_bd()
+        df = leer_sql(CONSULTA_VENTAS, conn)
+        conn.close()
+    registrar_filas(len(df))
+
+    df = ordenar_por_fecha(derivar_columnas_fecha(df))
+    memoria_original = _memoria_mb(df)
+    df = compactar_datos(df)
+    print(f"💾 Datos del dashboard: {len(df):,} líneas, "
+          f"{memoria_original:.2f} MB → {_memoria_mb(df):.2f} MB en memoria")
+
+    return df
+
+
+def _valor_sql(valor):
+    """Convierte escalares de numpy/pandas a tipos que acepta el conector"""
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return valor
+
+
+def obtener_ventas_nuevas(marca_agua):
+    """Líneas de ventas posteriores a la marca de agua (id_venta / fecha máximos ya cargados)"""
+    with fase('sql'):
+        conn = conectar_bd()
+        query = CONSULTA_VENTAS + " WHERE v.id_venta > %s OR v.fecha > %s"
+        df = leer_sql(query, conn, params=(
+            _valor_sql(marca_agua['id_venta']),
+            _valor_sql(marca_agua['fecha']),
+        ))
+        conn.close()
+    registrar_filas(len(df))
+
+    return compactar_datos(derivar_columnas_fecha(df))
+
+
+# Instantánea de las dimensiones que no salen del detalle de ventas
+def obtener_dimensiones():
+    with fase('sql'):
+        conn = conectar_bd()
+        df_catalogo = leer_sql("SELECT COUNT(*) AS total_catalogo FROM Productos", conn)
+        conn.close()
+
+    return {
+        'total_catalogo': int(df_catalogo['total_catalogo'].iloc[0])
+    }
+
+
+@dataclass(frozen=True)
+class SnapshotDashboard:
+    """Versión inmutable de los datos del dashboard; los callbacks leen una sola por ejecución"""
+    version: int
+    df: pd.DataFrame  # ordenado por fecha
+    fechas: np.ndarray  # df['fecha'] como datetime64, para buscar rangos por bisección
+    cubo: dict
+    metricas_ciudades: pd.DataFrame
+    dimensiones: dict
+    marca_agua: dict
+    carga_completa: float  # time.time() de la última carga completa desde la base de datos
+
+    def valores(self, columna):
+        """Valores distintos de una dimensión, ordenados (opciones de los filtros)"""
+        return sorted(self.df[columna].unique())
+
+
+def calcular_marca_agua(df):
+    if df.empty:
+        return None
+    return {'id_venta': df['id_venta'].max(), 'fecha': df['fecha'].max()}
+
+
+def _agregar(df):
+    """Cubo y métricas por ciudad con el backend configurado"""
+    registrar_filas(len(df))
+    with fase('agregacion'):
+        if backend_agregacion() == 'polars':
+            from cubo_polars import construir_cubo_polars, metricas_por_ciudad_polars
+            return construir_cubo_polars(df), metricas_por_ciudad_polars(df)
+        return construir_cubo(df), metricas_por_ciudad(df)
+
+
+def _crear_snapshot(version, df, dimensiones, carga_completa):
+    df = ordenar_por_fecha(df)
+    cubo, metricas_ciudades = _agregar(df)
+    return SnapshotDashboard(
+        version=version,
+        df=df,
+        fechas=df['fecha'].to_numpy(),
+        cubo=cubo,
+        metricas_ciudades=metricas_ciudades,
+        dimensiones=dimensiones,
+        marca_agua=calcular_marca_agua(df),
+        carga_completa=carga_completa,
+    )
+
+
+def limites_periodo(snapshot, fecha_inicio=None, fecha_fin=None):
+    """Posiciones [inicio, fin) de las líneas entre dos fechas (ambos días incluidos) por búsqueda binaria"""
+    inicio, fin = 0, len(snapshot.fechas)
+    if fecha_inicio:
+        desde = np.datetime64(pd.Timestamp(fecha_inicio).normalize())
+        inicio = int(np.searchsorted(snapshot.fechas, desde, side='left'))
+    if fecha_fin:
+        hasta = np.datetime64(pd.Timestamp(fecha_fin).normalize() + pd.Timedelta(days=1))
+        fin = int(np.searchsorted(snapshot.fechas, hasta, side='left'))
+    return inicio, max(inicio, fin)
+
+
+_periodos = OrderedDict()
+_lock_periodos = threading.Lock()
+
+
+def agregados_periodo(snapshot, fecha_inicio=None, fecha_fin=None):
+    """Cubo y métricas por ciudad de un rango de fechas.
+
+    Sin rango (o con uno que cubre todo el histórico) se devuelven los del
+    snapshot. Si no, se agrega solo el corte contiguo del frame ordenado, así
+    que el coste es proporcional al periodo y no al histórico completo.
+    """
+    inicio, fin = limites_periodo(snapshot, fecha_inicio, fecha_fin)
+    if inicio == 0 and fin == len(snapshot.fechas):
+        return snapshot.cubo, snapshot.metricas_ciudades
+
+    clave = (snapshot.version, inicio, fin)
+    with _lock_periodos:
+        if clave in _periodos:
+            _periodos.move_to_end(clave)
+            return _periodos[clave]
+
+    agregados = _agregar(snapshot.df.iloc[inicio:fin])
+    with _lock_periodos:
+        _periodos[clave] = agregados
+        while len(_periodos) > MAX_PERIODOS_CACHE:
+            _periodos.popitem(last=False)
+    return agregados
+
+
+def celda_periodo(snapshot, ciudad, categoria, fecha_inicio=None, fecha_fin=None, graficos=None):
+    """Agregados de los filtros elegidos, con la estructura de `consultar_cubo`.
+
+    En modo 'sql' solo se consultan los `graficos` pedidos (claves de la celda);
+    en memoria la celda del cubo ya los tiene todos.
+    """
+    if modo_datos() == 'sql':
+        from consultas_agregadas import celda_sql
+        return celda_sql(snapshot, ciudad, categoria, fecha_inicio, fecha_fin, graficos)
+    cubo, _ = agregados_periodo(snapshot, fecha_inicio, fecha_fin)
+    return consultar_cubo(cubo, ciudad, categoria)
+
+
+def metricas_periodo(snapshot, fecha_inicio=None, fecha_fin=None):
+    """Métricas por ciudad del periodo, como `metricas_por_ciudad`"""
+    if modo_datos() == 'sql':
+        from consultas_agregadas import metricas_ciudades_sql
+        return metricas_ciudades_sql(snapshot, fecha_inicio, fecha_fin)
+    _, metricas = agregados_periodo(snapshot, fecha_inicio, fecha_fin)
+    return metricas
+
+
+_snapshot_actual = None
+_lock_actualizacion = threading.Lock()
+# Funciones a avisar cada vez que se publica una versión nueva (p. ej. caches)
+_suscriptores = []
+
+
+def suscribir_actualizacion(funcion):
+    """Registra `funcion(snapshot)` para que se llame tras publicar cada versión nueva"""
+    _suscriptores.append(funcion)
+    return funcion
+
+
+def _publicar(snapshot):
+    global _snapshot_actual
+    _snapshot_actual = snapshot
+    for funcion in _suscriptores:
+        funcion(snapshot)
+    return snapshot
+
+
+def incorporar_ventas_nuevas(df, marca_agua):
+    """Devuelve `df` con las ventas posteriores a la marca de agua añadidas (el mismo `df` si no hay)"""
+    if marca_agua is None:
+        return obtener_datos_dashboard()
+
+    nuevas = obtener_ventas_nuevas(marca_agua)
+    if nuevas.empty:
+        return df
+    return anexar_compacto(df, nuevas)
+
+
+def carga_caducada(carga_completa):
+    """True si la última carga completa es de hace más de ANTIGUEDAD_MAXIMA_SNAPSHOT_SEGUNDOS (o no se sabe)"""
+    return carga_completa is None or time.time() - carga_completa > ANTIGUEDAD_MAXIMA_SNAPSHOT_SEGUNDOS
+
+
+def refrescar_datos(df, carga_completa):
+    """Añade a `df` las ventas nuevas, o lo recarga entero si la carga completa caducó
+
+    Devuelve (df, carga_completa); `df` es el mismo objeto si no hay nada nuevo.
+    """
+    if carga_caducada(carga_completa):
+        # Solo la carga completa ve modificaciones y borrados de ventas ya cargadas
+        carga_completa = time.time()
+        return obtener_datos_dashboard(), carga_completa
+    return incorporar_ventas_nuevas(df, calcular_marca_agua(df)), carga_completa
+
+
+def guardar_snapshot_local(df, dimensiones, carga_completa, ruta=RUTA_SNAPSHOT_LOCAL):
+    """Persiste el frame para el próximo arranque, con su marca de agua; un fallo solo se avisa
+
+    `carga_completa` es la hora de la carga completa de la que viene `df` (los deltas la conservan).
+    """
+    try:
+        os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+        escribir_arrow(df, ruta, {
+            'formato': FORMATO_SNAPSHOT_LOCAL,
+            'guardado': time.time(),
+            'carga_completa': carga_completa,
+            'marca_agua': calcular_marca_agua(df),
+            'dimensiones': dimensiones,
+        })
+    except Exception as e:
+        print(f"⚠️  No se pudo guardar el snapshot local: {e}")
+
+
+def cargar_datos_arranque(ruta=RUTA_SNAPSHOT_LOCAL, delta=True):
+    """Datos para arrancar: snapshot local (+ delta de MySQL si `delta`) o carga completa.
+
+    Se va a MySQL completo solo si el snapshot falta, es de otro formato o su
+    carga completa caducó; si la base de datos no responde se arranca con el snapshot que haya.
+    Devuelve (df, dimensiones, carga_completa, cambiado), donde `cambiado` indica si difiere del fichero.
+    """
+    metadatos = leer_metadatos_arrow(ruta)
+    valido = bool(metadatos) and metadatos.get('formato') == FORMATO_SNAPSHOT_LOCAL
+    carga_completa = metadatos.get('carga_completa') if valido else None
+
+    if carga_caducada(carga_completa):
+        try:
+            carga_completa = time.time()
+            return obtener_datos_dashboard(), obtener_dimensiones(), carga_completa, True
+        except Exception as e:
+            if not valido:
+                raise
+            print(f"⚠️  Base de datos no disponible ({e}); se usa el snapshot local caducado")
+            carga_completa = metadatos.get('carga_completa')
+            delta = False
+
+    df = leer_arrow(ruta, mapear=False)
+    dimensiones = metadatos['dimensiones']
+    print(f"⚡ Datos del dashboard desde '{ruta}': {len(df):,} líneas")
+    if not delta:
+        return df, dimensiones, carga_completa, False
+
+    try:
+        df_nuevo = incorporar_ventas_nuevas(df, calcular_marca_agua(df))
+        dimensiones_nuevas = obtener_dimensiones()
+    except Exception as e:
+        print(f"⚠️  Base de datos no disponible ({e}); se arranca con el snapshot local")
+        return df, dimensiones, carga_completa, False
+
+    cambiado = df_nuevo is not df or dimensiones_nuevas != dimensiones
+    return df_nuevo, dimensiones_nuevas, carga_completa, cambiado
+
+
+def _snapshot_desde_compartido(puntero, df):
+    return _crear_snapshot(puntero['version'], df, puntero['dimensiones'], puntero.get('carga_completa'))
+
+
+def cargar_snapshot_inicial():
+    """Carga inicial (snapshot local + delta, base de datos o snapshot compartido) y publica la primera versión"""
+    with _lock_actualizacion:
+        if directorio_snapshot_compartido():
+            puntero, df = leer_snapshot_publicado(directorio_snapshot_compartido())
+            return _publicar(_snapshot_desde_compartido(puntero, df))
+
+        if modo_datos() == 'sql':
+            from consultas_agregadas import crear_snapshot_sql
+            return _publicar(crear_snapshot_sql(1))
+
+        df, dimensiones, carga_completa, cambiado = cargar_datos_arranque()
+        snapshot = _publicar(_crear_snapshot(1, df, dimensiones, carga_completa))
+        if cambiado:
+            guardar_snapshot_local(snapshot.df, dimensiones, carga_completa)
+        return snapshot
+
+
+def obtener_snapshot():
+    """Snapshot vigente; asignar una referencia es atómico, así que no hace falta lock para leer"""
+    return _snapshot_actual
+
+
+def _actualizar_desde_compartido():
+    """Cambia al snapshot compartido si el coordinador publicó una versión más reciente"""
+    actual = _snapshot_actual
+    directorio = directorio_snapshot_compartido()
+    puntero = leer_puntero(directorio)
+    if puntero is None or puntero['version'] <= actual.version:
+        return actual
+
+    puntero, df = leer_snapshot_publicado(directorio)
+    return _publicar(_snapshot_desde_compartido(puntero, df))
+
+
+def actualizar_snapshot():
+    """Añade las ventas nuevas al snapshot vigente y publica una versión nueva si las hay"""
+    with _lock_actualizacion:
+        if directorio_snapshot_compartido():
+            return _actualizar_desde_compartido()
+
+        actual = _snapshot_actual
+        if modo_datos() == 'sql':
+            from consultas_agregadas import crear_snapshot_sql, descartar_resultados_anteriores
+            nuevo = crear_snapshot_sql(actual.version + 1)
+            if nuevo.mismos_datos(actual):
+                return actual
+            snapshot = _publicar(nuevo)
+            descartar_resultados_anteriores(snapshot.version)
+            return snapshot
+
+        df, carga_completa = refrescar_datos(actual.df, actual.carga_completa)
+        dimensiones = obtener_dimensiones()
+
+        if df is actual.df and dimensiones == actual.dimensiones:
+            return actual
+
+        # El cubo se reconstruye fuera del camino de los callbacks, que siguen
+        # leyendo la versión anterior hasta que se sustituye la referencia
+        snapshot = _publicar(_crear_snapshot(actual.version + 1, df, dimensiones, carga_completa))
+        guardar_snapshot_local(snapshot.df, dimensiones, carga_completa)
+        return snapshot
+
+
+def _bucle_actualizacion(evento_parada, intervalo):
+    while not evento_parada.wait(intervalo):
+        try:
+            with medir_operacion('actualizacion_datos'):
+                actualizar_snapshot()
+        except Exception as e:
+            print(f"⚠️  Error al actualizar los datos del dashboard: {e}")
+
+
+def iniciar_actualizacion_incremental(intervalo=None):
+    """Lanza el hilo que incorpora ventas nuevas cada `intervalo` segundos; devuelve su evento de parada"""
+    if intervalo is None:
+        intervalo = (INTERVALO_SONDEO_COMPARTIDO_SEGUNDOS if directorio_snapshot_compartido()
+                     else INTERVALO_REFRESCO_SEGUNDOS)
+    evento_parada = threading.Event()
+    hilo = threading.Thread(
+        target=_bucle_actualizacion,
+        args=(evento_parada, intervalo),
+        name='actualizador-dashboard',
+        daemon=True,
+    )
+    hilo.start()
+    return evento_parada
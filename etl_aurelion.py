@@ -0,0 +1,241 @@
+"""
+Funciones de ETL del notebook Aurelion.ipynb (extracción y transformación con Polars).
+
+Viven en un módulo para que el notebook, el benchmark y otros scripts usen
+exactamente el mismo código. `extraer_datos_polars` acepta una conexión del pool
+de acceso_datos.py (MySQL o el motor embebido según AURELION_MOTOR_BD) o
+cualquier conexión DB-API (MySQL/MariaDB o un SQLite local).
+"""
+import time
+
+import polars as pl
+from mysql.connector import Error
+
+from acceso_datos import (FILAS_POR_LOTE, ConexionPool, en_paralelo, lotes_polars, obtener_conexion, rangos_clave,
+                          tamano_pool)
+from motor_embebido import errores_embebidos, motor_bd
+
+
+def conectar_bd():
+    """Conexión del pool compartido (acceso_datos.py) a MariaDB en XAMPP o al motor embebido"""
+    try:
+        conexion = obtener_conexion()
+        if conexion.is_connected():
+            if motor_bd() != 'mysql':
+                print(f'✅ Conexión a la base embebida ({conexion.motor})')
+            else:
+                print('✅ Conexión exitosa a la base de datos')
+            return conexion
+
+        # Se cierra en lugar de devolverla para no dejar ocupado su hueco del pool
+        conexion.descartar()
+        print('❌ Error al conectar: la conexión no está activa')
+        return None
+
+    # RuntimeError: el pool no tiene conexiones libres
+    except (Error, RuntimeError) + errores_embebidos() as e:
+        print(f'❌ Error al conectar: {e}')
+        return None
+
+
+# Tablas que se extraen por rangos de su clave, en paralelo: nombre → (tabla, clave)
+CLAVES_TROZOS = {'ventas': ('Ventas', 'id_venta'), 'detalles_ventas': ('Detalles_Ventas', 'id_detalle')}
+TROZOS_POR_TABLA = 4
+
+
+def _extraer_trozo(conexion, trozo, filas_por_lote):
+    nombre, consulta, params = trozo
+    inicio = time.perf_counter()
+    try:
+        partes = list(lotes_polars(consulta, params, filas_por_lote=filas_por_lote, conn=conexion))
+    except Exception as e:
+        return {'error': e}
+    fin = time.perf_counter()
+    return {'partes': partes, 'inicio': inicio, 'fin': fin, 'segundos': fin - inicio}
+
+
+def extraer_datos_polars(conexion, filas_por_lote=FILAS_POR_LOTE, informe=None, hilos=None,
+                         trozos=TROZOS_POR_TABLA):
+    """Extrae todos los datos de la base de datos usando Polars
+
+    Cada tabla se lee por lotes de `filas_por_lote` filas que van directos a
+    Polars (Arrow en DuckDB), sin pasar por pandas: la memoria extra de la
+    extracción queda acotada por el lote. Con una conexión del pool y `hilos` > 1
+    (por defecto en MySQL, las conexiones libres del pool), las tablas se leen a
+    la vez, cada una con su conexión, y Ventas y Detalles_Ventas se parten
+    además en `trozos` rangos de su clave. Si se pasa `informe` (dict), se
+    rellena con filas, lotes, segundos, MB y trozos de cada tabla.
+
+    Con conexiones distintas no hay una sola transacción que lo lea todo: los
+    rangos de Ventas y Detalles_Ventas se acotan con los máximos de sus claves,
+    leídos antes en una sola consulta con `conexion`, así que las líneas de
+    detalle que se extraen tienen su venta (salvo ventas confirmadas fuera del
+    orden de sus ids mientras se extrae). Clientes y Productos se leen enteros
+    después, con lo que incluyen los de esas ventas.
+    """
+    
+    # Consultas SQL para extraer datos
+    consultas = {
+        'clientes': 'SELECT * FROM Clientes',
+        'productos': 'SELECT * FROM Productos', 
+        'ventas': 'SELECT * FROM Ventas',
+        'detalles_ventas': 'SELECT * FROM Detalles_Ventas'
+    }
+    
+    datos = {}
+    inicio_total = time.perf_counter()
+
+    if hilos is None:
+        # En proceso no compensa: DuckDB ya usa todos los núcleos en cada consulta y con SQLite
+        # el GIL serializa la conversión de filas. Con MySQL los hilos solapan servidor y red.
+        hilos = tamano_pool() - 1 if motor_bd() == 'mysql' else 1
+    concurrente = isinstance(conexion, ConexionPool) and hilos > 1
+    rangos_tablas = {}
+    if concurrente:
+        try:
+            rangos_tablas = rangos_clave(dict(CLAVES_TROZOS.values()), trozos, conn=conexion)
+        except Exception as e:
+            print(f'⚠️ No se pudieron leer los rangos de {", ".join(t for t, _ in CLAVES_TROZOS.values())} '
+                  f'({e}); se leen enteras')
+    tareas = []
+    # Las tablas grandes primero: las pequeñas ocupan los hilos que van quedando libres
+    for nombre, consulta in reversed(consultas.items()):
+        tabla, clave = CLAVES_TROZOS.get(nombre, (None, None))
+        rangos = rangos_tablas.get(tabla, [None])
+        if not rangos:
+            # Vacía al fijar los extremos: un rango vacío da las columnas sin ver lo que llegue después
+            rangos = [(0, 0)]
+        for rango in rangos:
+            if rango is None:
+                tareas.append((nombre, consulta, None))
+            else:
+                tareas.append((nombre, f'{consulta} WHERE {clave} >= %s AND {clave} < %s', rango))
+
+    if concurrente:
+        resultados = en_paralelo(lambda c, trozo: _extraer_trozo(c, trozo, filas_por_lote), tareas, hilos=hilos,
+                                 conn=conexion, capturar=True)
+        # Un fallo al pedir la conexión (pool agotado) solo afecta a la tabla de ese trozo
+        resultados = [{'error': r} if isinstance(r, Exception) else r for r in resultados]
+    else:
+        resultados = [_extraer_trozo(conexion, trozo, filas_por_lote) for trozo in tareas]
+
+    for nombre in consultas:
+        trozos_tabla = [(t, r) for t, r in zip(tareas, resultados) if t[0] == nombre]
+        errores = [r['error'] for _, r in trozos_tabla if 'error' in r]
+        if errores:
+            print(f'❌ Error extrayendo {nombre}: {errores[0]}')
+            continue
+        partes = [parte for _, r in trozos_tabla for parte in r['partes']]
+        # Sin rechunk: los lotes quedan como chunks del resultado, no se copian
+        datos[nombre] = pl.concat(partes, how='vertical_relaxed', rechunk=False)
+        segundos = max(r['fin'] for _, r in trozos_tabla) - min(r['inicio'] for _, r in trozos_tabla)
+        filas = len(datos[nombre])
+        megas = datos[nombre].estimated_size('mb')
+        print(f'✅ {nombre.capitalize()} extraídos: {filas} registros '
+              f'({len(partes)} lotes, {filas / max(segundos, 1e-9):,.0f} filas/s, {megas:.1f} MB)')
+        detalle_trozos = []
+        for (_, _, rango), r in trozos_tabla:
+            filas_trozo = sum(len(parte) for parte in r['partes'])
+            detalle_trozos.append({'rango': rango, 'filas': filas_trozo, 'segundos': r['segundos']})
+            if len(trozos_tabla) > 1:
+                print(f'   · {CLAVES_TROZOS[nombre][1]} {rango[0]:,}–{rango[1] - 1:,}: '
+                      f"{filas_trozo:,} filas en {r['segundos']:.2f} s")
+        if informe is not None:
+            informe[nombre] = {'filas': filas, 'lotes': len(partes), 'segundos': segundos, 'mb': megas,
+                               'trozos': detalle_trozos}
+
+    if concurrente:
+        suma = sum(r.get('segundos', 0) for r in resultados)
+        print(f'⏱️ Extracción en {time.perf_counter() - inicio_total:.2f} s '
+              f'({len(tareas)} consultas que suman {suma:.2f} s)')
+    return datos
+
+
+# Claves de cada join de ventas_detalladas, en orden: detalle → ventas → productos → clientes
+JOINS_VENTAS = [('ventas', 'id_venta'), ('productos', 'id_producto'), ('clientes', 'id_cliente')]
+
+
+def _lazy(tabla):
+    return tabla if isinstance(tabla, pl.LazyFrame) else tabla.lazy()
+
+
+def plan_ventas_detalladas(datos):
+    """LazyFrame de ventas_detalladas: tipos, joins y métricas sin materializar nada
+
+    `datos` puede traer DataFrames (de `extraer_datos_polars`) o LazyFrames (p. ej.
+    `pl.scan_parquet`), y el plan se puede seguir filtrando o seleccionando: Polars
+    empuja los filtros y las columnas hasta las tablas de origen.
+    """
+    detalles = _lazy(datos['detalles_ventas']).with_columns([
+        pl.col('cantidad').cast(pl.Float64),
+        pl.col('importe').cast(pl.Float64),
+        pl.col('precio_unitario').cast(pl.Float64)
+    ])
+    tablas = {
+        'ventas': _lazy(datos['ventas']),
+        'productos': _lazy(datos['productos']).with_columns(pl.col('precio_unitario').cast(pl.Float64)),
+        'clientes': _lazy(datos['clientes']),
+    }
+
+    plan = detalles
+    for nombre, clave in JOINS_VENTAS:
+        presentes = set(plan.collect_schema().names())
+        derecha = tablas[nombre]
+        # Las columnas que ya trae la izquierda (nombre_producto, precio_unitario, nombre_cliente,
+        # email) se toman de ella: no se arrastran copias `_right` que luego hay que borrar
+        derecha = derecha.select([c for c in derecha.collect_schema().names() if c == clave or c not in presentes])
+        plan = plan.join(derecha, on=clave, how='left', maintain_order='left')
+
+    if 'fecha' in plan.collect_schema().names():
+        plan = plan.with_columns([
+            pl.col('importe').alias('ingreso_total'),
+            (pl.col('importe') / pl.col('cantidad')).alias('precio_promedio')
+        ])
+    return plan
+
+
+def explicar_transformacion(datos, columnas=None, filtro=None):
+    """Plan optimizado (motor streaming) de la transformación, para ver qué se empuja a cada tabla"""
+    return _plan_filtrado(datos, columnas, filtro).explain(engine='streaming')
+
+
+def _plan_filtrado(datos, columnas=None, filtro=None):
+    plan = plan_ventas_detalladas(datos)
+    if filtro is not None:
+        plan = plan.filter(filtro)
+    if columnas is not None:
+        plan = plan.select(columnas)
+    return plan
+
+
+def transformar_datos_robusta(datos, columnas=None, filtro=None, explicar=False):
+    """Transformación de datos con manejo de errores
+
+    Construye el plan lazy de `plan_ventas_detalladas` y lo ejecuta con el motor
+    streaming, que procesa las tablas por partes. `columnas` y `filtro` (una
+    expresión de Polars) se aplican dentro del plan y llegan hasta las tablas;
+    con `explicar=True` se imprime el plan optimizado.
+    """
+    
+    print("🔄 Iniciando transformaciones...")
+    
+    try:
+        plan = _plan_filtrado(datos, columnas, filtro)
+        if explicar:
+            print(plan.explain(engine='streaming'))
+        ventas_detalladas = plan.collect(engine='streaming')
+        print("✅ Tipos, joins y métricas calculados (plan lazy, motor streaming)")
+    except Exception as e:
+        print(f"❌ Error en la transformación: {e}")
+        ventas_detalladas = _lazy(datos['detalles_ventas']).collect()  # Usar solo detalles como fallback
+    
+    return {
+        'ventas_detalladas': ventas_detalladas,
+        'datos_originales': datos
+    }
+
+
+def transformar_a_parquet(datos, ruta, columnas=None, filtro=None):
+    """Escribe ventas_detalladas en `ruta` sin tenerla entera en memoria (para datos mayores que la RAM)"""
+    _plan_filtrado(datos, columnas, filtro).sink_parquet(ruta, engine='streaming', mkdir=True)
+    print(f"✅ Ventas detalladas escritas en '{ruta}'")
@@ -0,0 +1,220 @@
+"""
+ETL incremental de Aurelion: solo las líneas de venta nuevas desde la última ejecución.
+
+La exportación completa (Aurelion.ipynb) relee y vuelve a unir todo el histórico.
+Este script guarda en el manifiesto del dataset Parquet (exportacion_parquet.py)
+un checkpoint con la última línea exportada (`id_detalle`, además del último
+`id_venta` y `fecha`) y la versión de Clientes y Productos, y en cada ejecución:
+
+  1. Lee las dimensiones (son pequeñas) y las compara con la copia en caché de
+     la ejecución anterior. Las altas no afectan a lo ya exportado; si hay
+     modificaciones o bajas, se rehacen desde la BD solo los meses con ventas
+     de esos clientes o productos.
+  2. Extrae solo las líneas con `id_detalle` posterior al checkpoint y sus
+     ventas, las une con las dimensiones y las añade al dataset como ficheros
+     nuevos de sus particiones.
+
+Igual que las tablas resumen, no ve modificaciones ni borrados de ventas ya
+exportadas: para eso está `--full-rebuild`, que reconstruye todo el dataset.
+
+Uso:
+    python etl_incremental.py
+    python etl_incremental.py --full-rebuild [--por-ciudad]
+"""
+import argparse
+import os
+import time
+from datetime import date
+
+import polars as pl
+
+from acceso_datos import lotes_polars, obtener_conexion
+from etl_aurelion import plan_ventas_detalladas
+from exportacion_parquet import (COLUMNA_MES, DATASET_VENTAS, DIRECTORIO_EXPORTACION, NOMBRE_MANIFIESTO,
+                                 actualizar_ventas_parquet, exportar_ventas_parquet, leer_manifiesto)
+
+DIRECTORIO_CACHE = os.path.join(DIRECTORIO_EXPORTACION, 'cache_etl')
+# Dimensiones que se cachean: nombre en `datos` → (tabla, clave)
+DIMENSIONES = {'clientes': ('Clientes', 'id_cliente'), 'productos': ('Productos', 'id_producto')}
+
+# `{donde}` puede usar columnas de Ventas (v) y de Detalles_Ventas (dv)
+CONSULTA_DETALLES = ("SELECT dv.* FROM Detalles_Ventas dv "
+                     "JOIN Ventas v ON v.id_venta = dv.id_venta WHERE {donde}")
+CONSULTA_VENTAS = ("SELECT v.* FROM Ventas v WHERE EXISTS "
+                   "(SELECT 1 FROM Detalles_Ventas dv WHERE dv.id_venta = v.id_venta AND {donde})")
+
+
+def _leer(conexion, consulta, params=None):
+    return pl.concat(list(lotes_polars(consulta, params, conn=conexion)), how='vertical_relaxed')
+
+
+def _ultima_linea(conexion):
+    maximo = _leer(conexion, "SELECT MAX(id_detalle) AS id_detalle FROM Detalles_Ventas")['id_detalle'][0]
+    return -1 if maximo is None else maximo
+
+
+def _extraer_hechos(conexion, donde, params):
+    return {
+        'ventas': _leer(conexion, CONSULTA_VENTAS.format(donde=donde), params),
+        'detalles_ventas': _leer(conexion, CONSULTA_DETALLES.format(donde=donde), params),
+    }
+
+
+def _unir(hechos, dimensiones):
+    return plan_ventas_detalladas({**hechos, **dimensiones}).collect(engine='streaming')
+
+
+def _version(tabla):
+    return {'filas': len(tabla), 'huella': str(tabla.hash_rows(seed=0).sum()) if len(tabla) else '0'}
+
+
+def _ruta_cache(cache, nombre):
+    return os.path.join(cache, f'{nombre}.parquet')
+
+
+def _guardar_cache(cache, dimensiones):
+    os.makedirs(cache, exist_ok=True)
+    for nombre, tabla in dimensiones.items():
+        temporal = f'{_ruta_cache(cache, nombre)}.{os.getpid()}.tmp'
+        tabla.write_parquet(temporal)
+        os.replace(temporal, _ruta_cache(cache, nombre))
+
+
+def _claves_cambiadas(nueva, cacheada, clave):
+    """Claves modificadas o borradas respecto a la caché (None si no se pueden comparar)"""
+    if cacheada.schema != nueva.schema:
+        return None
+    distintas = cacheada.join(nueva, on=cacheada.columns, how='anti', nulls_equal=True)
+    return set(distintas[clave].to_list())
+
+
+def _meses_afectados(directorio, manifiesto, cambios):
+    """Meses del dataset con alguna línea de los clientes o productos cambiados"""
+    meses = set()
+    for particion in manifiesto['particiones']:
+        mes = particion['valores'][COLUMNA_MES]
+        if mes in meses:
+            continue
+        plan = pl.scan_parquet(os.path.join(directorio, particion['ruta']))
+        condicion = pl.any_horizontal([pl.col(DIMENSIONES[nombre][1]).is_in(list(claves))
+                                       for nombre, claves in cambios.items()])
+        if plan.filter(condicion).select(pl.len()).collect().item():
+            meses.add(mes)
+    return meses
+
+
+def _rango_mes(mes):
+    anio, numero = map(int, mes.split('-'))
+    return date(anio, numero, 1), date(anio + numero // 12, numero % 12 + 1, 1)
+
+
+def _maximo(*valores):
+    presentes = [v for v in valores if v is not None]
+    return max(presentes) if presentes else None
+
+
+def _checkpoint(anterior, hechos, hasta, dimensiones):
+    ventas = hechos['ventas']
+    return {
+        'id_detalle': hasta,
+        'id_venta': _maximo(anterior.get('id_venta'), ventas['id_venta'].max()),
+        'fecha': _maximo(anterior.get('fecha'), ventas['fecha'].cast(pl.String).max()),
+        'dimensiones': {nombre: _version(tabla) for nombre, tabla in dimensiones.items()},
+    }
+
+
+def reconstruir_ventas_parquet(conexion, directorio=DATASET_VENTAS, por_ciudad=False, cache=DIRECTORIO_CACHE):
+    """Exporta todo el histórico y deja el checkpoint y la caché de dimensiones para las siguientes"""
+    hasta = _ultima_linea(conexion)
+    dimensiones = {nombre: _leer(conexion, f"SELECT * FROM {tabla}") for nombre, (tabla, _) in DIMENSIONES.items()}
+    hechos = _extraer_hechos(conexion, 'dv.id_detalle <= %s', (hasta,))
+    exportar_ventas_parquet(_unir(hechos, dimensiones), directorio, por_ciudad,
+                            checkpoint=_checkpoint({}, hechos, hasta, dimensiones))
+    _guardar_cache(cache, dimensiones)
+    return {'modo': 'completo', 'lineas': len(hechos['detalles_ventas']), 'meses_rehechos': None}
+
+
+def actualizar_etl(conexion=None, directorio=DATASET_VENTAS, completo=False, por_ciudad=False,
+                   cache=DIRECTORIO_CACHE):
+    """Lleva el dataset Parquet al día; reconstruye entero si se pide o no hay checkpoint o caché"""
+    propia = conexion is None
+    conexion = conexion or obtener_conexion()
+    try:
+        manifiesto = None
+        if os.path.exists(os.path.join(directorio, NOMBRE_MANIFIESTO)):
+            manifiesto = leer_manifiesto(directorio)
+        cacheadas = {nombre: pl.read_parquet(_ruta_cache(cache, nombre)) for nombre in DIMENSIONES
+                     if os.path.exists(_ruta_cache(cache, nombre))}
+        if completo or manifiesto is None or 'checkpoint' not in manifiesto or len(cacheadas) < len(DIMENSIONES):
+            if not completo:
+                print('ℹ️ Sin checkpoint o sin caché de dimensiones: reconstrucción completa')
+            return reconstruir_ventas_parquet(conexion, directorio, por_ciudad, cache)
+
+        checkpoint = manifiesto['checkpoint']
+        por_ciudad = 'ciudad' in manifiesto['particionado_por']
+        hasta = _ultima_linea(conexion)
+        dimensiones = {nombre: _leer(conexion, f"SELECT * FROM {tabla}") for nombre, (tabla, _) in DIMENSIONES.items()}
+
+        cambios = {}
+        for nombre, (tabla, clave) in DIMENSIONES.items():
+            if _version(dimensiones[nombre]) == checkpoint['dimensiones'].get(nombre):
+                continue
+            claves = _claves_cambiadas(dimensiones[nombre], cacheadas[nombre], clave)
+            if claves is None:
+                print(f'ℹ️ {tabla} cambió de esquema: reconstrucción completa')
+                return reconstruir_ventas_parquet(conexion, directorio, por_ciudad, cache)
+            if claves:
+                cambios[nombre] = claves
+                print(f'🔁 {tabla}: {len(claves):,} filas modificadas o borradas')
+
+        meses = _meses_afectados(directorio, manifiesto, cambios) if cambios else set()
+        if None in meses:
+            print('ℹ️ Hay ventas sin fecha afectadas por los cambios: reconstrucción completa')
+            return reconstruir_ventas_parquet(conexion, directorio, por_ciudad, cache)
+
+        partes = []
+        for mes in sorted(meses):
+            desde, fin = _rango_mes(mes)
+            partes.append(_extraer_hechos(conexion, 'v.fecha >= %s AND v.fecha < %s AND dv.id_detalle <= %s',
+                                          (desde, fin, hasta)))
+        nuevas = _extraer_hechos(conexion, 'dv.id_detalle > %s AND dv.id_detalle <= %s',
+                                 (checkpoint['id_detalle'], hasta))
+        hechos = {nombre: pl.concat([p[nombre] for p in partes + [nuevas]], how='vertical_relaxed')
+                  for nombre in nuevas}
+        # Una venta puede llegar en los dos lotes (mes rehecho y líneas nuevas)
+        hechos['ventas'] = hechos['ventas'].unique(subset='id_venta', keep='first', maintain_order=True)
+        hechos['detalles_ventas'] = hechos['detalles_ventas'].unique(subset='id_detalle', keep='first',
+                                                                     maintain_order=True)
+
+        # Sin líneas no hay nada que unir (y SQLite no informa de los tipos de un resultado vacío)
+        unidas = _unir(hechos, dimensiones) if len(hechos['detalles_ventas']) else None
+        actualizar_ventas_parquet(unidas, directorio, meses_reemplazados=meses,
+                                  checkpoint=_checkpoint(checkpoint, nuevas, hasta, dimensiones))
+        _guardar_cache(cache, dimensiones)
+        return {'modo': 'incremental', 'lineas': len(nuevas['detalles_ventas']), 'meses_rehechos': sorted(meses)}
+    finally:
+        if propia:
+            conexion.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ETL incremental de ventas_detalladas a Parquet')
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help='reconstruye todo el dataset e ignora el checkpoint')
+    parser.add_argument('--por-ciudad', action='store_true',
+                        help='particiona también por ciudad (solo al reconstruir)')
+    parser.add_argument('--directorio', default=DATASET_VENTAS)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    resultado = actualizar_etl(directorio=args.directorio, completo=args.full_rebuild, por_ciudad=args.por_ciudad)
+    if resultado['modo'] == 'completo':
+        print(f"✅ Dataset reconstruido: {resultado['lineas']:,} líneas en {time.perf_counter() - inicio:.2f} s")
+    else:
+        rehechos = f", meses rehechos: {', '.join(resultado['meses_rehechos'])}" if resultado['meses_rehechos'] else ''
+        print(f"✅ {resultado['lineas']:,} líneas nuevas incorporadas{rehechos} "
+              f"en {time.perf_counter() - inicio:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""
+Exportación de ventas_detalladas a Parquet particionado (sustituye a ventas_procesadas.csv).
+
+Aurelion.ipynb escribe el dataset con tipos (fechas como fechas, importes como
+float) y comprimido, en una carpeta por mes y opcionalmente por ciudad, al
+estilo Hive, dentro de la carpeta de la versión vigente:
+
+    datos_exportados/ventas_procesadas/
+        manifiesto.json
+        v000001/anio_mes=2024-01/parte-0.parquet
+        v000001/anio_mes=2024-01/ciudad=Cordoba/parte-0.parquet   (con por_ciudad=True)
+
+El manifiesto guarda el esquema, la versión y, por fichero, su partición, ruta,
+filas y rango de fechas. Cada exportación completa escribe una versión nueva y
+después sustituye el manifiesto, que es lo único que apunta a ella (como el
+puntero de los snapshots de almacen_columnar.py). `actualizar_ventas_parquet` añade ficheros `parte-N.parquet`
+a las particiones sin reescribir el resto (lo usa etl_incremental.py). AurelionML.ipynb lee con `leer_ventas_parquet`, que solo abre las
+particiones del periodo y las ciudades pedidas y solo las columnas que usa.
+"""
+import ast
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+import polars as pl
+
+DIRECTORIO_EXPORTACION = 'datos_exportados'
+DATASET_VENTAS = os.path.join(DIRECTORIO_EXPORTACION, 'ventas_procesadas')
+NOMBRE_MANIFIESTO = 'manifiesto.json'
+COMPRESION = 'zstd'
+COLUMNA_MES = 'anio_mes'
+# Valor de partición para los nulos (el mismo que usan Hive y Spark)
+PARTICION_NULA = '__HIVE_DEFAULT_PARTITION__'
+
+
+def _tipar(df):
+    """Fechas como fechas aunque la fuente las entregue como texto (SQLite)"""
+    columnas = []
+    if df.schema.get('fecha') == pl.String:
+        columnas.append(pl.col('fecha').str.to_datetime(strict=False))
+    if df.schema.get('fecha_alta') == pl.String:
+        columnas.append(pl.col('fecha_alta').str.to_date(strict=False))
+    return df.with_columns(columnas) if columnas else df
+
+
+def _carpeta(clave, valor):
+    return f"{clave}={PARTICION_NULA if valor is None else quote(str(valor), safe='')}"
+
+
+def _preparar(ventas_detalladas):
+    df = ventas_detalladas.collect() if isinstance(ventas_detalladas, pl.LazyFrame) else ventas_detalladas
+    return _tipar(df).with_columns(pl.col('fecha').dt.strftime('%Y-%m').alias(COLUMNA_MES))
+
+
+def _escribir_particiones(df, directorio, claves, raiz='', numero=lambda carpeta: 0):
+    """Escribe `df` (con COLUMNA_MES) en carpetas por `claves` bajo `raiz`; devuelve las entradas del manifiesto
+
+    Las rutas de las entradas son relativas a `directorio` (incluyen `raiz`).
+    """
+    entradas = []
+    for valores, parte in sorted(df.partition_by(claves, as_dict=True).items(),
+                                 key=lambda item: tuple('' if v is None else str(v) for v in item[0])):
+        carpeta = os.path.join(raiz, *[_carpeta(c, v) for c, v in zip(claves, valores)])
+        ruta = os.path.join(carpeta, f'parte-{numero(carpeta)}.parquet')
+        os.makedirs(os.path.join(directorio, carpeta), exist_ok=True)
+        parte.drop(COLUMNA_MES).write_parquet(os.path.join(directorio, ruta), compression=COMPRESION,
+                                              statistics=True)
+        fechas = parte['fecha'].drop_nulls()
+        entradas.append({
+            'ruta': ruta.replace(os.sep, '/'),
+            'valores': dict(zip(claves, valores)),
+            'filas': len(parte),
+            'fecha_min': None if fechas.is_empty() else fechas.min().isoformat(),
+            'fecha_max': None if fechas.is_empty() else fechas.max().isoformat(),
+        })
+    return entradas
+
+
+def _guardar_manifiesto(directorio, manifiesto):
+    # Se sustituye de golpe: los lectores ven el manifiesto anterior o el nuevo, nunca uno a medias
+    temporal = os.path.join(directorio, f'{NOMBRE_MANIFIESTO}.{os.getpid()}.tmp')
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(manifiesto, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, os.path.join(directorio, NOMBRE_MANIFIESTO))
+
+
+def _raiz(manifiesto):
+    # Los datasets anteriores a las versiones tienen las particiones directamente en la carpeta
+    return manifiesto.get('raiz', '')
+
+
+def _retirar_versiones(directorio, conservadas):
+    """Borra las versiones y particiones sueltas que no están en `conservadas` (ni el manifiesto)"""
+    for nombre in os.listdir(directorio):
+        if nombre in conservadas or nombre.startswith(NOMBRE_MANIFIESTO):
+            continue
+        if '' in conservadas and nombre.startswith(f'{COLUMNA_MES}='):
+            continue
+        shutil.rmtree(os.path.join(directorio, nombre), ignore_errors=True)
+
+
+def exportar_ventas_parquet(ventas_detalladas, directorio=DATASET_VENTAS, por_ciudad=False, checkpoint=None):
+    """Escribe el dataset particionado por mes (y ciudad) con su manifiesto; devuelve el manifiesto
+
+    Se escribe como una versión nueva junto a la vigente y al final se sustituye el
+    manifiesto: quien lea a la vez ve el dataset anterior completo, nunca uno a
+    medias. Se conserva la versión anterior, por si alguien la está leyendo, y se
+    borran las más viejas. `checkpoint` se guarda en el manifiesto para las
+    ejecuciones incrementales (etl_incremental.py).
+    """
+    inicio = time.perf_counter()
+    df = _preparar(ventas_detalladas)
+    claves = [COLUMNA_MES] + (['ciudad'] if por_ciudad else [])
+
+    anterior = leer_manifiesto(directorio) if os.path.exists(os.path.join(directorio, NOMBRE_MANIFIESTO)) else None
+    version = (anterior or {}).get('version', 0) + 1
+    raiz = f'v{version:06d}'
+    # Restos de una exportación interrumpida con el mismo número
+    shutil.rmtree(os.path.join(directorio, raiz), ignore_errors=True)
+    os.makedirs(os.path.join(directorio, raiz))
+    particiones = _escribir_particiones(df, directorio, claves, raiz)
+
+    manifiesto = {
+        'creado': datetime.now().isoformat(timespec='seconds'),
+        'version': version,
+        'raiz': raiz,
+        'particionado_por': claves,
+        'compresion': COMPRESION,
+        'filas': len(df),
+        'esquema': {columna: str(tipo) for columna, tipo in df.drop(COLUMNA_MES).schema.items()},
+        'particiones': particiones,
+    }
+    if checkpoint is not None:
+        manifiesto['checkpoint'] = checkpoint
+    _guardar_manifiesto(directorio, manifiesto)
+    _retirar_versiones(directorio, {raiz} | ({_raiz(anterior)} if anterior else set()))
+
+    print(f"💾 {len(df):,} ventas en {len(particiones)} particiones de '{directorio}' "
+          f"({time.perf_counter() - inicio:.2f} s)")
+    return manifiesto
+
+
+def actualizar_ventas_parquet(nuevas, directorio=DATASET_VENTAS, meses_reemplazados=(), checkpoint=None):
+    """Añade `nuevas` al dataset como ficheros nuevos y sustituye los meses de `meses_reemplazados`
+
+    Las filas de `nuevas` de esos meses pasan a ser todo su contenido; las del resto
+    se añaden a sus particiones (`parte-N.parquet` con el siguiente N). Los ficheros
+    nuevos se escriben antes que el manifiesto y los sustituidos se borran después,
+    así que un lector con el manifiesto anterior sigue encontrando los suyos. Con
+    `nuevas=None` solo se actualiza el checkpoint.
+    """
+    manifiesto = leer_manifiesto(directorio)
+    claves = manifiesto['particionado_por']
+    meses_reemplazados = set(meses_reemplazados)
+
+    raiz = _raiz(manifiesto)
+
+    def siguiente(carpeta):
+        existentes = [n for n in os.listdir(os.path.join(directorio, carpeta)) if n.startswith('parte-')]
+        return 1 + max((int(n[len('parte-'):-len('.parquet')]) for n in existentes), default=-1)
+
+    retiradas = [p for p in manifiesto['particiones'] if p['valores'][COLUMNA_MES] in meses_reemplazados]
+    conservadas = [p for p in manifiesto['particiones'] if p['valores'][COLUMNA_MES] not in meses_reemplazados]
+    escritas = []
+    if nuevas is not None:
+        df = _preparar(nuevas)
+        # Mismos tipos que lo ya exportado, aunque el lote nuevo sea pequeño o venga de otro motor
+        esquema = pl.read_parquet_schema(os.path.join(directorio, manifiesto['particiones'][0]['ruta'])) \
+            if manifiesto['particiones'] else df.drop(COLUMNA_MES).schema
+        df = df.select([pl.col(c).cast(t) for c, t in esquema.items()] + [COLUMNA_MES])
+        escritas = _escribir_particiones(df, directorio, claves, raiz, numero=lambda carpeta: siguiente(carpeta)
+                                         if os.path.isdir(os.path.join(directorio, carpeta)) else 0)
+
+    manifiesto['particiones'] = sorted(conservadas + escritas, key=lambda p: p['ruta'])
+    manifiesto['filas'] = sum(p['filas'] for p in manifiesto['particiones'])
+    manifiesto['actualizado'] = datetime.now().isoformat(timespec='seconds')
+    if checkpoint is not None:
+        manifiesto['checkpoint'] = checkpoint
+    _guardar_manifiesto(directorio, manifiesto)
+
+    for particion in retiradas:
+        os.remove(os.path.join(directorio, particion['ruta']))
+    return manifiesto
+
+
+def leer_manifiesto(directorio=DATASET_VENTAS):
+    with open(os.path.join(directorio, NOMBRE_MANIFIESTO), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _mes(valor):
+    return None if valor is None else str(valor)[:7]
+
+
+def particiones_seleccionadas(manifiesto, desde=None, hasta=None, ciudades=None):
+    """Particiones del manifiesto dentro del periodo y de las ciudades (el periodo va por meses:
+    'YYYY-MM' o una fecha, de la que se toma su mes)"""
+    desde, hasta = _mes(desde), _mes(hasta)
+    seleccion = []
+    for particion in manifiesto['particiones']:
+        mes = particion['valores'][COLUMNA_MES]
+        if (desde or hasta) and mes is None:
+            continue
+        if desde and mes < desde or hasta and mes > hasta:
+            continue
+        if ciudades is not None and 'ciudad' in particion['valores'] \
+                and particion['valores']['ciudad'] not in ciudades:
+            continue
+        seleccion.append(particion)
+    return seleccion
+
+
+def _tipo_polars(texto):
+    """Tipo de Polars a partir de su `str`, que es como lo guarda el manifiesto (p. ej. `Datetime(time_unit='us')`)"""
+    def convertir(nodo):
+        if isinstance(nodo, ast.Name):
+            return getattr(pl, nodo.id)
+        if isinstance(nodo, ast.Call):
+            return convertir(nodo.func)(*map(convertir, nodo.args),
+                                        **{k.arg: convertir(k.value) for k in nodo.keywords})
+        if isinstance(nodo, ast.Dict):
+            return {ast.literal_eval(k): convertir(v) for k, v in zip(nodo.keys, nodo.values)}
+        return ast.literal_eval(nodo)
+
+    return convertir(ast.parse(texto, mode='eval').body)
+
+
+def _esquema_exportado(directorio, manifiesto):
+    """Esquema de las columnas exportadas (sin la de partición por mes), aunque el dataset esté vacío"""
+    if manifiesto['particiones']:
+        return pl.read_parquet_schema(os.path.join(directorio, manifiesto['particiones'][0]['ruta']))
+    return {columna: _tipo_polars(tipo) for columna, tipo in manifiesto['esquema'].items()}
+
+
+def leer_ventas_parquet(directorio=DATASET_VENTAS, columnas=None, desde=None, hasta=None, ciudades=None,
+                        como='pandas'):
+    """Ventas exportadas, leyendo solo las particiones y columnas pedidas (pandas o, con como='polars', Polars)"""
+    manifiesto = leer_manifiesto(directorio)
+    rutas = [os.path.join(directorio, p['ruta']) for p in
+             particiones_seleccionadas(manifiesto, desde, hasta, ciudades)]
+
+    if rutas:
+        plan = pl.scan_parquet(rutas, hive_partitioning=False)
+        if ciudades is not None and 'ciudad' not in manifiesto['particionado_por']:
+            # Sin carpetas por ciudad, el filtro baja a las estadísticas de cada row group
+            plan = plan.filter(pl.col('ciudad').is_in(list(ciudades)))
+        if columnas is not None:
+            plan = plan.select(columnas)
+        df = plan.collect()
+    else:
+        esquema = _esquema_exportado(directorio, manifiesto)
+        faltan = [c for c in columnas or [] if c not in esquema]
+        if faltan:
+            raise ValueError(f"Columnas inexistentes en el dataset '{directorio}': {faltan}")
+        df = pl.DataFrame(schema={c: esquema[c] for c in (columnas or esquema)})
+    return df.to_pandas() if como == 'pandas' else df
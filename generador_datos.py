@@ -0,0 +1,291 @@
+"""
+Generador de datos sintéticos de Aurelion.
+
+Produce Clientes, Productos, Ventas y Detalles_Ventas con el mismo esquema que
+BD/Crear_Aurelion.sql a la escala pedida (de miles a decenas de millones de
+líneas de detalle), con popularidad de productos, clientes y ciudades sesgada
+(tipo Zipf) como en una tienda real. Las ventas se generan por lotes, así que
+la memoria no crece con el tamaño del dataset.
+
+Salidas (sin necesidad de MySQL):
+    - Parquet: un fichero por tabla en el directorio de salida
+    - SQLite: una base de datos local con las cuatro tablas (opcional)
+
+Uso:
+    python generador_datos.py --lineas 1000000 --salida datos_sinteticos/1M --sqlite
+"""
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from datos_dashboard import compactar_datos, derivar_columnas_fecha, ordenar_por_fecha
+
+# Ciudades y medios de pago de la tienda, ordenados de más a menos frecuentes
+CIUDADES = ['Rio Cuarto', 'Cordoba', 'Alta Gracia', 'Carlos Paz', 'Villa Maria', 'Mendiolaza']
+MEDIOS_PAGO = ['efectivo', 'qr', 'transferencia', 'tarjeta']
+PESOS_MEDIOS_PAGO = [0.31, 0.25, 0.23, 0.21]
+CATEGORIAS = ['Alimentos', 'Limpieza']
+
+NOMBRES = ['Mariana', 'Nicolas', 'Hernan', 'Uma', 'Agustina', 'Emilia', 'Bruno', 'Yamila',
+           'Karina', 'Helena', 'Gael', 'Ivana', 'Tomas', 'Felipe', 'Pablo', 'Elena',
+           'Franco', 'Camila', 'Rocio', 'Diego', 'Martina', 'Guadalupe', 'Olivia', 'Lucia']
+APELLIDOS = ['Lopez', 'Rojas', 'Martinez', 'Flores', 'Medina', 'Castro', 'Molina', 'Acosta',
+             'Sanchez', 'Gomez', 'Ruiz', 'Torres', 'Silva', 'Rodriguez', 'Fernandez', 'Alvarez',
+             'Romero', 'Diaz', 'Perez', 'Herrera']
+
+# Exponentes de los sesgos: mayor = más concentrado en los primeros del ranking
+SESGO_PRODUCTOS = 1.1
+SESGO_CLIENTES = 0.8
+SESGO_CIUDADES = 0.9
+
+LINEAS_POR_VENTA_MAX = 5
+CANTIDAD_MAX = 5
+FECHA_INICIO = '2023-01-01'
+FECHA_FIN = '2024-12-31'
+LINEAS_POR_LOTE = 1_000_000
+
+TABLAS = ['clientes', 'productos', 'ventas', 'detalles_ventas']
+TABLAS_SQL = {
+    'clientes': 'Clientes',
+    'productos': 'Productos',
+    'ventas': 'Ventas',
+    'detalles_ventas': 'Detalles_Ventas',
+}
+
+
+def _pesos_zipf(n, exponente):
+    pesos = 1.0 / np.arange(1, n + 1) ** exponente
+    return pesos / pesos.sum()
+
+
+def tamaños_por_defecto(n_lineas):
+    """Clientes y productos proporcionales a la escala, con el tamaño real como mínimo"""
+    return {
+        'clientes': max(100, n_lineas // 20),
+        'productos': min(max(100, n_lineas // 1000), 50_000),
+    }
+
+
+def generar_clientes(n_clientes, rng):
+    ids = np.arange(1, n_clientes + 1)
+    nombres = rng.choice(NOMBRES, n_clientes)
+    apellidos = rng.choice(APELLIDOS, n_clientes)
+    nombre_cliente = pd.Series(nombres, dtype='object') + ' ' + pd.Series(apellidos, dtype='object')
+    email = (nombre_cliente.str.lower().str.replace(' ', '.', regex=False)
+             + ids.astype(str) + '@mail.com')
+    return pd.DataFrame({
+        'id_cliente': ids.astype('float64'),
+        'nombre_cliente': nombre_cliente,
+        'email': email,
+        'ciudad': rng.choice(CIUDADES, n_clientes, p=_pesos_zipf(len(CIUDADES), SESGO_CIUDADES)),
+        'fecha_alta': pd.Timestamp(FECHA_INICIO) - pd.to_timedelta(rng.integers(0, 730, n_clientes), unit='D'),
+    })
+
+
+def generar_productos(n_productos, rng):
+    ids = np.arange(1, n_productos + 1)
+    categorias = rng.choice(CATEGORIAS, n_productos)
+    return pd.DataFrame({
+        'id_producto': ids.astype('float64'),
+        'nombre_producto': [f'Producto {i:05d}' for i in ids],
+        'categoria': categorias,
+        'precio_unitario': rng.integers(200, 5000, n_productos).astype('float64'),
+    })
+
+
+def generar_lotes_ventas(n_lineas, clientes, productos, rng, lineas_por_lote=LINEAS_POR_LOTE):
+    """Genera (ventas, detalles_ventas) por lotes; ids y fechas crecen de un lote al siguiente"""
+    pesos_productos = _pesos_zipf(len(productos), SESGO_PRODUCTOS)
+    pesos_clientes = _pesos_zipf(len(clientes), SESGO_CLIENTES)
+    # El ranking de popularidad no coincide con el orden de los ids
+    orden_productos = rng.permutation(len(productos))
+    orden_clientes = rng.permutation(len(clientes))
+
+    inicio = pd.Timestamp(FECHA_INICIO)
+    dias = (pd.Timestamp(FECHA_FIN) - inicio).days + 1
+    lineas_medias = (1 + LINEAS_POR_VENTA_MAX) / 2
+    ventas_estimadas = max(1, int(n_lineas / lineas_medias))
+
+    generadas = 0
+    siguiente_venta = 1
+    while generadas < n_lineas:
+        objetivo = min(lineas_por_lote, n_lineas - generadas)
+
+        # Líneas por venta hasta cubrir el lote (la última venta se recorta);
+        # `objetivo` ventas alcanzan siempre aunque todas tuvieran una sola línea
+        lineas = rng.integers(1, LINEAS_POR_VENTA_MAX + 1, objetivo)
+        acumuladas = np.cumsum(lineas)
+        n_ventas = int(np.searchsorted(acumuladas, objetivo)) + 1
+        lineas = lineas[:n_ventas]
+        lineas[-1] -= acumuladas[n_ventas - 1] - objetivo
+
+        ids_venta = np.arange(siguiente_venta, siguiente_venta + n_ventas)
+        # Fechas crecientes con el id: el histórico se reparte uniformemente entre todas las ventas
+        posicion = (ids_venta - 1 + rng.random(n_ventas)) / ventas_estimadas
+        fechas = inicio + pd.to_timedelta(np.minimum(posicion * dias, dias - 1).astype('int64'), unit='D')
+
+        idx_clientes = orden_clientes[rng.choice(len(clientes), n_ventas, p=pesos_clientes)]
+        ventas = pd.DataFrame({
+            'id_venta': ids_venta.astype('float64'),
+            'fecha': fechas,
+            'id_cliente': clientes['id_cliente'].to_numpy()[idx_clientes],
+            'nombre_cliente': clientes['nombre_cliente'].to_numpy()[idx_clientes],
+            'email': clientes['email'].to_numpy()[idx_clientes],
+            'medio_pago': rng.choice(MEDIOS_PAGO, n_ventas, p=PESOS_MEDIOS_PAGO),
+        })
+
+        idx_productos = orden_productos[rng.choice(len(productos), objetivo, p=pesos_productos)]
+        cantidad = rng.integers(1, CANTIDAD_MAX + 1, objetivo).astype('float64')
+        precio = productos['precio_unitario'].to_numpy()[idx_productos]
+        detalles = pd.DataFrame({
+            'id_detalle': np.arange(generadas + 1, generadas + objetivo + 1),
+            'id_venta': np.repeat(ids_venta, lineas).astype('float64'),
+            'id_producto': productos['id_producto'].to_numpy()[idx_productos],
+            'nombre_producto': productos['nombre_producto'].to_numpy()[idx_productos],
+            'cantidad': cantidad,
+            'precio_unitario': precio,
+            'importe': cantidad * precio,
+        })
+
+        yield ventas, detalles
+        generadas += objetivo
+        siguiente_venta += n_ventas
+
+
+def _crear_tablas_sqlite(conexion):
+    conexion.executescript("""
+        CREATE TABLE Clientes (id_cliente REAL PRIMARY KEY, nombre_cliente TEXT NOT NULL,
+                               email TEXT, ciudad TEXT, fecha_alta TEXT);
+        CREATE TABLE Productos (id_producto REAL PRIMARY KEY, nombre_producto TEXT NOT NULL,
+                                categoria TEXT, precio_unitario REAL);
+        CREATE TABLE Ventas (id_venta REAL PRIMARY KEY, fecha TEXT NOT NULL, id_cliente REAL,
+                             nombre_cliente TEXT, email TEXT, medio_pago TEXT);
+        CREATE TABLE Detalles_Ventas (id_detalle INTEGER PRIMARY KEY, id_venta REAL NOT NULL,
+                                      id_producto REAL, nombre_producto TEXT, cantidad REAL,
+                                      precio_unitario REAL, importe REAL);
+    """)
+
+
+def _indexar_sqlite(conexion):
+    conexion.executescript("""
+        CREATE INDEX idx_ventas_fecha ON Ventas (fecha);
+        CREATE INDEX idx_ventas_cliente ON Ventas (id_cliente);
+        CREATE INDEX idx_detalles_venta ON Detalles_Ventas (id_venta);
+        CREATE INDEX idx_detalles_producto ON Detalles_Ventas (id_producto);
+    """)
+
+
+def _a_sqlite(df):
+    """Fechas como texto 'YYYY-MM-DD HH:MM:SS', igual que las devuelve MySQL al volcarlas"""
+    df = df.copy()
+    for columna in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[columna]):
+            df[columna] = df[columna].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return df
+
+
+def generar_dataset(salida, n_lineas, semilla=42, sqlite=False, clientes=None, productos=None,
+                    lineas_por_lote=LINEAS_POR_LOTE):
+    """Escribe el dataset sintético en `salida` (Parquet por tabla y, si se pide, aurelion.db)"""
+    os.makedirs(salida, exist_ok=True)
+    rng = np.random.default_rng(semilla)
+    tamaños = tamaños_por_defecto(n_lineas)
+    df_clientes = generar_clientes(clientes or tamaños['clientes'], rng)
+    df_productos = generar_productos(productos or tamaños['productos'], rng)
+
+    conexion = None
+    if sqlite:
+        ruta_sqlite = os.path.join(salida, 'aurelion.db')
+        if os.path.exists(ruta_sqlite):
+            os.remove(ruta_sqlite)
+        conexion = sqlite3.connect(ruta_sqlite)
+        _crear_tablas_sqlite(conexion)
+
+    for nombre, df in (('clientes', df_clientes), ('productos', df_productos)):
+        df.to_parquet(os.path.join(salida, f'{nombre}.parquet'), index=False)
+        if conexion is not None:
+            _a_sqlite(df).to_sql(TABLAS_SQL[nombre], conexion, if_exists='append', index=False)
+
+    escritores = {}
+    try:
+        for ventas, detalles in generar_lotes_ventas(n_lineas, df_clientes, df_productos, rng,
+                                                     lineas_por_lote):
+            for nombre, df in (('ventas', ventas), ('detalles_ventas', detalles)):
+                tabla = pa.Table.from_pandas(df, preserve_index=False)
+                if nombre not in escritores:
+                    escritores[nombre] = pq.ParquetWriter(os.path.join(salida, f'{nombre}.parquet'),
+                                                          tabla.schema)
+                escritores[nombre].write_table(tabla)
+                if conexion is not None:
+                    _a_sqlite(df).to_sql(TABLAS_SQL[nombre], conexion, if_exists='append', index=False)
+    finally:
+        for escritor in escritores.values():
+            escritor.close()
+
+    if conexion is not None:
+        _indexar_sqlite(conexion)
+        conexion.commit()
+        conexion.close()
+
+
+def dataset_existe(directorio):
+    return all(os.path.exists(os.path.join(directorio, f'{tabla}.parquet')) for tabla in TABLAS)
+
+
+def leer_tablas_polars(directorio):
+    """Las cuatro tablas como DataFrames de Polars, con los nombres que usa `extraer_datos_polars`"""
+    import polars as pl
+    return {tabla: pl.read_parquet(os.path.join(directorio, f'{tabla}.parquet')) for tabla in TABLAS}
+
+
+def escanear_tablas_polars(directorio):
+    """Las cuatro tablas como LazyFrames (`pl.scan_parquet`): nada se lee hasta ejecutar el plan"""
+    import polars as pl
+    return {tabla: pl.scan_parquet(os.path.join(directorio, f'{tabla}.parquet')) for tabla in TABLAS}
+
+
+def leer_detalle_dashboard(directorio):
+    """Equivalente en ficheros de `obtener_datos_dashboard`: mismo join, columnas y compactación"""
+    import polars as pl
+
+    def tabla(nombre, columnas):
+        return pl.scan_parquet(os.path.join(directorio, f'{nombre}.parquet')).select(columnas)
+
+    detalle = (
+        tabla('ventas', ['id_venta', 'fecha', 'id_cliente', 'medio_pago'])
+        .join(tabla('clientes', ['id_cliente', 'ciudad', 'nombre_cliente']), on='id_cliente')
+        .join(tabla('detalles_ventas', ['id_venta', 'id_producto', 'nombre_producto', 'cantidad',
+                                        'precio_unitario', 'importe']), on='id_venta')
+        .join(tabla('productos', ['id_producto', 'categoria']), on='id_producto')
+        .select(['id_venta', 'fecha', 'id_cliente', 'medio_pago', 'ciudad', 'nombre_cliente',
+                 'id_producto', 'nombre_producto', 'cantidad', 'precio_unitario', 'importe', 'categoria'])
+        .collect()
+        .to_pandas()
+    )
+    return compactar_datos(ordenar_por_fecha(derivar_columnas_fecha(detalle)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador de datos sintéticos de Aurelion')
+    parser.add_argument('--lineas', type=int, required=True, help='Líneas de detalle de venta a generar')
+    parser.add_argument('--salida', default=None, help='Directorio de salida (por defecto datos_sinteticos/<lineas>)')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--clientes', type=int, default=None)
+    parser.add_argument('--productos', type=int, default=None)
+    parser.add_argument('--sqlite', action='store_true', help='Escribe también una base SQLite (aurelion.db)')
+    args = parser.parse_args()
+
+    salida = args.salida or os.path.join('datos_sinteticos', str(args.lineas))
+    inicio = time.perf_counter()
+    generar_dataset(salida, args.lineas, args.semilla, args.sqlite, args.clientes, args.productos)
+    print(f"✅ {args.lineas:,} líneas generadas en '{salida}' ({time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == '__main__':
+    main()
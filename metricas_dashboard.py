@@ -0,0 +1,247 @@
+"""
+Métricas de los callbacks del dashboard en formato Prometheus.
+
+Cada ejecución de un callback instrumentado reparte su tiempo en fases
+exclusivas (cache, filtro, agregacion, sql, figura, serializacion) y registra
+las filas escaneadas y los bytes de la respuesta. `/metrics` las expone como
+histogramas junto con el RSS del proceso. Sin dependencias externas.
+
+En los callbacks, `iniciar_fase('figura')` cierra la fase en curso y abre la
+siguiente; `with fase('sql'):` mide un bloque anidado y al salir vuelve a la
+fase anterior, así el tiempo nunca se cuenta dos veces.
+"""
+import bisect
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+FASES = ['cache', 'filtro', 'agregacion', 'sql', 'figura', 'serializacion']
+BUCKETS_SEGUNDOS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+BUCKETS_FILAS = [0, 10, 100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000]
+BUCKETS_BYTES = [1_000, 10_000, 50_000, 100_000, 500_000, 1_000_000, 5_000_000, 20_000_000]
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+RUTA_ACTUALIZACION_DASH = '/_dash-update-component'
+
+
+class Histograma:
+    """Histograma acumulativo con etiquetas, como los de Prometheus"""
+
+    def __init__(self, nombre, ayuda, etiquetas, buckets):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.buckets = list(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(str(etiquetas[e]) for e in self.etiquetas)
+        with self._lock:
+            serie = self._series.setdefault(clave, [[0] * len(self.buckets), 0.0, 0])
+            posicion = bisect.bisect_left(self.buckets, valor)
+            if posicion < len(self.buckets):
+                serie[0][posicion] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def exponer(self):
+        lineas = [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} histogram']
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(clave, list(conteos), suma, total) for clave, (conteos, suma, total) in series]
+        for clave, conteos, suma, total in series:
+            base = list(zip(self.etiquetas, clave))
+            acumulado = 0
+            for limite, conteo in zip(self.buckets, conteos):
+                acumulado += conteo
+                lineas.append(f'{self.nombre}_bucket{_etiquetas(base + [("le", _numero(limite))])} {acumulado}')
+            lineas.append(f'{self.nombre}_bucket{_etiquetas(base + [("le", "+Inf")])} {total}')
+            lineas.append(f'{self.nombre}_sum{_etiquetas(base)} {_numero(suma)}')
+            lineas.append(f'{self.nombre}_count{_etiquetas(base)} {total}')
+        return lineas
+
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _etiquetas(pares):
+    if not pares:
+        return ''
+    escapar = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{n}="{escapar(v)}"' for n, v in pares) + '}'
+
+
+DURACION = Histograma('aurelion_callback_duracion_segundos',
+                      'Tiempo de cada callback por fase (fase="total" es la petición completa)',
+                      ['callback', 'fase'], BUCKETS_SEGUNDOS)
+FILAS = Histograma('aurelion_callback_filas_escaneadas',
+                   'Filas de detalle leídas o devueltas por SQL en cada ejecución',
+                   ['callback'], BUCKETS_FILAS)
+PAYLOAD = Histograma('aurelion_callback_payload_bytes',
+                     'Tamaño de la respuesta JSON de cada callback',
+                     ['callback'], BUCKETS_BYTES)
+
+# Funciones sin argumentos que devuelven [(nombre, tipo, ayuda, valor)] en cada /metrics
+_recolectores = []
+
+
+def registrar_recolector(funcion):
+    _recolectores.append(funcion)
+    return funcion
+
+
+class _Medicion:
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.inicio = time.perf_counter()
+        self.fases = defaultdict(float)
+        self.fase_actual = 'cache'
+        self.inicio_fase = self.inicio
+        self.filas = 0
+        self.total = None
+
+    def cambiar_fase(self, nombre):
+        ahora = time.perf_counter()
+        self.fases[self.fase_actual] += ahora - self.inicio_fase
+        self.fase_actual, self.inicio_fase = nombre, ahora
+
+    def cerrar(self):
+        self.cambiar_fase(self.fase_actual)
+        self.total = time.perf_counter() - self.inicio
+
+
+_medicion = contextvars.ContextVar('medicion_callback', default=None)
+
+
+def iniciar_fase(nombre):
+    """Cierra la fase en curso del callback y empieza `nombre` (no hace nada fuera de un callback)"""
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.cambiar_fase(nombre)
+
+
+@contextmanager
+def fase(nombre):
+    """Mide un bloque como `nombre` y vuelve después a la fase en la que estaba"""
+    medicion = _medicion.get()
+    if medicion is None:
+        yield
+        return
+    anterior = medicion.fase_actual
+    medicion.cambiar_fase(nombre)
+    try:
+        yield
+    finally:
+        medicion.cambiar_fase(anterior)
+
+
+def registrar_filas(n):
+    medicion = _medicion.get()
+    if medicion is not None:
+        medicion.filas += int(n)
+
+
+def _observar(medicion, serializacion_extra=0.0, total=None, payload=None):
+    medicion.fases['serializacion'] += serializacion_extra
+    # Todas las fases en cada ejecución (0 si no se usó) para que los conteos coincidan
+    for nombre_fase in FASES + [f for f in medicion.fases if f not in FASES]:
+        DURACION.observar(medicion.fases.get(nombre_fase, 0.0), callback=medicion.nombre, fase=nombre_fase)
+    DURACION.observar(medicion.total if total is None else total, callback=medicion.nombre, fase='total')
+    FILAS.observar(medicion.filas, callback=medicion.nombre)
+    if payload is not None:
+        PAYLOAD.observar(payload, callback=medicion.nombre)
+
+
+@contextmanager
+def medir_operacion(nombre):
+    """Mide una operación fuera de una petición (p. ej. la actualización de datos en segundo plano)"""
+    medicion = _Medicion(nombre)
+    token = _medicion.set(medicion)
+    try:
+        yield medicion
+    finally:
+        _medicion.reset(token)
+        medicion.cerrar()
+        _observar(medicion)
+
+
+def instrumentar(nombre):
+    """Decorador para callbacks de Dash; ponerlo por fuera de la cache para contar también los aciertos"""
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            from flask import g, has_request_context
+
+            medicion = _Medicion(nombre)
+            token = _medicion.set(medicion)
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                _medicion.reset(token)
+                medicion.cerrar()
+                if has_request_context():
+                    # Se completa en after_request con la serialización de Dash y el payload
+                    g.medicion_callback = medicion
+                else:
+                    _observar(medicion)
+        return envoltura
+    return decorador
+
+
+def rss_proceso():
+    """Memoria residente del proceso en bytes, o None si no se puede leer"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        return None
+
+
+def exponer():
+    """Todas las métricas en el formato de texto de Prometheus"""
+    lineas = []
+    for histograma in (DURACION, FILAS, PAYLOAD):
+        lineas.extend(histograma.exponer())
+
+    valores = [('aurelion_proceso_rss_bytes', 'gauge', 'Memoria residente del proceso', rss_proceso())]
+    for recolector in _recolectores:
+        valores.extend(recolector())
+    for nombre, tipo, ayuda, valor in valores:
+        if valor is None:
+            continue
+        lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} {tipo}', f'{nombre} {_numero(valor)}']
+    return '\n'.join(lineas) + '\n'
+
+
+def registrar_en_servidor(server, ruta='/metrics'):
+    """Añade la ruta de métricas y los hooks que miden la serialización y el payload de Dash"""
+    from flask import Response, g, request
+
+    @server.before_request
+    def _inicio_peticion():
+        if request.path.endswith(RUTA_ACTUALIZACION_DASH):
+            g.inicio_peticion = time.perf_counter()
+
+    @server.after_request
+    def _fin_peticion(respuesta):
+        medicion = g.pop('medicion_callback', None)
+        if medicion is not None:
+            total = time.perf_counter() - g.get('inicio_peticion', medicion.inicio)
+            # Lo que no pasó dentro del callback es sobre todo la codificación JSON de Dash
+            _observar(medicion, serializacion_extra=max(total - medicion.total, 0.0), total=total,
+                      payload=respuesta.calculate_content_length())
+        return respuesta
+
+    @server.route(ruta)
+    def _metricas():
+        return Response(exponer(), content_type=TIPO_CONTENIDO)
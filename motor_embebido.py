@@ -0,0 +1,387 @@
+"""
+Motor SQL embebido (DuckDB o SQLite) como alternativa al servidor MySQL.
+
+Carga el esquema de Aurelion en una base de datos local desde:
+    - un volcado SQL de BD/ (por defecto BD/aureliondb.sql)
+    - un directorio con un Parquet por tabla (generador_datos.py)
+    - una base SQLite ya generada (aurelion.db)
+    - el snapshot Arrow del dashboard (snapshots/dashboard.arrow)
+
+La base se guarda en snapshots/ y se reconstruye solo si cambia la fuente.
+Las consultas del dashboard y del ETL corren en el mismo proceso, sin red; con
+DuckDB además se ejecutan de forma vectorizada y el resultado llega como
+columnas, sin pasar por filas de Python.
+
+Se activa con AURELION_MOTOR_BD=duckdb | sqlite | embebido (DuckDB si está
+instalado) y AURELION_FUENTE_BD=<ruta>. Para preparar la base a mano:
+    python motor_embebido.py --motor duckdb --fuente BD/aureliondb.sql
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import date, datetime
+
+import pandas as pd
+
+# 'mysql' (por defecto) o un motor embebido; 'embebido' elige DuckDB si está instalado y si no SQLite
+VARIABLE_MOTOR_BD = 'AURELION_MOTOR_BD'
+MOTORES_BD = ('mysql', 'embebido', 'duckdb', 'sqlite')
+VARIABLE_FUENTE_BD = 'AURELION_FUENTE_BD'
+FUENTE_POR_DEFECTO = os.path.join('BD', 'aureliondb.sql')
+DIRECTORIO_BD_EMBEBIDA = 'snapshots'
+
+TABLAS = {
+    'clientes': 'Clientes',
+    'productos': 'Productos',
+    'ventas': 'Ventas',
+    'detalles_ventas': 'Detalles_Ventas',
+}
+# Mismos índices que el volcado de MySQL; solo se crean en SQLite (DuckDB filtra con sus zonemaps)
+INDICES_SQLITE = """
+    CREATE INDEX IF NOT EXISTS idx_clientes_ciudad ON Clientes (ciudad);
+    CREATE INDEX IF NOT EXISTS idx_productos_categoria ON Productos (categoria);
+    CREATE INDEX IF NOT EXISTS idx_ventas_fecha ON Ventas (fecha);
+    CREATE INDEX IF NOT EXISTS idx_ventas_cliente ON Ventas (id_cliente);
+    CREATE INDEX IF NOT EXISTS idx_detalles_venta ON Detalles_Ventas (id_venta);
+    CREATE INDEX IF NOT EXISTS idx_detalles_producto ON Detalles_Ventas (id_producto);
+"""
+# Tabla con la fuente de la que se construyó la base (para saber cuándo reconstruirla)
+TABLA_ORIGEN = 'aurelion_origen'
+
+
+def duckdb_disponible():
+    try:
+        import duckdb  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def errores_embebidos():
+    """Clases base de los errores DB-API de los motores embebidos instalados"""
+    errores = (sqlite3.Error,)
+    if duckdb_disponible():
+        import duckdb
+        errores += (duckdb.Error,)
+    return errores
+
+
+def motor_bd():
+    """Motor elegido con la variable de entorno; 'mysql' por defecto"""
+    motor = os.environ.get(VARIABLE_MOTOR_BD, 'mysql').lower()
+    if motor not in MOTORES_BD:
+        raise ValueError(f"Motor de base de datos desconocido: '{motor}' (opciones: {MOTORES_BD})")
+    if motor == 'embebido':
+        return 'duckdb' if duckdb_disponible() else 'sqlite'
+    return motor
+
+
+def fuente_bd():
+    return os.environ.get(VARIABLE_FUENTE_BD, FUENTE_POR_DEFECTO)
+
+
+def _valor_parametro(valor):
+    """SQLite no tiene tipo fecha: se comparan como texto 'YYYY-MM-DD HH:MM:SS', igual que en el volcado"""
+    if isinstance(valor, datetime):
+        return valor.isoformat(sep=' ')
+    if isinstance(valor, date):
+        return valor.isoformat()
+    return valor
+
+
+class _CursorEmbebido:
+    """Cursor que acepta los marcadores %s del conector de MySQL"""
+
+    def __init__(self, cursor, motor):
+        self._cursor = cursor
+        self._motor = motor
+
+    def execute(self, consulta, params=None):
+        consulta = consulta.replace('%s', '?')
+        if params is None:
+            return self._cursor.execute(consulta)
+        if self._motor == 'sqlite':
+            params = [_valor_parametro(p) for p in params]
+        return self._cursor.execute(consulta, list(params))
+
+    def close(self):
+        # En DuckDB el cursor es la propia conexión: se cierra con ella
+        if self._motor != 'duckdb':
+            self._cursor.close()
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+
+class ConexionEmbebida:
+    """Conexión DB-API a DuckDB o SQLite con la misma interfaz que usan los scripts con MySQL"""
+
+    def __init__(self, motor, conexion):
+        self.motor = motor
+        self._conexion = conexion
+
+    def cursor(self):
+        # En DuckDB `cursor()` abre otra conexión con su propia transacción: se usa la misma
+        crudo = self._conexion if self.motor == 'duckdb' else self._conexion.cursor()
+        return _CursorEmbebido(crudo, self.motor)
+
+    def leer(self, consulta, params=None):
+        """Resultado de la consulta como DataFrame de pandas (columnar directo en DuckDB)"""
+        if self.motor == 'duckdb':
+            return self.cursor().execute(consulta, params).df()
+        return pd.read_sql(consulta.replace('%s', '?'), self._conexion,
+                           params=None if params is None else [_valor_parametro(p) for p in params])
+
+    def leer_polars(self, consulta, params=None):
+        """Resultado de la consulta como DataFrame de Polars"""
+        import polars as pl
+        if self.motor == 'duckdb':
+            # DECIMAL como Float64, igual que `pd.read_sql` con los Decimal de MySQL
+            return self.cursor().execute(consulta, params).pl().with_columns(
+                pl.col(pl.Decimal).cast(pl.Float64))
+        return pl.from_pandas(self.leer(consulta, params))
+
+    def lotes_arrow(self, consulta, params=None, filas_por_lote=50_000):
+        """Record batches de Arrow de hasta `filas_por_lote` filas (solo DuckDB)"""
+        lector = self.cursor().execute(consulta, params).fetch_record_batch(filas_por_lote)
+        vacio = True
+        for lote in lector:
+            vacio = False
+            yield lote
+        if vacio:
+            yield lector.schema.empty_table()
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        self._conexion.commit()
+
+    def rollback(self):
+        if self.motor == 'duckdb':
+            import duckdb
+            try:
+                self._conexion.rollback()
+            except duckdb.TransactionException:
+                pass  # DuckDB falla si no hay transacción abierta: no había nada que deshacer
+            return
+        self._conexion.rollback()
+
+    def close(self):
+        self._conexion.close()
+
+
+def leer_sql(consulta, conexion, params=None):
+    """`pd.read_sql` que aprovecha la lectura propia de la conexión (embebida o del pool de acceso_datos.py)"""
+    if hasattr(conexion, 'leer'):
+        return conexion.leer(consulta, params)
+    return pd.read_sql(consulta, conexion, params=params)
+
+
+# --- Carga de las fuentes -------------------------------------------------
+
+def _autoincremental(sentencia, motor, sentencias):
+    """Columna `x INT AUTO_INCREMENT PRIMARY KEY`: rowid en SQLite, secuencia en DuckDB"""
+    tabla = re.match(r'CREATE\s+TABLE\s+[`"]?(\w+)', sentencia, flags=re.I).group(1)
+
+    def sustituir(coincidencia):
+        columna = coincidencia.group(1)
+        if motor == 'sqlite':
+            return f'{columna} INTEGER PRIMARY KEY'
+        secuencia = f'seq_{tabla}_{columna}'.lower()
+        sentencias.append(f'CREATE SEQUENCE {secuencia}')
+        return f"{columna} INTEGER PRIMARY KEY DEFAULT nextval('{secuencia}')"
+
+    return re.sub(r'([`"]?\w+[`"]?)\s+INT(?:EGER)?\s+AUTO_INCREMENT\s+PRIMARY\s+KEY', sustituir,
+                  sentencia, flags=re.I)
+
+
+def traducir_volcado_mysql(sql, motor='duckdb'):
+    """Sentencias CREATE TABLE / INSERT de un volcado de MySQL en SQL que entienden DuckDB y SQLite.
+
+    Se descartan las opciones propias de MySQL (ENGINE, SET, /*! */, CREATE
+    DATABASE/USE) y los ALTER TABLE de claves y restricciones: los índices se
+    crean después de la carga, y las claves foráneas no se comprueban.
+    """
+    sql = re.sub(r'/\*!.*?\*/;?', '', sql, flags=re.S)
+    sentencias = []
+    for sentencia in re.split(r';\s*\n', sql):
+        lineas = [l for l in sentencia.splitlines() if not l.strip().startswith('--')]
+        sentencia = '\n'.join(lineas).strip()
+        if not re.match(r'(CREATE\s+TABLE|INSERT\s+INTO)\b', sentencia, flags=re.I):
+            continue
+        if re.match(r'CREATE\s+TABLE', sentencia, flags=re.I):
+            sentencia = re.sub(r'\)\s*(ENGINE|DEFAULT CHARSET)[^)]*$', ')', sentencia, flags=re.I)
+            # Índices y claves foráneas declarados dentro del CREATE TABLE (BD/Crear_Aurelion.sql)
+            sentencia = re.sub(r',\s*(INDEX|KEY)\s+\w+\s*\([^)]*\)', '', sentencia, flags=re.I)
+            sentencia = re.sub(r',\s*FOREIGN\s+KEY\s*\([^)]*\)\s*REFERENCES\s+\w+\s*\([^)]*\)', '',
+                               sentencia, flags=re.I)
+            sentencia = re.sub(r'\bint\(\d+\)', 'INTEGER', sentencia, flags=re.I)
+            sentencia = _autoincremental(sentencia, motor, sentencias)
+            sentencia = re.sub(r'\s+AUTO_INCREMENT\b', '', sentencia, flags=re.I)
+        sentencias.append(sentencia.replace('`', '"'))
+    return sentencias
+
+
+def _tablas_desde_snapshot(df):
+    """Reconstruye las cuatro tablas a partir del detalle desnormalizado del dashboard.
+
+    Email y fecha de alta de los clientes no están en el snapshot y quedan vacíos.
+    """
+    df = df.copy()
+    for columna in df.select_dtypes('category').columns:
+        df[columna] = df[columna].astype(str)
+    df['email'] = None
+    df['fecha_alta'] = pd.NaT
+
+    ventas = df.drop_duplicates('id_venta')
+    return {
+        'clientes': df.drop_duplicates('id_cliente')[
+            ['id_cliente', 'nombre_cliente', 'email', 'ciudad', 'fecha_alta']],
+        'productos': df.drop_duplicates('id_producto')[
+            ['id_producto', 'nombre_producto', 'categoria', 'precio_unitario']],
+        'ventas': ventas[['id_venta', 'fecha', 'id_cliente', 'nombre_cliente', 'email', 'medio_pago']],
+        'detalles_ventas': df.assign(id_detalle=range(1, len(df) + 1))[
+            ['id_detalle', 'id_venta', 'id_producto', 'nombre_producto', 'cantidad', 'precio_unitario', 'importe']],
+    }
+
+
+def _frames_fuente(fuente):
+    """Tablas de una fuente que no es un volcado SQL, como DataFrames de pandas"""
+    if os.path.isdir(fuente):
+        return {tabla: pd.read_parquet(os.path.join(fuente, f'{tabla}.parquet')) for tabla in TABLAS}
+    if fuente.endswith('.arrow'):
+        from almacen_columnar import leer_arrow
+        return _tablas_desde_snapshot(leer_arrow(fuente, mapear=False))
+    if fuente.endswith('.db'):
+        conexion = sqlite3.connect(fuente)
+        try:
+            return {tabla: pd.read_sql(f'SELECT * FROM {nombre}', conexion) for tabla, nombre in TABLAS.items()}
+        finally:
+            conexion.close()
+    raise ValueError(f"Fuente no soportada: '{fuente}' (volcado .sql, directorio Parquet, .db o .arrow)")
+
+
+def _cargar_tablas(conexion, motor, fuente):
+    if fuente.endswith('.sql'):
+        with open(fuente, encoding='utf-8') as f:
+            for sentencia in traducir_volcado_mysql(f.read(), motor):
+                conexion.execute(sentencia)
+        return
+
+    if motor == 'duckdb' and os.path.isdir(fuente):
+        # DuckDB lee el Parquet directamente, sin pasar por pandas
+        for tabla, nombre in TABLAS.items():
+            ruta = os.path.join(fuente, f'{tabla}.parquet').replace("'", "''")
+            conexion.execute(f"CREATE TABLE {nombre} AS SELECT * FROM read_parquet('{ruta}')")
+        return
+
+    for tabla, df in _frames_fuente(fuente).items():
+        if motor == 'duckdb':
+            conexion.register('_tabla_origen', df)
+            conexion.execute(f'CREATE TABLE {TABLAS[tabla]} AS SELECT * FROM _tabla_origen')
+            conexion.unregister('_tabla_origen')
+        else:
+            for columna in df.columns:
+                if pd.api.types.is_datetime64_any_dtype(df[columna]):
+                    df[columna] = df[columna].dt.strftime('%Y-%m-%d %H:%M:%S')
+            df.to_sql(TABLAS[tabla], conexion, index=False, chunksize=100_000)
+
+
+def _abrir(motor, ruta):
+    if motor == 'duckdb':
+        import duckdb
+        return duckdb.connect(ruta)
+    return sqlite3.connect(ruta, check_same_thread=False)
+
+
+def _firma_fuente(fuente):
+    """Ruta y fecha de modificación de la fuente (la más reciente si es un directorio)"""
+    if os.path.isdir(fuente):
+        modificado = max(os.path.getmtime(os.path.join(fuente, f)) for f in os.listdir(fuente))
+    else:
+        modificado = os.path.getmtime(fuente)
+    return {'fuente': os.path.abspath(fuente), 'modificado': modificado}
+
+
+def _firma_guardada(motor, ruta):
+    if not os.path.exists(ruta):
+        return None
+    # Si no se puede abrir (p. ej. DuckDB bloqueado por otro proceso) se propaga: reconstruirla sería peor
+    conexion = _abrir(motor, ruta)
+    try:
+        return json.loads(conexion.execute(f'SELECT firma FROM {TABLA_ORIGEN}').fetchone()[0])
+    except Exception:
+        return None
+    finally:
+        conexion.close()
+
+
+def ruta_bd_embebida(motor, directorio=DIRECTORIO_BD_EMBEBIDA):
+    return os.path.join(directorio, f'aurelion.{motor}')
+
+
+def preparar_bd_embebida(motor=None, fuente=None, ruta=None, forzar=False):
+    """Construye la base embebida desde `fuente` si falta o la fuente cambió; devuelve su ruta"""
+    motor = motor or motor_bd()
+    fuente = fuente or fuente_bd()
+    if motor == 'sqlite' and fuente.endswith('.db'):
+        # Ya es una base SQLite con las cuatro tablas: se usa tal cual
+        return fuente
+
+    ruta = ruta or ruta_bd_embebida(motor)
+    firma = _firma_fuente(fuente)
+    if not forzar and _firma_guardada(motor, ruta) == firma:
+        return ruta
+
+    inicio = time.perf_counter()
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    # Se construye aparte y se sustituye de golpe: nadie abre una base a medio cargar
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    if os.path.exists(temporal):
+        os.remove(temporal)
+    conexion = _abrir(motor, temporal)
+    try:
+        _cargar_tablas(conexion, motor, fuente)
+        if motor == 'sqlite':
+            conexion.executescript(INDICES_SQLITE)
+        conexion.execute(f'CREATE TABLE {TABLA_ORIGEN} (firma VARCHAR)')
+        conexion.execute(f'INSERT INTO {TABLA_ORIGEN} VALUES (?)', [json.dumps(firma)])
+        conexion.commit()
+    finally:
+        conexion.close()
+    os.replace(temporal, ruta)
+
+    print(f"🗄️  Base {motor} '{ruta}' creada desde '{fuente}' en {time.perf_counter() - inicio:.2f} s")
+    return ruta
+
+
+def conectar_embebida(motor=None, fuente=None, ruta=None):
+    """Conexión al motor embebido, preparando la base la primera vez"""
+    motor = motor or motor_bd()
+    ruta = preparar_bd_embebida(motor, fuente, ruta)
+    return ConexionEmbebida(motor, _abrir(motor, ruta))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prepara la base embebida de Aurelion (DuckDB o SQLite)')
+    parser.add_argument('--motor', choices=['duckdb', 'sqlite'],
+                        default='duckdb' if duckdb_disponible() else 'sqlite')
+    parser.add_argument('--fuente', default=FUENTE_POR_DEFECTO,
+                        help='Volcado .sql, directorio Parquet, base .db o snapshot .arrow')
+    parser.add_argument('--ruta', default=None, help='Fichero de la base (por defecto snapshots/aurelion.<motor>)')
+    parser.add_argument('--forzar', action='store_true', help='Reconstruye aunque la fuente no haya cambiado')
+    args = parser.parse_args()
+
+    conexion = conectar_embebida(args.motor, args.fuente, args.ruta)
+    for nombre in TABLAS.values():
+        total = conexion.cursor().execute(f'SELECT COUNT(*) FROM {nombre}').fetchone()[0]
+        print(f"   {nombre:<16} {total:>12,} filas")
+    conexion.close()
+
+
+if __name__ == '__main__':
+    main()
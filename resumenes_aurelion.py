@@ -0,0 +1,364 @@
+"""
+Tablas resumen de Aurelion mantenidas de forma incremental.
+
+En lugar de las vistas de BD/Aurelion_Normalizada.sql, que repiten los joins en
+cada lectura, se guardan tres tablas agregadas:
+
+    Resumen_Ventas_Diarias  importe, unidades y líneas por día × ciudad × categoría × medio de pago
+    Resumen_Productos       totales por producto (importe, unidades, líneas, primera y última venta)
+    Resumen_Clientes        totales por cliente (ventas, importe, líneas, primera y última compra)
+
+Se actualizan con el mismo criterio de marca de agua que el dashboard: solo se
+agregan las líneas con `id_detalle` (y las ventas con `id_venta`) posteriores a
+las ya resumidas, y se suman a las filas existentes con un upsert. Las
+modificaciones o borrados de ventas antiguas no se ven: `verificar` las detecta
+comparando con el detalle y `reconstruir` recalcula todo. Las lecturas quedan en
+función del número de días y dimensiones, no del de líneas.
+
+Con AURELION_RESUMENES=1 el modo pushdown del dashboard (consultas_agregadas.py)
+los actualiza en cada refresco y lee de ellos los repartos que admiten; desde
+los notebooks, `leer_resumen('Resumen_Clientes')`.
+
+Uso:
+    python resumenes_aurelion.py actualizar
+    python resumenes_aurelion.py reconstruir
+    python resumenes_aurelion.py verificar
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from datos_dashboard import JOIN_VENTAS, conectar_bd
+from motor_embebido import leer_sql, motor_bd
+
+VARIABLE_RESUMENES = 'AURELION_RESUMENES'
+TABLA_CONTROL = 'Resumen_Control'
+# Valor de las dimensiones nulas en las claves (las claves primarias no admiten NULL)
+SIN_VALOR = ''
+TOLERANCIA_VERIFICACION = 1e-6
+MARCAS = ('id_detalle', 'id_venta')
+
+# Día de la venta según el motor (en SQLite, texto 'YYYY-MM-DD')
+DIA_SQL = {'mysql': 'DATE(v.fecha)', 'duckdb': 'CAST(v.fecha AS DATE)', 'sqlite': 'DATE(v.fecha)'}
+MINIMO_SQL = {'mysql': 'LEAST', 'duckdb': 'LEAST', 'sqlite': 'MIN'}
+MAXIMO_SQL = {'mysql': 'GREATEST', 'duckdb': 'GREATEST', 'sqlite': 'MAX'}
+# Apertura de la transacción del tramo: en SQLite toma ya el bloqueo de escritura de la base
+INICIO_TRANSACCION = {'mysql': 'START TRANSACTION', 'duckdb': 'BEGIN TRANSACTION', 'sqlite': 'BEGIN IMMEDIATE'}
+# Lectura de la marca de agua dentro de esa transacción (en MySQL bloquea sus filas hasta el commit)
+LECTURA_MARCAS = {'mysql': ' FOR UPDATE', 'duckdb': '', 'sqlite': ''}
+INSERTAR_SI_FALTA = {'mysql': 'INSERT IGNORE INTO {tabla} {valores}',
+                     'duckdb': 'INSERT INTO {tabla} {valores} ON CONFLICT DO NOTHING',
+                     'sqlite': 'INSERT INTO {tabla} {valores} ON CONFLICT DO NOTHING'}
+
+# Las conexiones DuckDB de un proceso comparten la base: sus actualizaciones se hacen de una en una
+_lock_actualizacion = threading.Lock()
+
+# Tabla: (columnas clave, columnas sumables, columnas de fecha mínima, columnas de fecha máxima, otras)
+RESUMENES = {
+    'Resumen_Ventas_Diarias': {
+        'claves': ['fecha', 'ciudad', 'categoria', 'medio_pago'],
+        'sumas': ['importe', 'unidades', 'lineas'],
+        'minimos': [],
+        'maximos': [],
+        'ddl': """
+            fecha DATE NOT NULL,
+            ciudad VARCHAR(50) NOT NULL,
+            categoria VARCHAR(50) NOT NULL,
+            medio_pago VARCHAR(50) NOT NULL,
+            importe DECIMAL(14,2) NOT NULL,
+            unidades DECIMAL(14,1) NOT NULL,
+            lineas BIGINT NOT NULL,
+            PRIMARY KEY (fecha, ciudad, categoria, medio_pago)""",
+    },
+    'Resumen_Productos': {
+        'claves': ['id_producto'],
+        'sumas': ['importe', 'unidades', 'lineas'],
+        'minimos': ['primera_fecha'],
+        'maximos': ['ultima_fecha'],
+        'ddl': """
+            id_producto DECIMAL(10,1) NOT NULL,
+            nombre_producto VARCHAR(100),
+            categoria VARCHAR(50),
+            importe DECIMAL(14,2) NOT NULL,
+            unidades DECIMAL(14,1) NOT NULL,
+            lineas BIGINT NOT NULL,
+            primera_fecha DATETIME,
+            ultima_fecha DATETIME,
+            PRIMARY KEY (id_producto)""",
+    },
+    'Resumen_Clientes': {
+        'claves': ['id_cliente'],
+        'sumas': ['ventas', 'importe', 'lineas'],
+        'minimos': ['primera_fecha'],
+        'maximos': ['ultima_fecha'],
+        'ddl': """
+            id_cliente DECIMAL(10,1) NOT NULL,
+            nombre_cliente VARCHAR(100),
+            ciudad VARCHAR(50),
+            ventas BIGINT NOT NULL,
+            importe DECIMAL(14,2) NOT NULL,
+            lineas BIGINT NOT NULL,
+            primera_fecha DATETIME,
+            ultima_fecha DATETIME,
+            PRIMARY KEY (id_cliente)""",
+    },
+}
+
+
+def usar_resumenes():
+    """True si el dashboard debe mantener y leer las tablas resumen (desactivado por defecto)"""
+    return os.environ.get(VARIABLE_RESUMENES, '').lower() in ('1', 'true', 'si', 'sí')
+
+
+def _consultas_delta(motor):
+    """SELECT agregados de cada resumen sobre un rango de marcas de agua ((desde, hasta] de id_detalle/id_venta)"""
+    dia = DIA_SQL[motor]
+    filtro_detalle = 'dv.id_detalle > %s AND dv.id_detalle <= %s'
+    return {
+        'Resumen_Ventas_Diarias': f"""
+            SELECT {dia} AS fecha,
+                   COALESCE(c.ciudad, '{SIN_VALOR}') AS ciudad,
+                   COALESCE(p.categoria, '{SIN_VALOR}') AS categoria,
+                   COALESCE(v.medio_pago, '{SIN_VALOR}') AS medio_pago,
+                   SUM(dv.importe) AS importe, SUM(dv.cantidad) AS unidades, COUNT(*) AS lineas
+            {JOIN_VENTAS}
+            WHERE {filtro_detalle}
+            GROUP BY {dia}, COALESCE(c.ciudad, '{SIN_VALOR}'), COALESCE(p.categoria, '{SIN_VALOR}'),
+                     COALESCE(v.medio_pago, '{SIN_VALOR}')""",
+        'Resumen_Productos': f"""
+            SELECT dv.id_producto, MAX(dv.nombre_producto) AS nombre_producto, MAX(p.categoria) AS categoria,
+                   SUM(dv.importe) AS importe, SUM(dv.cantidad) AS unidades, COUNT(*) AS lineas,
+                   MIN(v.fecha) AS primera_fecha, MAX(v.fecha) AS ultima_fecha
+            {JOIN_VENTAS}
+            WHERE {filtro_detalle}
+            GROUP BY dv.id_producto""",
+        # Importe y líneas salen del detalle; ventas y fechas de las ventas nuevas (ver _actualizar)
+        'Resumen_Clientes': f"""
+            SELECT v.id_cliente, MAX(c.nombre_cliente) AS nombre_cliente, MAX(c.ciudad) AS ciudad,
+                   0 AS ventas, SUM(dv.importe) AS importe, COUNT(*) AS lineas,
+                   NULL AS primera_fecha, NULL AS ultima_fecha
+            {JOIN_VENTAS}
+            WHERE {filtro_detalle}
+            GROUP BY v.id_cliente""",
+        'Resumen_Clientes.ventas': """
+            SELECT v.id_cliente, MAX(c.nombre_cliente) AS nombre_cliente, MAX(c.ciudad) AS ciudad,
+                   COUNT(*) AS ventas, 0 AS importe, 0 AS lineas,
+                   MIN(v.fecha) AS primera_fecha, MAX(v.fecha) AS ultima_fecha
+            FROM Ventas v
+            JOIN Clientes c ON v.id_cliente = c.id_cliente
+            WHERE v.id_venta > %s AND v.id_venta <= %s
+            GROUP BY v.id_cliente""",
+    }
+
+
+def _columnas(tabla):
+    lineas = [linea.strip() for linea in RESUMENES[tabla]['ddl'].strip().splitlines()]
+    return [linea.split()[0] for linea in lineas if not linea.startswith('PRIMARY')]
+
+
+def _upsert(motor, tabla, consulta):
+    """INSERT ... SELECT que suma a la fila existente si la clave ya está"""
+    definicion = RESUMENES[tabla]
+    columnas = _columnas(tabla)
+    if motor == 'mysql':
+        nuevo, minimo, maximo = 'VALUES({})', 'LEAST', 'GREATEST'
+    else:
+        nuevo, minimo, maximo = 'excluded.{}', MINIMO_SQL[motor], MAXIMO_SQL[motor]
+
+    asignaciones = []
+    for columna in columnas:
+        actual, entrante = f'{tabla}.{columna}', nuevo.format(columna)
+        if columna in definicion['claves']:
+            continue
+        if columna in definicion['sumas']:
+            asignaciones.append(f'{columna} = {actual} + {entrante}')
+        elif columna in definicion['minimos']:
+            asignaciones.append(f'{columna} = COALESCE({minimo}({actual}, {entrante}), {actual}, {entrante})')
+        elif columna in definicion['maximos']:
+            asignaciones.append(f'{columna} = COALESCE({maximo}({actual}, {entrante}), {actual}, {entrante})')
+        else:
+            asignaciones.append(f'{columna} = COALESCE({entrante}, {actual})')
+
+    insercion = f"INSERT INTO {tabla} ({', '.join(columnas)}) SELECT * FROM ({consulta}) delta"
+    if motor == 'mysql':
+        return f"{insercion} ON DUPLICATE KEY UPDATE {', '.join(asignaciones)}"
+    # `WHERE true`: en SQLite un INSERT ... SELECT con ON CONFLICT necesita un WHERE
+    return (f"{insercion} WHERE true "
+            f"ON CONFLICT ({', '.join(definicion['claves'])}) DO UPDATE SET {', '.join(asignaciones)}")
+
+
+def crear_tablas(conn):
+    """Crea las tablas resumen y la de control (con las marcas de agua a -1) si no existen"""
+    cursor = conn.cursor()
+    for tabla, definicion in RESUMENES.items():
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {tabla} ({definicion['ddl']})")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {TABLA_CONTROL} ("
+                   "clave VARCHAR(20) NOT NULL PRIMARY KEY, valor DECIMAL(14,1) NOT NULL)")
+    # Las filas de control existen siempre, para que haya algo que bloquear al leerlas
+    insertar = INSERTAR_SI_FALTA[motor_bd()]
+    for clave in MARCAS:
+        cursor.execute(insertar.format(tabla=TABLA_CONTROL, valores="(clave, valor) VALUES (%s, -1)"), (clave,))
+    conn.commit()
+
+
+def _marcas(conn, motor):
+    control = leer_sql(f"SELECT clave, valor FROM {TABLA_CONTROL}{LECTURA_MARCAS[motor]}", conn)
+    return {fila.clave: float(fila.valor) for fila in control.itertuples()}
+
+
+def _maximos(conn):
+    fila = leer_sql("SELECT (SELECT MAX(id_detalle) FROM Detalles_Ventas) AS id_detalle, "
+                    "(SELECT MAX(id_venta) FROM Ventas) AS id_venta", conn).iloc[0]
+    return {clave: -1.0 if pd.isna(fila[clave]) else float(fila[clave]) for clave in MARCAS}
+
+
+def _actualizar(conn, motor):
+    """Aplica a los resúmenes las líneas y ventas posteriores a la marca de agua; devuelve cuántas"""
+    with _lock_actualizacion:
+        cursor = conn.cursor()
+        # Todo el tramo en una transacción: o se aplica entero junto con la marca de agua, o nada.
+        # La marca se lee ya dentro y bloqueada, así que otro proceso que actualice a la vez
+        # espera y después ve la nueva en lugar de aplicar el mismo tramo otra vez
+        cursor.execute(INICIO_TRANSACCION[motor])
+        marcas = _marcas(conn, motor)
+        desde = {clave: marcas.get(clave, -1.0) for clave in MARCAS}
+        # Se fija el final del tramo antes de agregar: lo que llegue mientras tanto queda para la próxima vez
+        hasta = _maximos(conn)
+        if hasta == desde:
+            conn.rollback()
+            return {'lineas': 0, 'ventas': 0}
+
+        contar = leer_sql("SELECT (SELECT COUNT(*) FROM Detalles_Ventas WHERE id_detalle > %s AND id_detalle <= %s) "
+                          "AS lineas, (SELECT COUNT(*) FROM Ventas WHERE id_venta > %s AND id_venta <= %s) AS ventas",
+                          conn, params=(desde['id_detalle'], hasta['id_detalle'], desde['id_venta'], hasta['id_venta']))
+        consultas = _consultas_delta(motor)
+        for nombre, consulta in consultas.items():
+            tabla = nombre.split('.')[0]
+            marca = 'id_venta' if nombre.endswith('.ventas') else 'id_detalle'
+            cursor.execute(_upsert(motor, tabla, consulta), (desde[marca], hasta[marca]))
+
+        for clave, valor in hasta.items():
+            cursor.execute(f"UPDATE {TABLA_CONTROL} SET valor = %s WHERE clave = %s", (valor, clave))
+        conn.commit()
+        return {clave: int(contar[clave].iloc[0]) for clave in ('lineas', 'ventas')}
+
+
+def actualizar_resumenes(conn=None):
+    """Incorpora a los resúmenes las ventas nuevas (crea las tablas la primera vez)"""
+    propia = conn is None
+    conn = conn or conectar_bd()
+    try:
+        crear_tablas(conn)
+        return _actualizar(conn, motor_bd())
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if propia:
+            conn.close()
+
+
+def reconstruir_resumenes(conn=None):
+    """Vacía los resúmenes y los recalcula desde todo el detalle"""
+    propia = conn is None
+    conn = conn or conectar_bd()
+    try:
+        crear_tablas(conn)
+        cursor = conn.cursor()
+        for tabla in RESUMENES:
+            cursor.execute(f"DELETE FROM {tabla}")
+        cursor.execute(f"UPDATE {TABLA_CONTROL} SET valor = -1")
+        conn.commit()
+        return _actualizar(conn, motor_bd())
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        if propia:
+            conn.close()
+
+
+def leer_resumen(tabla, conn=None):
+    """Contenido de una tabla resumen como DataFrame"""
+    if tabla not in RESUMENES:
+        raise ValueError(f"Tabla resumen desconocida: '{tabla}' (opciones: {list(RESUMENES)})")
+    propia = conn is None
+    conn = conn or conectar_bd()
+    try:
+        return leer_sql(f"SELECT * FROM {tabla}", conn)
+    finally:
+        if propia:
+            conn.close()
+
+
+def _comparar(guardado, esperado, claves, columnas):
+    """Filas que faltan, sobran o difieren entre el resumen guardado y el recalculado"""
+    for df in (guardado, esperado):
+        for clave in claves:
+            df[clave] = df[clave].astype(str).str[:10] if clave == 'fecha' else df[clave].astype(str)
+    unido = guardado.merge(esperado, on=claves, how='outer', suffixes=('_guardado', '_esperado'), indicator=True)
+    distintas = unido['_merge'] != 'both'
+    for columna in columnas:
+        a = pd.to_numeric(unido[f'{columna}_guardado']).to_numpy(dtype='float64')
+        b = pd.to_numeric(unido[f'{columna}_esperado']).to_numpy(dtype='float64')
+        distintas |= ~np.isclose(a, b, rtol=TOLERANCIA_VERIFICACION, atol=0.01, equal_nan=True)
+    return int(distintas.sum())
+
+
+def verificar_resumenes(conn=None):
+    """Compara cada resumen con el mismo agregado recalculado desde el detalle: {tabla: {filas, diferencias}}"""
+    propia = conn is None
+    conn = conn or conectar_bd()
+    motor = motor_bd()
+    try:
+        consultas = _consultas_delta(motor)
+        maximos = _maximos(conn)
+        informe = {}
+        for tabla, definicion in RESUMENES.items():
+            guardado = leer_sql(f"SELECT * FROM {tabla}", conn)
+            if tabla == 'Resumen_Clientes':
+                detalle = leer_sql(consultas[tabla], conn, params=(-1.0, maximos['id_detalle']))
+                ventas = leer_sql(consultas['Resumen_Clientes.ventas'], conn, params=(-1.0, maximos['id_venta']))
+                esperado = ventas[['id_cliente', 'ventas']].merge(
+                    detalle[['id_cliente', 'importe', 'lineas']], on='id_cliente', how='outer').fillna(0)
+            else:
+                esperado = leer_sql(consultas[tabla], conn, params=(-1.0, maximos['id_detalle']))
+            informe[tabla] = {
+                'filas': len(guardado),
+                'diferencias': _comparar(guardado, esperado, definicion['claves'], definicion['sumas']),
+            }
+        return informe
+    finally:
+        if propia:
+            conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tablas resumen de Aurelion')
+    parser.add_argument('accion', choices=['actualizar', 'reconstruir', 'verificar'])
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.accion == 'verificar':
+        informe = verificar_resumenes()
+        for tabla, resultado in informe.items():
+            estado = '✅' if resultado['diferencias'] == 0 else '❌'
+            print(f"{estado} {tabla:<24} {resultado['filas']:>10,} filas, {resultado['diferencias']:,} diferencias")
+        if any(r['diferencias'] for r in informe.values()):
+            print("   Ejecuta `python resumenes_aurelion.py reconstruir` para recalcularlos")
+            sys.exit(1)
+        return
+
+    accion = actualizar_resumenes if args.accion == 'actualizar' else reconstruir_resumenes
+    incorporado = accion()
+    print(f"📊 Resúmenes al día: {incorporado['lineas']:,} líneas y {incorporado['ventas']:,} ventas "
+          f"incorporadas en {time.perf_counter() - inicio:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,203 @@
+"""
+Métricas RFM (Recencia, Frecuencia, Monetario) por cliente, vectorizadas e incrementales.
+
+AurelionML.ipynb calculaba la Recencia con una lambda por cliente y rehacía la
+tabla entera desde todas las líneas en cada ejecución. Aquí todo son
+reducciones agrupadas de Polars, y lo que se guarda entre ejecuciones es un
+estado por cliente que no depende de la fecha de referencia:
+
+    ultima_compra   fecha de la última línea
+    ventas          ventas distintas (Frecuencia)
+    monetario       suma de importes (Monetario)
+
+Con la Recencia calculada al final a partir de `ultima_compra`, una ejecución
+incremental solo necesita las líneas nuevas del dataset Parquet
+(exportacion_parquet.py) desde la marca de agua guardada en el estado
+(`id_detalle`, como etl_incremental.py). Una venta se cuenta una sola vez
+aunque sus líneas lleguen en ejecuciones distintas: de las ventas de las
+líneas nuevas solo suman a la Frecuencia las que no tienen ya alguna línea
+anterior a la marca (se buscan en el dataset, filtrando por esas ventas). Las
+correcciones de ventas antiguas no se ven; `--completo` recalcula desde todo
+el dataset.
+
+Uso:
+    python rfm_aurelion.py              # incorpora las líneas nuevas y escribe segmentacion_clientes_rfm.csv
+    python rfm_aurelion.py --completo
+"""
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import polars as pl
+
+from exportacion_parquet import DATASET_VENTAS, DIRECTORIO_EXPORTACION, leer_manifiesto
+
+RUTA_ESTADO = os.path.join(DIRECTORIO_EXPORTACION, 'rfm_estado.parquet')
+RUTA_SEGMENTACION = 'segmentacion_clientes_rfm.csv'
+COLUMNAS_RFM = ['Recencia', 'Frecuencia', 'Monetario']
+COLUMNAS_LINEAS = ['id_detalle', 'id_venta', 'id_cliente', 'fecha', 'importe', 'nombre_cliente', 'email']
+
+
+def _polars(lineas):
+    return lineas if isinstance(lineas, (pl.DataFrame, pl.LazyFrame)) else pl.from_pandas(lineas)
+
+
+def _agregar(lineas, fecha='fecha', ventas_contadas=None):
+    """Estado RFM de unas líneas; las ventas de `ventas_contadas` (ya en el estado) no suman a la Frecuencia"""
+    ventas = pl.col('id_venta').drop_nulls()
+    if ventas_contadas is not None:
+        ventas = ventas.filter(~ventas.is_in(ventas_contadas))
+    return (_polars(lineas).lazy()
+            .filter(pl.col('id_cliente').is_not_null())
+            .group_by('id_cliente')
+            .agg(pl.col(fecha).max().alias('ultima_compra'),
+                 ventas.n_unique().alias('ventas'),
+                 pl.col('importe').sum().cast(pl.Float64).alias('monetario'),
+                 pl.col('nombre_cliente').first(),
+                 pl.col('email').first())
+            .collect())
+
+
+def _combinar(estado, nuevo):
+    # Solo cambian los clientes con líneas nuevas; el resto pasa tal cual por la agregación
+    return (pl.concat([estado, nuevo.cast(estado.schema)], how='vertical')
+            .group_by('id_cliente', maintain_order=True)
+            .agg(pl.col('ultima_compra').max(),
+                 pl.col('ventas').sum(),
+                 pl.col('monetario').sum(),
+                 pl.col('nombre_cliente').first(),
+                 pl.col('email').first()))
+
+
+def tabla_rfm(estado, fecha_referencia=None, contacto=True):
+    """Tabla RFM en pandas (como `df_rfm` del notebook) a partir del estado por cliente
+
+    La referencia por defecto es el día siguiente a la última venta, como en el notebook.
+    """
+    if fecha_referencia is None:
+        fecha_referencia = _referencia(estado['ultima_compra'].max())
+    columnas = [pl.col('id_cliente'),
+                (pl.lit(fecha_referencia) - pl.col('ultima_compra')).dt.total_days().alias('Recencia'),
+                pl.col('ventas').cast(pl.Int64).alias('Frecuencia'),
+                pl.col('monetario').alias('Monetario')]
+    if contacto:
+        columnas += [pl.col('nombre_cliente'), pl.col('email')]
+    return estado.sort('id_cliente').select(columnas).to_pandas()
+
+
+def _referencia(ultima):
+    # Día siguiente a la última venta, como en el notebook
+    return None if ultima is None else ultima + timedelta(days=1)
+
+
+def rfm_desde_ventas(lineas, fecha='fecha', fecha_referencia=None, contacto=True):
+    """Tabla RFM de un DataFrame de líneas de venta (pandas o Polars) en una sola pasada"""
+    return tabla_rfm(_agregar(lineas, fecha), fecha_referencia, contacto)
+
+
+def segmentar_por_medias(df_rfm):
+    """Segmento de cada cliente respecto a las medias de R, F y M (la regla del notebook, sin `apply`)"""
+    r, f, m = (df_rfm[c] for c in COLUMNAS_RFM)
+    vip = (f > f.mean()) & (m > m.mean()) & (r < r.mean())
+    return np.select([vip, r > r.mean()], ['Clientes VIP ⭐', 'Clientes en Riesgo ⚠️'], default='Otros Segmentos')
+
+
+def leer_estado(ruta=RUTA_ESTADO):
+    """Estado por cliente y marcas de agua ({'id_detalle', 'id_venta', 'fecha_maxima'}) o (None, None)"""
+    if not os.path.exists(ruta):
+        return None, None
+    metadatos = pl.read_parquet_metadata(ruta)
+    marcas = {clave: metadatos.get(f'rfm.{clave}') for clave in ('id_detalle', 'id_venta', 'fecha_maxima')}
+    marcas['id_detalle'] = float(marcas['id_detalle'])
+    marcas['id_venta'] = None if marcas['id_venta'] in (None, '') else float(marcas['id_venta'])
+    marcas['fecha_maxima'] = datetime.fromisoformat(marcas['fecha_maxima']) if marcas['fecha_maxima'] else None
+    return pl.read_parquet(ruta), marcas
+
+
+def _guardar_estado(estado, marcas, ruta):
+    metadatos = {f'rfm.{clave}': '' if valor is None else
+                 (valor.isoformat() if hasattr(valor, 'isoformat') else repr(valor))
+                 for clave, valor in marcas.items()}
+    os.makedirs(os.path.dirname(ruta) or '.', exist_ok=True)
+    # El estado y sus marcas van en el mismo fichero, que se sustituye de golpe
+    temporal = f'{ruta}.{os.getpid()}.tmp'
+    estado.write_parquet(temporal, metadata=metadatos)
+    os.replace(temporal, ruta)
+
+
+def _ventas_contadas(rutas, lineas, marca):
+    """Ventas de `lineas` que ya tenían alguna línea hasta `marca` (id_detalle), y por tanto están en el estado"""
+    ventas = lineas['id_venta'].drop_nulls().unique()
+    if not len(ventas):
+        return ventas
+    return (pl.scan_parquet(rutas, hive_partitioning=False)
+            .filter((pl.col('id_detalle') <= marca) & pl.col('id_venta').is_in(ventas))
+            .select(pl.col('id_venta').unique())
+            .collect()['id_venta'])
+
+
+def _maximo(*valores):
+    presentes = [v for v in valores if v is not None]
+    return max(presentes) if presentes else None
+
+
+def actualizar_rfm(directorio=DATASET_VENTAS, ruta=RUTA_ESTADO, completo=False):
+    """Pone al día el estado RFM con las líneas del dataset Parquet posteriores a la marca
+
+    Devuelve (estado, marcas, líneas incorporadas).
+    """
+    manifiesto = leer_manifiesto(directorio)
+    rutas = [os.path.join(directorio, p['ruta']) for p in manifiesto['particiones']]
+    estado, marcas = (None, None) if completo else leer_estado(ruta)
+
+    plan = pl.scan_parquet(rutas, hive_partitioning=False).select(COLUMNAS_LINEAS) if rutas else None
+    if plan is not None and marcas is not None:
+        # Las estadísticas de cada fichero bastan para saltarse los que ya se incorporaron
+        plan = plan.filter(pl.col('id_detalle') > marcas['id_detalle'])
+    lineas = plan.collect() if plan is not None else pl.DataFrame(schema={c: pl.Null for c in COLUMNAS_LINEAS})
+
+    if len(lineas) or estado is None:
+        contadas = None if marcas is None else _ventas_contadas(rutas, lineas, marcas['id_detalle'])
+        nuevo = _agregar(lineas, ventas_contadas=contadas)
+        estado = nuevo if estado is None else _combinar(estado, nuevo)
+        marcas = {
+            'id_detalle': _maximo(None if marcas is None else marcas['id_detalle'], lineas['id_detalle'].max()),
+            'id_venta': _maximo(None if marcas is None else marcas['id_venta'], lineas['id_venta'].max()),
+            'fecha_maxima': _maximo(None if marcas is None else marcas['fecha_maxima'], lineas['fecha'].max()),
+        }
+        if marcas['id_detalle'] is None:
+            marcas['id_detalle'] = -1.0
+        _guardar_estado(estado, marcas, ruta)
+    return estado, marcas, len(lineas)
+
+
+def exportar_segmentacion(df_rfm, ruta=RUTA_SEGMENTACION):
+    """Escribe el CSV de segmentación (id_cliente, R, F, M y Nombre_Segmento)"""
+    salida = df_rfm[['id_cliente'] + COLUMNAS_RFM].copy()
+    salida['Nombre_Segmento'] = segmentar_por_medias(salida) if 'Nombre_Segmento' not in df_rfm \
+        else df_rfm['Nombre_Segmento']
+    salida.to_csv(ruta, index=False)
+    return salida
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Métricas RFM incrementales de los clientes de Aurelion')
+    parser.add_argument('--completo', action='store_true', help='recalcula el estado desde todo el dataset')
+    parser.add_argument('--directorio', default=DATASET_VENTAS)
+    parser.add_argument('--salida', default=RUTA_SEGMENTACION)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    estado, _, incorporadas = actualizar_rfm(args.directorio, completo=args.completo)
+    df_rfm = tabla_rfm(estado, contacto=False)
+    salida = exportar_segmentacion(df_rfm, args.salida)
+    print(f"📊 RFM de {len(salida):,} clientes ({incorporadas:,} líneas incorporadas) en "
+          f"'{args.salida}' ({time.perf_counter() - inicio:.2f} s)")
+    for segmento, clientes in salida['Nombre_Segmento'].value_counts().items():
+        print(f"   {segmento:<22} {clientes:>10,}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Segmentación de clientes con K-Means: barrido de K en paralelo y modelo final sin reajustar.
+
+AurelionML.ipynb ajustaba KMeans para k=1..10 uno tras otro (método del codo) y
+después volvía a ajustar desde cero el K elegido. `barrido_k` ajusta cada k en
+su propio proceso (joblib), calcula inercia y silueta sobre una muestra fija de
+clientes (la silueta es cuadrática en el número de puntos) y devuelve los
+modelos ajustados, así que el final es `modelos[K_OPT]`. Con `minibatch=True`
+ajusta MiniBatchKMeans, que trabaja por lotes en lugar de recorrer todos los
+puntos en cada iteración: ocupa menos memoria con bases de clientes muy
+grandes, aunque con las tres columnas RFM KMeans suele terminar antes.
+
+Uso (segmentación semanal a partir del estado RFM de rfm_aurelion.py):
+    python segmentacion_kmeans.py --k 4
+    python segmentacion_kmeans.py --k 4 --kmax 12 --minibatch
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
+from sklearn.preprocessing import StandardScaler
+
+from exportacion_parquet import DATASET_VENTAS
+from rfm_aurelion import COLUMNAS_RFM, RUTA_SEGMENTACION, actualizar_rfm, exportar_segmentacion, tabla_rfm
+
+# Puntos con los que se calculan inercia y silueta (la silueta crece con su cuadrado)
+MUESTRA_METRICAS = 5_000
+TAMANO_LOTE_MINIBATCH = 65_536
+
+
+def _ajustar(X, k, minibatch, muestra, random_state):
+    inicio = time.perf_counter()
+    if minibatch:
+        modelo = MiniBatchKMeans(n_clusters=k, random_state=random_state, n_init='auto',
+                                 batch_size=TAMANO_LOTE_MINIBATCH)
+    else:
+        modelo = KMeans(n_clusters=k, random_state=random_state, n_init='auto')
+    modelo.fit(X)
+    ajuste = time.perf_counter() - inicio
+
+    X_muestra = X[muestra]
+    etiquetas = modelo.predict(X_muestra)
+    # score() es la inercia cambiada de signo
+    inercia = -modelo.score(X_muestra)
+    silueta = silhouette_score(X_muestra, etiquetas) if 1 < len(np.unique(etiquetas)) < len(X_muestra) else np.nan
+    return modelo, {'k': k, 'Inercia': inercia, 'Silueta': silueta, 'Segundos_Ajuste': ajuste,
+                    'Segundos': time.perf_counter() - inicio}
+
+
+def barrido_k(X, valores_k=range(1, 11), minibatch=False, muestra=MUESTRA_METRICAS, n_jobs=-1, random_state=42):
+    """Ajusta K-Means para cada k en paralelo; devuelve (tabla con k, Inercia, Silueta y tiempos, modelos)
+
+    Inercia y silueta se calculan sobre los mismos `muestra` puntos para todos los k
+    (todos si `muestra` es None o no hay tantos).
+    """
+    X = np.asarray(X, dtype=np.float64)
+    if muestra is None or muestra >= len(X):
+        indices = np.arange(len(X))
+    else:
+        indices = np.sort(np.random.default_rng(random_state).choice(len(X), size=muestra, replace=False))
+
+    # Los k grandes tardan más: van primero para que los pequeños rellenen los procesos libres
+    valores_k = sorted(valores_k, reverse=True)
+    resultados = Parallel(n_jobs=n_jobs)(
+        delayed(_ajustar)(X, k, minibatch, indices, random_state) for k in valores_k)
+
+    modelos = {fila['k']: modelo for modelo, fila in resultados}
+    tabla = pd.DataFrame([fila for _, fila in resultados]).sort_values('k').reset_index(drop=True)
+    return tabla, modelos
+
+
+def nombrar_clusters(centroides):
+    """Nombre de cada clúster según sus centroides RFM (sin escalar): VIP el de mejor rango
+    conjunto de R, F y M, en Riesgo el de mayor Recencia y el resto por su número"""
+    puntaje = (centroides['Recencia'].rank(ascending=True) + centroides['Frecuencia'].rank(ascending=False)
+               + centroides['Monetario'].rank(ascending=False))
+    vip, en_riesgo = puntaje.idxmin(), centroides['Recencia'].idxmax()
+    nombres = {cluster: f'Cluster K-Means {cluster}' for cluster in centroides.index}
+    nombres[en_riesgo] = 'Clientes en Riesgo ⚠️'
+    nombres[vip] = 'Clientes VIP/Campeones ⭐'
+    return nombres
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Segmentación K-Means de clientes por RFM')
+    parser.add_argument('--k', type=int, default=4, help='número de segmentos del modelo final')
+    parser.add_argument('--kmax', type=int, default=10, help='se prueban k = 1..kmax')
+    parser.add_argument('--minibatch', action='store_true', help='usa MiniBatchKMeans')
+    parser.add_argument('--muestra', type=int, default=MUESTRA_METRICAS)
+    parser.add_argument('--procesos', type=int, default=-1)
+    parser.add_argument('--directorio', default=DATASET_VENTAS)
+    parser.add_argument('--salida', default=RUTA_SEGMENTACION)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    estado, _, _ = actualizar_rfm(args.directorio)
+    df_rfm = tabla_rfm(estado, contacto=False)
+    scaler = StandardScaler()
+    X_rfm_scaled = scaler.fit_transform(df_rfm[COLUMNAS_RFM])
+
+    valores_k = sorted(set(range(1, args.kmax + 1)) | {args.k})
+    tabla, modelos = barrido_k(X_rfm_scaled, valores_k, args.minibatch, args.muestra, args.procesos)
+    print(f"🔎 Barrido de K sobre {len(df_rfm):,} clientes:")
+    print(tabla.to_string(index=False, float_format=lambda v: f'{v:,.3f}'))
+    if tabla['Silueta'].notna().any():
+        print(f"   Mejor silueta: k={int(tabla.loc[tabla['Silueta'].idxmax(), 'k'])}")
+
+    modelo = modelos[args.k]
+    centroides = pd.DataFrame(scaler.inverse_transform(modelo.cluster_centers_), columns=COLUMNAS_RFM)
+    df_rfm['Nombre_Segmento'] = pd.Series(modelo.labels_).map(nombrar_clusters(centroides)).values
+    salida = exportar_segmentacion(df_rfm, args.salida)
+    print(f"📊 {len(salida):,} clientes en {args.k} segmentos en '{args.salida}' "
+          f"({time.perf_counter() - inicio:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
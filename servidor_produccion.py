@@ -0,0 +1,140 @@
+"""
+Servidor de producción del dashboard Aurelion.
+
+Un proceso coordinador carga los datos una sola vez, los publica como snapshot
+Arrow IPC versionado y va añadiendo las ventas nuevas. N workers de gunicorn
+sirven `dashboard.server` leyendo ese snapshot con memory-map, de modo que la
+memoria de los datos se comparte en lugar de multiplicarse por cada worker.
+
+En modo sql (AURELION_MODO_DATOS=sql) no hay snapshot ni coordinador: cada
+worker pide a la base de datos solo los agregados que pinta.
+
+Uso:
+    python servidor_produccion.py --workers 4 --puerto 8050
+"""
+import argparse
+import os
+import signal
+import time
+
+from almacen_columnar import leer_snapshot_publicado, leer_puntero, publicar_snapshot
+from datos_dashboard import (
+    INTERVALO_REFRESCO_SEGUNDOS, VARIABLE_SNAPSHOT_COMPARTIDO, calcular_marca_agua,
+    cargar_datos_arranque, guardar_snapshot_local, refrescar_datos,
+    modo_datos, obtener_dimensiones
+)
+
+DIRECTORIO_SNAPSHOT_POR_DEFECTO = 'snapshots'
+HILOS_POR_WORKER = 4
+
+
+def _metadatos(df, dimensiones, carga_completa):
+    return {'dimensiones': dimensiones, 'marca_agua': calcular_marca_agua(df), 'carga_completa': carga_completa}
+
+
+def publicar_carga_inicial(directorio):
+    """Carga de arranque (snapshot local + delta o MySQL) publicada como versión siguiente a la vigente"""
+    puntero = leer_puntero(directorio)
+    version = puntero['version'] + 1 if puntero else 1
+
+    df, dimensiones, carga_completa, cambiado = cargar_datos_arranque()
+    if cambiado:
+        guardar_snapshot_local(df, dimensiones, carga_completa)
+    publicar_snapshot(directorio, version, df, _metadatos(df, dimensiones, carga_completa))
+    print(f"📦 Snapshot v{version} publicado en '{directorio}' ({len(df):,} líneas)")
+    return version
+
+
+def coordinar_snapshots(directorio, intervalo, pid_padre):
+    """Bucle del coordinador: incorpora ventas nuevas y publica una versión por cada cambio"""
+    puntero, df = leer_snapshot_publicado(directorio)
+    version = puntero['version']
+    dimensiones = puntero['dimensiones']
+    carga_completa = puntero.get('carga_completa')
+
+    # Termina si el proceso maestro desaparece
+    while os.getppid() == pid_padre:
+        time.sleep(intervalo)
+        try:
+            df_nuevo, carga_completa = refrescar_datos(df, carga_completa)
+            dimensiones_nuevas = obtener_dimensiones()
+            if df_nuevo is df and dimensiones_nuevas == dimensiones:
+                continue
+
+            version += 1
+            df, dimensiones = df_nuevo, dimensiones_nuevas
+            publicar_snapshot(directorio, version, df, _metadatos(df, dimensiones, carga_completa))
+            guardar_snapshot_local(df, dimensiones, carga_completa)
+            print(f"📦 Snapshot v{version} publicado ({len(df):,} líneas)")
+        except Exception as e:
+            print(f"⚠️  Error al actualizar el snapshot compartido: {e}")
+
+
+def _aplicacion_gunicorn(opciones):
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        raise SystemExit("❌ El servidor de producción necesita gunicorn: pip install gunicorn")
+
+    class AplicacionDashboard(BaseApplication):
+        def load_config(self):
+            for clave, valor in opciones.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            # Se importa dentro de cada worker: lee el snapshot compartido, no la base de datos
+            from dashboard import server
+            return server
+
+    return AplicacionDashboard()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Servidor de producción del dashboard Aurelion')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--puerto', type=int, default=8050)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--directorio', default=DIRECTORIO_SNAPSHOT_POR_DEFECTO,
+                        help='Directorio del snapshot Arrow compartido')
+    parser.add_argument('--intervalo', type=int, default=INTERVALO_REFRESCO_SEGUNDOS,
+                        help='Segundos entre búsquedas de ventas nuevas')
+    args = parser.parse_args()
+
+    opciones = {
+        'bind': f'{args.host}:{args.puerto}',
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': HILOS_POR_WORKER,
+        'preload_app': False,
+    }
+    if modo_datos() == 'sql':
+        # Los agregados salen de la base de datos: no hay detalle que compartir
+        _aplicacion_gunicorn(opciones).run()
+        return
+
+    directorio = os.path.abspath(args.directorio)
+    publicar_carga_inicial(directorio)
+
+    # Los workers heredan la variable y leen el snapshot en lugar de la base de datos
+    os.environ[VARIABLE_SNAPSHOT_COMPARTIDO] = directorio
+
+    # Proceso coordinador independiente (fork directo: gunicorn solo funciona en POSIX)
+    pid_maestro = os.getpid()
+    pid_coordinador = os.fork()
+    if pid_coordinador == 0:
+        try:
+            coordinar_snapshots(directorio, args.intervalo, pid_maestro)
+        finally:
+            os._exit(0)
+
+    def detener_coordinador(_servidor):
+        try:
+            os.kill(pid_coordinador, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+
+    _aplicacion_gunicorn({**opciones, 'on_exit': detener_coordinador}).run()
+
+
+if __name__ == '__main__':
+    main()